@@ -0,0 +1,87 @@
+import os
+import threading
+from typing import Dict, Optional
+
+from metrics import ADMISSION_REJECTED
+
+# --- CONFIGURATION ---
+QUERY_SLOTS = int(os.getenv('LIFI_QUERY_SLOTS', 4))  # concurrent heavy database reads
+EXPORT_SLOTS = int(os.getenv('LIFI_EXPORT_SLOTS', 4))  # concurrent export requests
+DOWNLOAD_SLOTS = int(os.getenv('LIFI_DOWNLOAD_SLOTS', 8))  # concurrent transfers of finished files
+ADMISSION_QUEUE_SECONDS = float(os.getenv('LIFI_ADMISSION_QUEUE_SECONDS', 2))  # wait for a slot before 429
+ADMISSION_RETRY_AFTER = int(os.getenv('LIFI_ADMISSION_RETRY_AFTER', 5))  # seconds, sent with 429
+
+
+class ConcurrencyLimiter:
+    """At most `slots` requests of one kind at a time, with a short bounded queue.
+
+    A request that finds every slot busy waits up to `queue_seconds` for one;
+    no more than `max_waiting` requests wait at once, since each waiter holds
+    a server worker. Anything beyond that is rejected so the caller can
+    answer 429 right away and keep the remaining workers for cheap endpoints.
+    """
+
+    def __init__(self, name: str, slots: int, queue_seconds: float = ADMISSION_QUEUE_SECONDS,
+                 max_waiting: Optional[int] = None):
+        self.name = name
+        self.slots = slots
+        self.queue_seconds = queue_seconds
+        self.max_waiting = slots if max_waiting is None else max_waiting
+        self._semaphore = threading.BoundedSemaphore(slots)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+
+    def acquire(self) -> bool:
+        if self._semaphore.acquire(blocking=False):
+            with self._lock:
+                self.in_flight += 1
+            return True
+
+        with self._lock:
+            if self.waiting >= self.max_waiting:
+                ADMISSION_REJECTED.inc(group=self.name)
+                return False
+            self.waiting += 1
+        acquired = False
+        try:
+            acquired = self.queue_seconds > 0 and self._semaphore.acquire(timeout=self.queue_seconds)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+                if acquired:
+                    self.in_flight += 1
+        if not acquired:
+            ADMISSION_REJECTED.inc(group=self.name)
+        return acquired
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+
+LIMITERS = {
+    'query': ConcurrencyLimiter('query', QUERY_SLOTS),
+    'export': ConcurrencyLimiter('export', EXPORT_SLOTS),
+    # Streaming a finished file costs no database work, only a worker for as long as the client reads
+    'download': ConcurrencyLimiter('download', DOWNLOAD_SLOTS),
+}
+
+# Request paths that go through a limiter; everything else is admitted at once
+LIMITED_PATHS: Dict[str, ConcurrencyLimiter] = {
+    '/data/view': LIMITERS['query'],
+    '/data/stats': LIMITERS['query'],
+    '/data/whales': LIMITERS['query'],
+    '/api/v1/transactions': LIMITERS['query'],
+    '/api/v1/stats': LIMITERS['query'],
+    '/api/v1/whales': LIMITERS['query'],
+    '/api/v1/aggregate': LIMITERS['query'],
+    '/data/export': LIMITERS['export'],
+    '/api/v1/exports': LIMITERS['export'],
+    '/download': LIMITERS['download'],
+}
+
+
+def limiter_for(path: str) -> Optional[ConcurrencyLimiter]:
+    return LIMITED_PATHS.get(path.rstrip('/') or '/')
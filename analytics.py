@@ -0,0 +1,284 @@
+import os
+import threading
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:  # optional: only needed with LIFI_ANALYTICS_BACKEND=duckdb
+    duckdb = None
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+ANALYTICS_SYNC_PAGE = int(os.getenv('LIFI_ANALYTICS_SYNC_PAGE', 50000))  # rows copied from SQLite per step
+
+# One row per sending leg, with the transfer and receiving-leg columns the
+# statistics and /api/v1/aggregate need, keyed by (source, sending row id)
+MIRROR_COLUMNS = ('id', 'transaction_id', 'tool', 'status', 'integrator', 'token_symbol', 'chain_id',
+                  'chain_name', 'amount_usd', 'timestamp', 'dest_token', 'dest_chain')
+MIRROR_SELECT = '''
+    SELECT s.id, s.transaction_id, t.tool, t.status, t.integrator, s.token_symbol, s.chain_id,
+           s.chain_name, s.amount_usd, s.timestamp, r.token_symbol, r.chain_name
+    FROM sending_transactions s
+    LEFT JOIN transactions t ON t.transaction_id = s.transaction_id
+    LEFT JOIN receiving_transactions r ON r.transaction_id = s.transaction_id
+'''
+
+# DuckDB spellings of database.AGGREGATE_DIMENSIONS and AGGREGATE_BUCKETS (same names, same output)
+MIRROR_DIMENSIONS = {
+    'tool': 'tool',
+    'status': 'status',
+    'integrator': 'integrator',
+    'source_chain': 'chain_name',
+    'source_token': 'token_symbol',
+    'dest_chain': 'dest_chain',
+    'dest_token': 'dest_token',
+}
+MIRROR_BUCKETS = {
+    '1h': "strftime(timestamp, '%Y-%m-%d %H:00')",
+    '1d': "strftime(timestamp, '%Y-%m-%d')",
+    '1w': "strftime(date_trunc('week', timestamp), '%Y-%m-%d')",  # Monday of the week
+    '1M': "strftime(timestamp, '%Y-%m')",
+}
+
+
+class AnalyticsMirror:
+    """Columnar copy of the transfer tables in an embedded DuckDB file, for full-scan queries.
+
+    SQLite stays the system of record. sync() brings the mirror up to date
+    incrementally, one source file (main database or monthly partition) at
+    a time: sending rows past the last copied id are appended (AUTOINCREMENT
+    ids are never reused), transfers whose status changed since the last
+    sync are re-copied, and a row count mismatch means retention deleted
+    rows, which are then dropped from the mirror too. Frozen partitions are
+    skipped once copied.
+    """
+
+    def __init__(self, path: str):
+        if duckdb is None:
+            raise RuntimeError("the duckdb package is not installed")
+        self.path = path
+        self.conn = duckdb.connect(path)
+        self.lock = threading.Lock()
+        self.synced_generation: Optional[int] = None
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS transfers (
+                source VARCHAR, id BIGINT, transaction_id VARCHAR, tool VARCHAR, status VARCHAR,
+                integrator VARCHAR, token_symbol VARCHAR, chain_id BIGINT, chain_name VARCHAR,
+                amount_usd DOUBLE, timestamp TIMESTAMP, dest_token VARCHAR, dest_chain VARCHAR
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS sync_state (
+                source VARCHAR PRIMARY KEY, last_id BIGINT, last_updated VARCHAR, row_count BIGINT,
+                frozen_at VARCHAR
+            )
+        ''')
+
+    def close(self):
+        self.conn.close()
+
+    # --- Sync ---
+
+    def sync(self, db) -> int:
+        """Copy changes from the SQLite files of `db`; returns the number of rows copied or removed."""
+        with self.lock:
+            generation = db.get_generation()
+            if generation == self.synced_generation:
+                return 0
+            sources = [('main', db.db_path, None)]
+            if db.partitioned:
+                sources += [(p['month'], db._partition_uri(p['file_path'], p['frozen']),
+                             p['frozen_at'] if p['frozen'] else None)
+                            for p in db.list_partitions() if os.path.exists(p['file_path'])]
+
+            changed = 0
+            names = [name for name, _, _ in sources]
+            gone = self.conn.execute(
+                f"SELECT source FROM sync_state WHERE source NOT IN ({', '.join('?' * len(names))})", names
+            ).fetchall()
+            for (source,) in gone:
+                changed += self._forget(source)
+            for source, uri, frozen_at in sources:
+                changed += self._sync_source(db, source, uri, frozen_at)
+            self.synced_generation = generation
+            if changed:
+                logger.info(f"Analytics mirror synced: {changed} rows changed")
+            return changed
+
+    def _forget(self, source: str) -> int:
+        removed = self.conn.execute("SELECT COUNT(*) FROM transfers WHERE source = ?", [source]).fetchone()[0]
+        self.conn.execute("DELETE FROM transfers WHERE source = ?", [source])
+        self.conn.execute("DELETE FROM sync_state WHERE source = ?", [source])
+        return removed
+
+    def _sync_source(self, db, source: str, uri: str, frozen_at: Optional[str]) -> int:
+        state = self.conn.execute(
+            "SELECT last_id, last_updated, row_count, frozen_at FROM sync_state WHERE source = ?", [source]
+        ).fetchone()
+        if state and frozen_at and state[3] == frozen_at:
+            return 0  # frozen, and copied since it was frozen
+        last_id, last_updated, row_count, _ = state or (0, None, 0, None)
+
+        conn = db.get_connection(uri)
+        self.conn.execute("BEGIN TRANSACTION")
+        try:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            now, live_count, max_id = cursor.execute(
+                "SELECT CURRENT_TIMESTAMP, COUNT(*), MAX(id) FROM sending_transactions"
+            ).fetchone()
+            changed = 0
+            if (max_id or 0) < last_id:
+                # The file was replaced: start this source over
+                changed += self._forget(source)
+                last_id, last_updated, row_count = 0, None, 0
+
+            # Transfers whose status or receiving leg changed after they were copied
+            # (unary + keeps SQLite on the updated_at index instead of walking s.id)
+            if last_updated and last_id:
+                cursor.execute(MIRROR_SELECT + " WHERE t.updated_at >= ? AND +s.id <= ?", (last_updated, last_id))
+                rows = cursor.fetchall()
+                if rows:
+                    self._replace(source, rows)
+                    changed += len(rows)
+
+            # New rows, in id order
+            while True:
+                cursor.execute(MIRROR_SELECT + " WHERE s.id > ? ORDER BY s.id LIMIT ?", (last_id, ANALYTICS_SYNC_PAGE))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                self._append(source, rows)
+                last_id = rows[-1][0]
+                row_count += len(rows)
+                changed += len(rows)
+
+            # More rows copied than SQLite had: retention deleted some
+            if row_count > live_count:
+                live = pd.DataFrame({'id': [row[0] for row in cursor.execute("SELECT id FROM sending_transactions")]},
+                                    dtype='int64')
+                self.conn.register('live_ids', live)
+                try:
+                    self.conn.execute(
+                        "DELETE FROM transfers WHERE source = ? AND id NOT IN (SELECT id FROM live_ids)", [source]
+                    )
+                finally:
+                    self.conn.unregister('live_ids')
+                mirrored = self.conn.execute("SELECT COUNT(*) FROM transfers WHERE source = ?", [source]).fetchone()[0]
+                changed += row_count - mirrored
+                row_count = mirrored
+
+            self.conn.execute('''
+                INSERT OR REPLACE INTO sync_state (source, last_id, last_updated, row_count, frozen_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [source, last_id, now, row_count, frozen_at])
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return changed
+
+    def _append(self, source: str, rows: List[Tuple]):
+        incoming = pd.DataFrame.from_records(rows, columns=MIRROR_COLUMNS)
+        # Mixed None/number columns arrive as object dtype; give DuckDB plain numbers to read
+        incoming['amount_usd'] = pd.to_numeric(incoming['amount_usd'], errors='coerce')
+        incoming['chain_id'] = pd.to_numeric(incoming['chain_id'], errors='coerce').astype('Int64')
+        incoming['timestamp'] = incoming['timestamp'].astype('string')
+        self.conn.register('incoming', incoming)
+        try:
+            self.conn.execute('''
+                INSERT INTO transfers
+                SELECT ?, id, transaction_id, tool, status, integrator, token_symbol, chain_id, chain_name,
+                       CASE WHEN isnan(amount_usd) THEN NULL ELSE amount_usd END,
+                       TRY_CAST(timestamp AS TIMESTAMP), dest_token, dest_chain
+                FROM incoming
+            ''', [source])
+        finally:
+            self.conn.unregister('incoming')
+
+    def _replace(self, source: str, rows: List[Tuple]):
+        ids = pd.DataFrame({'id': [row[0] for row in rows]}, dtype='int64')
+        self.conn.register('changed_ids', ids)
+        try:
+            self.conn.execute("DELETE FROM transfers WHERE source = ? AND id IN (SELECT id FROM changed_ids)",
+                              [source])
+        finally:
+            self.conn.unregister('changed_ids')
+        self._append(source, rows)
+
+    # --- Queries ---
+
+    def statistics(self) -> Dict[str, Any]:
+        """The scanned part of LiFiDatabase.get_statistics, in the same shape."""
+        cursor = self.conn.cursor()
+        since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=1)
+        total, volume, recent, earliest, latest = cursor.execute('''
+            SELECT COUNT(*), SUM(amount_usd), COUNT(*) FILTER (WHERE timestamp > ?),
+                   strftime(MIN(timestamp), '%Y-%m-%d %H:%M:%S'), strftime(MAX(timestamp), '%Y-%m-%d %H:%M:%S')
+            FROM transfers
+        ''', [since]).fetchone()
+
+        def top(column: str, extra: str = '') -> List[Dict[str, Any]]:
+            rows = cursor.execute(f'''
+                SELECT {column}, COUNT(*) AS count, SUM(amount_usd) AS total_volume
+                FROM transfers
+                WHERE {column} IS NOT NULL {extra}
+                GROUP BY {column}
+                ORDER BY count DESC
+                LIMIT 10
+            ''').fetchall()
+            return [{column: key, 'count': count, 'total_volume': volume} for key, count, volume in rows]
+
+        return {
+            'total_transactions': total,
+            'total_volume_usd': float(volume or 0),
+            'recent_transactions_24h': recent,
+            'date_range': {'earliest': earliest, 'latest': latest},
+            'top_tokens': top('token_symbol', "AND token_symbol != ''"),
+            'top_chains': top('chain_name')
+        }
+
+    def aggregate(self, dimensions: List[str], bucket: Optional[str], token_symbol: Optional[str] = None,
+                  chain_id: Optional[int] = None, tool: Optional[str] = None, status: Optional[str] = None,
+                  min_usd: Optional[float] = None, start_date: Optional[str] = None,
+                  end_date: Optional[str] = None, explain: bool = False) -> Tuple[List[Tuple], Optional[List[str]]]:
+        """Partial aggregates (group key..., count, sum, non-null count, min, max) like the SQLite query."""
+        select = [f"{MIRROR_DIMENSIONS[name]} AS {name}" for name in dimensions]
+        if bucket:
+            select.append(f"{MIRROR_BUCKETS[bucket]} AS bucket")
+        select += ["COUNT(*)", "SUM(amount_usd)", "COUNT(amount_usd)", "MIN(amount_usd)", "MAX(amount_usd)"]
+        query = f"SELECT {', '.join(select)} FROM transfers WHERE 1=1"
+
+        params: List[Any] = []
+        for column, value in (('token_symbol', token_symbol), ('chain_id', chain_id), ('tool', tool),
+                              ('status', status)):
+            if value:
+                query += f" AND {column} = ?"
+                params.append(value)
+        if min_usd is not None:
+            query += " AND amount_usd >= ?"
+            params.append(min_usd)
+        if start_date:
+            query += " AND timestamp >= CAST(? AS TIMESTAMP)"
+            params.append(start_date)
+        if end_date:
+            query += " AND timestamp <= CAST(? AS TIMESTAMP)"
+            params.append(end_date)
+        if bucket and not start_date and not end_date:
+            query += " AND timestamp IS NOT NULL"
+        group_count = len(dimensions) + (1 if bucket else 0)
+        if group_count:
+            query += " GROUP BY " + ", ".join(str(i) for i in range(1, group_count + 1))
+
+        cursor = self.conn.cursor()
+        plan = None
+        if explain:
+            plan = [line for row in cursor.execute("EXPLAIN " + query, params).fetchall()
+                    for line in row[-1].splitlines() if line.strip()]
+        return cursor.execute(query, params).fetchall(), plan
@@ -0,0 +1,179 @@
+"""
+Benchmarks LiFiDatabase on a synthetic dataset (see synthetic_data.py).
+
+Phases: bulk insert in batches, every combination of get_transactions
+filters, each exporter, get_statistics and a set of get_aggregate queries
+on each analytics backend (SQLite, and the DuckDB mirror when duckdb is
+installed, including its initial and incremental sync), and
+clear_database. Each phase reports ops/s and latency percentiles; the
+database file size is taken after the insert. Results are printed and
+written as JSON so runs can be compared.
+
+Usage: python benchmark_database.py [--count 100000] [--repeat 5] [--partitioned]
+                                    [--backends sqlite,duckdb] [--results benchmark_database_results.json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import itertools
+from datetime import datetime
+import analytics
+from database import LiFiDatabase
+from synthetic_data import TransferGenerator, TOKENS, CHAINS, SYNTHETIC_START, SYNTHETIC_END
+
+FILTERS = ('token_symbol', 'min_usd', 'max_usd', 'start_date', 'end_date', 'chain_id')
+
+# (group, bucket) pairs for get_aggregate
+AGGREGATES = ((), None), (('source_token',), '1M'), (('tool', 'dest_chain'), None), (('source_chain',), '1d')
+
+
+def percentile(ordered, q):
+    """Nearest-rank percentile of an already sorted list."""
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+def summarize(name, latencies, ops_per_call=1, **extra):
+    ordered = sorted(latencies)
+    total = sum(ordered)
+    result = {
+        'name': name,
+        'calls': len(ordered),
+        'ops': len(ordered) * ops_per_call,
+        'seconds': round(total, 4),
+        'ops_per_sec': round(len(ordered) * ops_per_call / total, 1) if total else None,
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+    result.update(extra)
+    print(f"{name:<58} {result['ops_per_sec'] or 0:>10,.1f} ops/s  p50={result['p50_ms']:.1f}ms "
+          f"p95={result['p95_ms']:.1f}ms p99={result['p99_ms']:.1f}ms")
+    return result
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    value = function(*args, **kwargs)
+    return time.perf_counter() - start, value
+
+
+def database_size(db):
+    size = sum(os.path.getsize(db.db_path + suffix) for suffix in ('', '-wal') if os.path.exists(db.db_path + suffix))
+    if os.path.isdir(db.partition_dir):
+        size += sum(entry.stat().st_size for entry in os.scandir(db.partition_dir) if entry.is_file())
+    return size
+
+
+def random_filters(rng, names):
+    """Plausible values for the named get_transactions filters."""
+    span = SYNTHETIC_END.timestamp() - SYNTHETIC_START.timestamp()
+    start = SYNTHETIC_START.timestamp() + rng.random() * span * 0.9
+    values = {
+        'token_symbol': rng.choices([token[0] for token in TOKENS], weights=[token[-1] for token in TOKENS])[0],
+        'min_usd': rng.choice([100, 1000, 10000]),
+        'max_usd': rng.choice([50000, 1000000]),
+        'start_date': datetime.fromtimestamp(start).strftime('%Y-%m-%d'),
+        'end_date': datetime.fromtimestamp(start + span * 0.1).strftime('%Y-%m-%d'),
+        'chain_id': rng.choices([chain[0] for chain in CHAINS], weights=[chain[1] for chain in CHAINS])[0],
+    }
+    return {name: values[name] for name in names}
+
+
+def run(args, workdir):
+    db = LiFiDatabase(os.path.join(workdir, 'bench.db'), partitioned=args.partitioned)
+    rng = random.Random(args.seed)
+    results = []
+
+    # Bulk insert
+    latencies = []
+    generator = TransferGenerator(args.seed)
+    for batch in generator.batches(args.count, args.batch):
+        seconds, _ = timed(db.bulk_insert_transactions, batch)
+        latencies.append(seconds)
+    size = database_size(db)
+    results.append(summarize(f"bulk_insert_transactions (batches of {args.batch})", latencies,
+                             ops_per_call=args.batch, db_size_bytes=size))
+    print(f"database size after insert: {size / 1024 / 1024:,.1f} MiB")
+
+    # Every get_transactions filter combination
+    for width in range(len(FILTERS) + 1):
+        for names in itertools.combinations(FILTERS, width):
+            latencies = [timed(db.get_transactions, **random_filters(rng, names))[0] for _ in range(args.repeat)]
+            results.append(summarize(f"get_transactions({', '.join(names) or 'no filters'})", latencies))
+
+    for export_format, extension in (('excel', 'xlsx'), ('json', 'json'), ('csv', 'csv')):
+        path = os.path.join(workdir, f'export.{extension}')
+        exporter = getattr(db, f'export_to_{export_format}')
+        latencies = [timed(exporter, filename=path)[0] for _ in range(args.repeat)]
+        results.append(summarize(f"export_to_{export_format}", latencies, file_bytes=os.path.getsize(path)))
+
+    # Analytics backends on the same files; the DuckDB mirror syncs on its first query
+    for backend in args.backends.split(','):
+        if backend == 'duckdb' and analytics.duckdb is None:
+            print("duckdb is not installed; skipping the duckdb backend")
+            continue
+        analytics_db = LiFiDatabase(db.db_path, partitioned=args.partitioned, analytics_backend=backend)
+        if backend == 'duckdb':
+            results.append(summarize('get_statistics [duckdb], first call with initial sync',
+                                     [timed(analytics_db.get_statistics)[0]]))
+        results.append(summarize(f'get_statistics [{backend}]',
+                                 [timed(analytics_db.get_statistics)[0] for _ in range(args.repeat)]))
+        # get_statistics also merges the sketches, which is the same work on both backends
+        scan = analytics_db._scan_statistics if backend == 'sqlite' else (
+            lambda: analytics_db._analytics_mirror().statistics())
+        results.append(summarize(f'get_statistics scans only [{backend}]',
+                                 [timed(scan)[0] for _ in range(args.repeat)]))
+        for group, bucket in AGGREGATES:
+            latencies = [timed(analytics_db.get_aggregate, group=group, bucket=bucket,
+                               metrics=('count', 'sum_usd', 'avg_usd'), limit=10000)[0] for _ in range(args.repeat)]
+            results.append(summarize(f"get_aggregate({', '.join(group) or 'total'}, bucket={bucket}) [{backend}]",
+                                     latencies))
+        if backend == 'duckdb':
+            db.bulk_insert_transactions(next(TransferGenerator(args.seed + 1).batches(args.batch, args.batch)))
+            results.append(summarize(f'get_statistics [duckdb] after inserting {args.batch} (incremental sync)',
+                                     [timed(analytics_db.get_statistics)[0]]))
+
+    results.append(summarize('clear_database', [timed(db.clear_database)[0]]))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=100000, help='synthetic transfers to insert')
+    parser.add_argument('--batch', type=int, default=5000, help='transfers per bulk_insert_transactions call')
+    parser.add_argument('--repeat', type=int, default=5, help='calls per query, statistics and export benchmark')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--partitioned', action='store_true', help='benchmark monthly partitions')
+    parser.add_argument('--backends', default='sqlite,duckdb', help='analytics backends to compare')
+    parser.add_argument('--results', default='benchmark_database_results.json')
+    parser.add_argument('--workdir', help='directory for the database files (default: a temporary directory)')
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='lifi-dbbench-')
+    try:
+        results = run(args, workdir)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.results, 'w') as f:
+        json.dump({
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'count': args.count,
+            'batch': args.batch,
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'partitioned': args.partitioned,
+            'backends': args.backends,
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'results': results
+        }, f, indent=2)
+    print(f"Results written to {args.results}")
@@ -0,0 +1,321 @@
+"""
+HTTP load harness for server.py.
+
+Starts server.py against a seeded database and replays a weighted mix of
+requests, either at a fixed concurrency (closed loop: each client sends its
+next request when the previous one returns) or at a target rate (open loop:
+requests are issued on schedule and latency is measured from the scheduled
+time, so a stalled server cannot hide its queueing delay).
+
+Each phase runs for --duration seconds. The "ingesting" phase first starts
+a /rebuild whose fetcher reads from a local mock of the LI.FI transfers API
+(via LIFI_API_BASE), so the load runs against a real writer. Per-endpoint
+throughput, p50/p95/p99 latency and error rates are printed and written to
+a JSON results file.
+
+Usage: python benchmark_load.py [--rows 20000] [--concurrency 16 | --rps 200] [--duration 20]
+                                [--mix "/progress=5,/data/view?limit=1000=2"] [--phases idle,ingesting]
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+import http.server
+import concurrent.futures
+from datetime import datetime
+from urllib.parse import urlparse, parse_qs
+from benchmark_server import seed_database
+from synthetic_data import TransferGenerator
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+
+DEFAULT_MIX = ('/=1,/progress=8,/status=2,/data/stats=2,/data/view?limit=1000=2,'
+               '/data/export?format=csv&download=1=1')
+
+
+def parse_mix(text):
+    """'path=weight,...' into [(path, weight)]; the weight follows the last '='."""
+    mix = []
+    for item in text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        path, _, weight = item.rpartition('=')
+        if not path.startswith('/'):
+            raise ValueError(f"Bad mix entry: {item}")
+        mix.append((path, float(weight)))
+    return mix
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+class MockTransfersAPI(http.server.ThreadingHTTPServer):
+    """Serves synthetic /v2/analytics/transfers pages, newest first, with a fixed per-page delay.
+
+    Every transfer is a BTC transfer inside the fetcher's date range, so all
+    of them are written to the database. Transfers are a minute apart, and
+    fromTimestamp/toTimestamp windows are honored like the real API does.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, pages, page_size, delay):
+        self.pages = pages
+        self.page_size = page_size
+        self.delay = delay
+        self.generator = TransferGenerator(seed=7)
+        self.generator_lock = threading.Lock()
+        self.newest = int(datetime(2025, 9, 1).timestamp())
+        super().__init__(('127.0.0.1', 0), MockTransfersHandler)
+
+    def page(self, index, from_timestamp=None, to_timestamp=None):
+        total = self.pages * self.page_size
+        # Positions of the newest and oldest transfer inside the window (position k is k minutes old)
+        first = max(0, -((to_timestamp - self.newest) // 60)) if to_timestamp is not None else 0
+        last = min(total - 1, (self.newest - from_timestamp) // 60) if from_timestamp is not None else total - 1
+        start = first + index * self.page_size
+        count = max(0, min(self.page_size, last - start + 1))
+        with self.generator_lock:
+            transfers = list(self.generator.transfers(count)) if count else []
+        for offset, transfer in enumerate(transfers):
+            transfer['sending']['timestamp'] = self.newest - (start + offset) * 60
+            transfer['sending']['token']['symbol'] = 'BTC'
+        return {'data': transfers, 'next': str(index + 1) if start + count <= last else None}
+
+    def handle_error(self, request, client_address):
+        # The fetcher drops its connections when the server under test is stopped
+        pass
+
+
+class MockTransfersHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path != '/v2/analytics/transfers':
+            self.send_error(404)
+            return
+        query = parse_qs(parsed.query)
+        index = int(query.get('next', ['0'])[0])
+        window = [int(query[name][0]) if name in query else None for name in ('fromTimestamp', 'toTimestamp')]
+        time.sleep(self.server.delay)
+        body = json.dumps(self.server.page(index, *window)).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Client:
+    """One keep-alive connection, reopened after errors or 'Connection: close'."""
+
+    def __init__(self, port, timeout):
+        self.port = port
+        self.timeout = timeout
+        self.connection = None
+
+    def get(self, path):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=self.timeout)
+        try:
+            self.connection.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+            response = self.connection.getresponse()
+            response.read()
+            if response.getheader('Connection', '').lower() == 'close':
+                self.close()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class LoadRun:
+    """Collects (endpoint, latency, status) samples for one phase."""
+
+    def __init__(self, mix, port, timeout):
+        self.paths = [path for path, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.port = port
+        self.timeout = timeout
+        self.samples = {path: [] for path in self.paths}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def request(self, path, started=None):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = Client(self.port, self.timeout)
+        started = time.perf_counter() if started is None else started
+        try:
+            status = client.get(path)
+        except Exception as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.samples[path].append((elapsed, status))
+
+    def closed_loop(self, concurrency, duration, rng):
+        deadline = time.perf_counter() + duration
+        seeds = [rng.random() for _ in range(concurrency)]
+
+        def client_loop(seed):
+            local_rng = random.Random(seed)
+            while time.perf_counter() < deadline:
+                self.request(local_rng.choices(self.paths, weights=self.weights)[0])
+
+        threads = [threading.Thread(target=client_loop, args=(seed,)) for seed in seeds]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def open_loop(self, rps, duration, max_in_flight, rng):
+        interval = 1.0 / rps
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            for n in range(int(duration * rps)):
+                scheduled = start + n * interval
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self.request, rng.choices(self.paths, weights=self.weights)[0], scheduled)
+
+    def report(self, phase, seconds):
+        endpoints = []
+        for path, samples in self.samples.items():
+            if not samples:
+                continue
+            latencies = sorted(latency for latency, _ in samples)
+            statuses = {}
+            for _, status in samples:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+            errors = sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 400)
+            endpoints.append({
+                'endpoint': path,
+                'requests': len(samples),
+                'throughput_rps': round(len(samples) / seconds, 1),
+                'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+                'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+                'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+                'error_rate': round(errors / len(samples), 4),
+                'statuses': statuses
+            })
+            print(f"[{phase}] {path:<40} {len(samples) / seconds:>8.1f} req/s  "
+                  f"p50={endpoints[-1]['p50_ms']:.1f}ms p95={endpoints[-1]['p95_ms']:.1f}ms "
+                  f"p99={endpoints[-1]['p99_ms']:.1f}ms errors={endpoints[-1]['error_rate']:.1%}")
+        return endpoints
+
+
+def progress_status(port):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        connection.request('GET', '/progress')
+        return json.loads(connection.getresponse().read()).get('status')
+    finally:
+        connection.close()
+
+
+def run(args):
+    mix = parse_mix(args.mix)
+    workdir = tempfile.mkdtemp(prefix='lifi-load-')
+    mock = MockTransfersAPI(args.mock_pages, args.mock_page_size, args.mock_delay)
+    threading.Thread(target=mock.serve_forever, daemon=True).start()
+
+    print(f"Seeding {args.rows} transfers...")
+    seed_database(os.path.join(workdir, 'lifi_transactions.db'), args.rows)
+    env = dict(os.environ, PORT=str(args.port), LIFI_API_BASE=f'http://127.0.0.1:{mock.server_address[1]}')
+    for assignment in args.server_env:
+        name, _, value = assignment.partition('=')
+        env[name] = value
+    log = open(os.path.join(workdir, 'server.log'), 'w')
+    server = subprocess.Popen([sys.executable, SERVER_SCRIPT], cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    rng = random.Random(args.seed)
+    phases = []
+    try:
+        for _ in range(200):
+            try:
+                progress_status(args.port)
+                break
+            except OSError:
+                time.sleep(0.05)
+
+        for phase in args.phases.split(','):
+            if phase == 'ingesting':
+                Client(args.port, 10).get('/rebuild')
+                time.sleep(0.5)
+            elif phase != 'idle':
+                raise ValueError(f"Unknown phase: {phase}")
+            status_before = progress_status(args.port)
+
+            load = LoadRun(mix, args.port, args.timeout)
+            started = time.perf_counter()
+            if args.rps:
+                load.open_loop(args.rps, args.duration, args.concurrency, rng)
+            else:
+                load.closed_loop(args.concurrency, args.duration, rng)
+            seconds = time.perf_counter() - started
+
+            status_after = progress_status(args.port)
+            if phase == 'ingesting' and status_after != 'running':
+                print(f"[{phase}] note: the ingestion job was '{status_after}' by the end of the phase")
+            phases.append({
+                'phase': phase,
+                'seconds': round(seconds, 2),
+                'job_status': {'before': status_before, 'after': status_after},
+                'endpoints': load.report(phase, seconds)
+            })
+    finally:
+        server.terminate()
+        server.wait()
+        log.close()
+        mock.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return phases
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000, help='synthetic transfers to seed')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='weighted request mix, "path=weight,..."')
+    parser.add_argument('--concurrency', type=int, default=16, help='clients (closed loop) or max in-flight (open loop)')
+    parser.add_argument('--rps', type=float, help='target request rate; switches to an open loop')
+    parser.add_argument('--duration', type=float, default=20, help='seconds per phase')
+    parser.add_argument('--phases', default='idle,ingesting')
+    parser.add_argument('--timeout', type=float, default=60, help='per-request timeout in seconds')
+    parser.add_argument('--mock-pages', type=int, default=100000, help='pages the mock transfers API serves')
+    parser.add_argument('--mock-page-size', type=int, default=100)
+    parser.add_argument('--mock-delay', type=float, default=0.05, help='seconds the mock API takes per page')
+    parser.add_argument('--server-env', action='append', default=[], metavar='NAME=VALUE',
+                        help='extra environment for server.py (e.g. SERVER_WORKERS=4)')
+    parser.add_argument('--port', type=int, default=8093)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--results', default='benchmark_load_results.json')
+    args = parser.parse_args()
+
+    phases = run(args)
+    with open(args.results, 'w') as f:
+        json.dump({
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'rows': args.rows,
+            'mix': parse_mix(args.mix),
+            'mode': {'rps': args.rps} if args.rps else {'concurrency': args.concurrency},
+            'server_env': args.server_env,
+            'phases': phases
+        }, f, indent=2)
+    print(f"Results written to {args.results}")
@@ -0,0 +1,102 @@
+"""
+Measures how a slow export affects the latency of cheap endpoints.
+
+Starts server.py against a seeded database once per worker count, probes
+/progress while idle, then probes it again while a /data/export request is
+running. With SERVER_WORKERS=1 (the old single-threaded behaviour) the
+probes queue behind the export; with a worker pool they should not.
+
+Usage: python benchmark_server.py [--rows 5000] [--workers 1,16] [--probes 50]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import statistics
+import urllib.request
+from database import LiFiDatabase
+from synthetic_data import generate_transfers
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+
+
+def seed_database(path, rows):
+    """Fill a database with synthetic transfers."""
+    LiFiDatabase(path).bulk_insert_transactions(generate_transfers(rows))
+
+
+def get(url, timeout=300):
+    start = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def probe(base_url, count):
+    return [get(f'{base_url}/progress') for _ in range(count)]
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    return (f"p50={statistics.median(ordered) * 1000:.1f}ms "
+            f"p95={ordered[int(len(ordered) * 0.95) - 1] * 1000:.1f}ms "
+            f"max={ordered[-1] * 1000:.1f}ms")
+
+
+def run(workers, seed_path, probes, port):
+    workdir = tempfile.mkdtemp(prefix='lifi-bench-')
+    shutil.copy(seed_path, os.path.join(workdir, 'lifi_transactions.db'))
+    env = dict(os.environ, PORT=str(port), SERVER_WORKERS=str(workers))
+    server = subprocess.Popen([sys.executable, SERVER_SCRIPT], cwd=workdir, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        for _ in range(100):
+            try:
+                get(f'{base_url}/progress', timeout=1)
+                break
+            except OSError:
+                time.sleep(0.1)
+
+        idle = probe(base_url, probes)
+
+        export_time = {}
+        export = threading.Thread(target=lambda: export_time.setdefault(
+            'seconds', get(f'{base_url}/data/export?format=excel')))
+        export.start()
+        time.sleep(0.05)  # Let the export reach the server first
+        busy = []
+        while export.is_alive() and len(busy) < probes:
+            busy.append(get(f'{base_url}/progress'))
+        export.join()
+
+        print(f"workers={workers:<3} idle:   {summarize(idle)}")
+        print(f"workers={workers:<3} export: {summarize(busy) if busy else 'n/a'} "
+              f"(export took {export_time.get('seconds', 0):.2f}s, {len(busy)} probes)")
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000, help='synthetic transfers to seed')
+    parser.add_argument('--workers', default='1,16', help='comma-separated SERVER_WORKERS values to compare')
+    parser.add_argument('--probes', type=int, default=50, help='/progress requests per phase')
+    parser.add_argument('--port', type=int, default=8091)
+    args = parser.parse_args()
+
+    seed_dir = tempfile.mkdtemp(prefix='lifi-bench-seed-')
+    seed_path = os.path.join(seed_dir, 'seed.db')
+    print(f"Seeding {args.rows} transfers...")
+    seed_database(seed_path, args.rows)
+    try:
+        for workers in [int(w) for w in args.workers.split(',')]:
+            run(workers, seed_path, args.probes, args.port)
+    finally:
+        shutil.rmtree(seed_dir, ignore_errors=True)
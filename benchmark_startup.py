@@ -0,0 +1,98 @@
+"""
+Measures server.py cold start: time from process launch to the first byte of /progress.
+
+Runs the current tree and, with --baseline, an older git revision (extracted
+with `git archive`) against copies of the same seeded database, alternating
+between them so both see the same machine state. Each run also prints the
+server's own startup report line when it has one.
+
+Usage: python benchmark_startup.py [--baseline HEAD~1] [--runs 5] [--rows 2000]
+"""
+import os
+import re
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import statistics
+import urllib.request
+from benchmark_server import seed_database
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STARTUP_REPORT = re.compile(r'Startup took .*')
+
+
+def extract_revision(revision, target):
+    """Copy the tree at a git revision into target."""
+    archive = subprocess.run(['git', 'archive', revision], cwd=HERE, check=True, capture_output=True).stdout
+    subprocess.run(['tar', '-x', '-C', target], input=archive, check=True)
+
+
+def time_to_first_byte(source_dir, seed_path, port):
+    """Seconds from launching server.py until /progress returns its first byte, plus its startup report."""
+    workdir = tempfile.mkdtemp(prefix='lifi-startup-')
+    shutil.copy(seed_path, os.path.join(workdir, 'lifi_transactions.db'))
+    log_path = os.path.join(workdir, 'server.log')
+    env = dict(os.environ, PORT=str(port), SERVER_PROCESSES='1')
+    with open(log_path, 'w') as log:
+        started = time.perf_counter()
+        server = subprocess.Popen([sys.executable, os.path.join(source_dir, 'server.py')], cwd=workdir, env=env,
+                                  stdout=log, stderr=subprocess.STDOUT)
+        try:
+            while True:
+                try:
+                    with urllib.request.urlopen(f'http://127.0.0.1:{port}/progress', timeout=5) as response:
+                        response.read(1)
+                    elapsed = time.perf_counter() - started
+                    break
+                except OSError:
+                    if server.poll() is not None:
+                        raise RuntimeError(f"server.py exited with {server.returncode}; see {log_path}")
+                    time.sleep(0.005)
+        finally:
+            server.terminate()
+            server.wait()
+    with open(log_path) as log:
+        match = STARTUP_REPORT.search(log.read())
+    shutil.rmtree(workdir, ignore_errors=True)
+    return elapsed, match.group(0) if match else None
+
+
+def summarize(samples):
+    return (f"median={statistics.median(samples) * 1000:.0f}ms "
+            f"min={min(samples) * 1000:.0f}ms max={max(samples) * 1000:.0f}ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--baseline', help='git revision to compare against (e.g. HEAD~1)')
+    parser.add_argument('--runs', type=int, default=5, help='cold starts per tree')
+    parser.add_argument('--rows', type=int, default=2000, help='synthetic transfers to seed')
+    parser.add_argument('--port', type=int, default=8092)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='lifi-startup-seed-')
+    try:
+        seed_path = os.path.join(scratch, 'seed.db')
+        print(f"Seeding {args.rows} transfers...")
+        seed_database(seed_path, args.rows)
+
+        trees = {'current': HERE}
+        if args.baseline:
+            trees[args.baseline] = os.path.join(scratch, 'baseline')
+            os.makedirs(trees[args.baseline])
+            extract_revision(args.baseline, trees[args.baseline])
+
+        samples = {name: [] for name in trees}
+        for run in range(args.runs):
+            for name, source_dir in trees.items():
+                elapsed, report = time_to_first_byte(source_dir, seed_path, args.port)
+                samples[name].append(elapsed)
+                print(f"run {run + 1} {name:<10} ttfb={elapsed * 1000:.0f}ms" + (f"  [{report}]" if report else ''))
+
+        for name, values in samples.items():
+            print(f"{name:<10} {summarize(values)}")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
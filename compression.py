@@ -0,0 +1,61 @@
+import os
+import gzip
+import zlib
+from typing import Optional, Tuple
+
+# --- CONFIGURATION ---
+COMPRESS_MIN_BYTES = int(os.getenv('LIFI_COMPRESS_MIN_BYTES', 1024))  # smaller bodies go out as they are
+COMPRESS_LEVEL = int(os.getenv('LIFI_COMPRESS_LEVEL', 6))
+
+# Content types worth compressing; exports and downloads are sent from disk as they are
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+# Preferred first when the client accepts both with the same weight
+SUPPORTED_ENCODINGS = ('gzip', 'deflate')
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """The best supported encoding allowed by an Accept-Encoding header, or None for identity."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        if coding:
+            weights[coding] = weight
+
+    best, best_weight = None, 0.0
+    for coding in SUPPORTED_ENCODINGS:
+        weight = weights.get(coding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def compress_body(body: bytes, content_type: str, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """(body, Content-Encoding) for a response; the body is unchanged when compression does not apply or pay off."""
+    if len(body) < COMPRESS_MIN_BYTES or not is_compressible(content_type):
+        return body, None
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding == 'gzip':
+        compressed = gzip.compress(body, compresslevel=COMPRESS_LEVEL, mtime=0)
+    elif encoding == 'deflate':
+        # HTTP "deflate" is the zlib format, not a raw deflate stream
+        compressed = zlib.compress(body, COMPRESS_LEVEL)
+    else:
+        return body, None
+    if len(compressed) >= len(body):
+        return body, None
+    return compressed, encoding
@@ -0,0 +1,98 @@
+import os
+from typing import Iterable, List, Optional, Tuple
+
+# --- CONFIGURATION ---
+# Gaps shorter than this many seconds are neither reported nor repaired
+COVERAGE_MIN_GAP_SECONDS = int(os.getenv('LIFI_COVERAGE_MIN_GAP_SECONDS', 0))
+# Gaps repaired concurrently (each gap is one newest-first cursor walk)
+COVERAGE_REPAIR_WORKERS = int(os.getenv('LIFI_COVERAGE_REPAIR_WORKERS', 5))
+
+# Closed [start, end] range of epoch seconds
+Interval = Tuple[int, int]
+
+
+def coverage_scope(token_symbol: Optional[str], min_usd: Optional[float]) -> Tuple[str, float]:
+    """(token, min_usd) key of an ingestion filter set; token '*' means every token."""
+    return (token_symbol.upper() if token_symbol else '*', float(min_usd or 0))
+
+
+def scope_covers(scope: Tuple[str, float], token_symbol: Optional[str], min_usd: Optional[float]) -> bool:
+    """Whether data ingested under scope includes every transfer matching token_symbol/min_usd."""
+    token, scope_min_usd = scope
+    return (token == '*' or token == (token_symbol or '').upper()) and scope_min_usd <= (min_usd or 0)
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Sort intervals and merge the ones that overlap or touch (timestamps are whole seconds)."""
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def find_gaps(intervals: Iterable[Interval], start: int, end: int, min_gap: int = 0) -> List[Interval]:
+    """Parts of [start, end] not covered by any interval, dropping gaps shorter than min_gap seconds."""
+    gaps = []
+    position = start
+    for interval_start, interval_end in merge_intervals(intervals):
+        if interval_end < position:
+            continue
+        if interval_start > end:
+            break
+        if interval_start > position:
+            gaps.append((position, interval_start - 1))
+        position = interval_end + 1
+    if position <= end:
+        gaps.append((position, end))
+    return [(a, b) for a, b in gaps if b - a + 1 >= min_gap]
+
+
+class CoverageWalk:
+    """Records the time range a newest-first cursor walk has stored, page by page.
+
+    Once a page whose oldest transfer is at L has been written, every
+    transfer newer than L (up to the walk's upper bound) is in the
+    database; transfers at exactly L may continue on the next page, so the
+    range is only claimed down to L + 1. `finish` claims the rest down to
+    the walk's start once the walk has run out of older transfers. A page
+    that was only partly written is passed to `skip` instead, which leaves
+    its range (and a second below it) as a gap for repair.
+    """
+
+    def __init__(self, db, start: int, end: int, token_symbol: Optional[str], min_usd: float,
+                 upper: Optional[int] = None):
+        self.db = db
+        self.start = int(start)
+        self.end = int(end)
+        self.token_symbol = token_symbol
+        self.min_usd = min_usd
+        self.upper = upper  # newest second known to be stored; the first page's newest if None
+
+    def page(self, first_timestamp: Optional[float], last_timestamp: Optional[float]):
+        """Record a stored page, given the timestamps of its newest and oldest transfers."""
+        if last_timestamp is None:
+            return
+        if self.upper is None:
+            self.upper = int(first_timestamp if first_timestamp is not None else last_timestamp)
+        self._record(max(int(last_timestamp) + 1, self.start), min(self.upper, self.end))
+        self.upper = min(self.upper, int(last_timestamp))
+
+    def skip(self, last_timestamp: Optional[float]):
+        """Leave a page that was not fully stored uncovered: later pages only claim the range below it."""
+        if last_timestamp is None:
+            return
+        upper = int(last_timestamp) - 1
+        self.upper = upper if self.upper is None else min(self.upper, upper)
+
+    def finish(self):
+        """Record that nothing older than the last page exists within the walk's range."""
+        if self.upper is not None:
+            self._record(self.start, min(self.upper, self.end))
+            self.upper = self.start - 1
+
+    def _record(self, start: int, end: int):
+        if start <= end:
+            self.db.record_coverage(start, end, self.token_symbol, self.min_usd)
@@ -1,239 +1,1461 @@
 import sqlite3
+import calendar
 import json
 import csv
-import pandas as pd
-from datetime import datetime
-from typing import List, Dict, Optional, Any
+import os
+import heapq
+import itertools
+import pathlib
+import threading
+from datetime import datetime, timedelta
+from collections import OrderedDict
+from typing import List, Dict, Optional, Any, Callable, Iterable, Iterator, Tuple, Union
+from contextlib import contextmanager
+import time
 import logging
+from sketches import HyperLogLog, QuantileSketch
+from metrics import ROWS_INSERTED, ROWS_DROPPED, PARTITIONS_THAWED, SQLITE_COMMIT_SECONDS
+from transfer_batch import Transfer, TransferBatch, chain_name
+from analytics import AnalyticsMirror, duckdb
+from excel_export import write_xlsx
+from tracing import span
+from coverage_map import COVERAGE_MIN_GAP_SECONDS, Interval, coverage_scope, find_gaps, merge_intervals, scope_covers
 
 logger = logging.getLogger(__name__)
 
+# Store each calendar month of transfers in its own SQLite file when enabled
+PARTITION_BY_MONTH = os.getenv('LIFI_DB_PARTITIONED', '0').lower() in ('1', 'true', 'yes')
+
+# Where get_statistics and get_aggregate scan: 'sqlite', or 'duckdb' for a columnar mirror
+# (needs the optional duckdb package; falls back to SQLite when it cannot be used)
+ANALYTICS_BACKEND = os.getenv('LIFI_ANALYTICS_BACKEND', 'sqlite').lower()
+ANALYTICS_BACKENDS = ('sqlite', 'duckdb')
+
+# Largest transfers kept per (window, bucket, token, chain) leaderboard scope
+LEADERBOARD_SIZE = int(os.getenv('LIFI_LEADERBOARD_SIZE', 100))
+LEADERBOARD_WINDOWS = ('all', 'month', 'day')
+# Leaderboard scopes whose [size, floor] stay cached in memory (least recently used dropped first)
+LEADERBOARD_FLOOR_CACHE_SIZE = int(os.getenv('LIFI_LEADERBOARD_FLOOR_CACHE_SIZE', 5000))
+
+# Transfer statuses that will not change any more; everything else gets refreshed
+FINAL_STATUSES = ('DONE', 'FAILED', 'INVALID')
+
+# /api/v1/aggregate whitelists: public name -> (SQL expression, table alias it needs)
+AGGREGATE_DIMENSIONS = {
+    'tool': ('t.tool', 't'),
+    'status': ('t.status', 't'),
+    'integrator': ('t.integrator', 't'),
+    'source_chain': ('s.chain_name', 's'),
+    'source_token': ('s.token_symbol', 's'),
+    'dest_chain': ('r.chain_name', 'r'),
+    'dest_token': ('r.token_symbol', 'r'),
+}
+AGGREGATE_BUCKETS = {
+    '1h': "strftime('%Y-%m-%d %H:00', s.timestamp)",
+    '1d': "date(s.timestamp)",
+    '1w': "date(s.timestamp, '-6 days', 'weekday 1')",  # Monday of the week
+    '1M': "strftime('%Y-%m', s.timestamp)",
+}
+AGGREGATE_METRICS = ('count', 'sum_usd', 'avg_usd', 'min_usd', 'max_usd')
+AGGREGATE_MAX_ROWS = int(os.getenv('LIFI_AGGREGATE_MAX_ROWS', 10000))
+
+# Rows fetched from SQLite (and held in memory) at a time by streaming exports
+EXPORT_CHUNK_ROWS = int(os.getenv('LIFI_EXPORT_CHUNK_ROWS', 5000))
+
+
+class BatchWriteError(RuntimeError):
+    """Raised by insert_batch when some transfers of a page could not be stored; the rest were."""
+
+    def __init__(self, inserted: int, dropped: int):
+        super().__init__(f"{dropped} transactions of the batch could not be stored")
+        self.inserted = inserted
+        self.dropped = dropped
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection that records commit latency in the shared metrics registry (and the active trace)."""
+
+    def commit(self):
+        if not self.in_transaction:
+            return super().commit()
+        start = time.perf_counter()
+        with span('sqlite.commit', 'db', changes=self.total_changes):
+            super().commit()
+        SQLITE_COMMIT_SECONDS.observe(time.perf_counter() - start)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # The built-in context manager commits in C, bypassing commit() above
+        if exc_type is None:
+            self.commit()
+        return super().__exit__(exc_type, exc_value, traceback)
+
+
 class LiFiDatabase:
-    def __init__(self, db_path: str = "lifi_transactions.db"):
+    def __init__(self, db_path: str = "lifi_transactions.db", partitioned: Optional[bool] = None,
+                 analytics_backend: Optional[str] = None):
         self.db_path = db_path
+        self.partitioned = PARTITION_BY_MONTH if partitioned is None else partitioned
+        self.partition_dir = os.path.splitext(db_path)[0] + "_partitions"
+        self.analytics_backend = analytics_backend or ANALYTICS_BACKEND
+        if self.analytics_backend not in ANALYTICS_BACKENDS:
+            raise ValueError(f"Unsupported analytics backend: {self.analytics_backend}")
+        if self.analytics_backend == 'duckdb' and duckdb is None:
+            logger.warning("LIFI_ANALYTICS_BACKEND=duckdb but the duckdb package is not installed; using SQLite")
+            self.analytics_backend = 'sqlite'
+        self.analytics_path = os.path.splitext(db_path)[0] + "_analytics.duckdb"
+        self._analytics: Optional[AnalyticsMirror] = None
+        self._analytics_lock = threading.Lock()
+        self._sketch_buffer: Dict[Tuple[str, str, int], Dict[str, Any]] = {}
+        self._sketch_lock = threading.Lock()
+        self._leaderboard_floors: "OrderedDict[Tuple[str, str, str, int], List]" = OrderedDict()
+        self._leaderboard_lock = threading.Lock()
         self.init_database()
 
-    def get_connection(self):
+    def get_connection(self, db_path: Optional[str] = None):
         """Get database connection with proper settings."""
-        conn = sqlite3.connect(self.db_path)
+        conn = sqlite3.connect(db_path or self.db_path, uri=True, factory=TimedConnection)
         conn.row_factory = sqlite3.Row  # Enable column access by name
         return conn
 
+    @contextmanager
+    def connection(self, db_path: Optional[str] = None) -> Iterator[sqlite3.Connection]:
+        """get_connection for one with-block: committed (rolled back on error) and closed when it ends."""
+        conn = self.get_connection(db_path)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
     def init_database(self):
         """Initialize database with required tables."""
-        with self.get_connection() as conn:
+        with self.connection() as conn:
             cursor = conn.cursor()
+            # Lets retention hand freed pages back to the filesystem (only takes effect on a new file)
+            cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            # WAL lets the web server's reader threads run while the fetch job writes
+            cursor.execute("PRAGMA journal_mode=WAL")
+            self._create_schema(cursor)
 
-            # Main transactions table
+            # Catalog of monthly partition files (only used in partitioned mode)
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS transactions (
-                    transaction_id TEXT PRIMARY KEY,
-                    from_address TEXT,
-                    to_address TEXT,
-                    tool TEXT,
-                    status TEXT,
-                    substatus TEXT,
-                    substatus_message TEXT,
-                    lifi_explorer_link TEXT,
-                    integrator TEXT,
+                CREATE TABLE IF NOT EXISTS partitions (
+                    month TEXT PRIMARY KEY,
+                    file_path TEXT NOT NULL,
+                    frozen INTEGER DEFAULT 0,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    frozen_at TIMESTAMP
                 )
             ''')
 
-            # Sending transactions details
+            # Data generation counter, bumped by writers so readers can cache results
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS sending_transactions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    transaction_id TEXT,
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER
+                )
+            ''')
+            cursor.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('data_generation', 0)")
+
+            # Transfers whose status is not final yet (drives the status refresh job)
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pending_transfers'")
+            has_pending_table = cursor.fetchone() is not None
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS pending_transfers (
+                    transaction_id TEXT PRIMARY KEY,
                     tx_hash TEXT,
-                    tx_link TEXT,
-                    token_address TEXT,
+                    month TEXT,
+                    status TEXT,
+                    check_count INTEGER DEFAULT 0,
+                    first_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_checked_at TIMESTAMP
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_pending_last_checked ON pending_transfers(last_checked_at)')
+
+            # Mergeable per token/chain/day sketches for approximate analytics
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS transfer_sketches (
+                    day TEXT,
                     token_symbol TEXT,
-                    token_name TEXT,
-                    token_decimals INTEGER,
-                    token_price_usd DECIMAL,
                     chain_id INTEGER,
                     chain_name TEXT,
-                    amount TEXT,
-                    amount_usd DECIMAL,
-                    gas_price TEXT,
-                    gas_used TEXT,
-                    gas_amount TEXT,
-                    gas_amount_usd DECIMAL,
-                    timestamp TIMESTAMP,
-                    FOREIGN KEY (transaction_id) REFERENCES transactions (transaction_id)
+                    tx_count INTEGER DEFAULT 0,
+                    volume_usd REAL DEFAULT 0,
+                    senders_hll BLOB,
+                    receivers_hll BLOB,
+                    amount_sketch BLOB,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (day, token_symbol, chain_id)
                 )
             ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_sketches_token_day ON transfer_sketches(token_symbol, day)')
 
-            # Receiving transactions details
+            # The day sketches pre-merged per scope ('all', 'token', 'chain', 'month'), kept current
+            # by flush_sketches so the common statistics do not merge every day row
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sketch_rollups'")
+            has_rollup_table = cursor.fetchone() is not None
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS receiving_transactions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    transaction_id TEXT,
-                    tx_hash TEXT,
-                    tx_link TEXT,
-                    token_address TEXT,
+                CREATE TABLE IF NOT EXISTS sketch_rollups (
+                    scope TEXT,
+                    key TEXT,
+                    label TEXT,
+                    tx_count INTEGER DEFAULT 0,
+                    volume_usd REAL DEFAULT 0,
+                    senders_hll BLOB,
+                    receivers_hll BLOB,
+                    amount_sketch BLOB,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (scope, key)
+                )
+            ''')
+
+            # Bounded top-N largest transfers per window/bucket/token/chain
+            # (token_symbol '*' and chain_id 0 are the all-tokens / all-chains scopes)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS leaderboard (
+                    window TEXT,
+                    bucket TEXT,
                     token_symbol TEXT,
-                    token_name TEXT,
-                    token_decimals INTEGER,
-                    token_price_usd DECIMAL,
                     chain_id INTEGER,
-                    chain_name TEXT,
-                    amount TEXT,
-                    amount_usd DECIMAL,
-                    gas_price TEXT,
-                    gas_used TEXT,
-                    gas_amount TEXT,
-                    gas_amount_usd DECIMAL,
+                    transaction_id TEXT,
+                    amount_usd REAL,
                     timestamp TIMESTAMP,
-                    FOREIGN KEY (transaction_id) REFERENCES transactions (transaction_id)
+                    sending_token TEXT,
+                    sending_chain TEXT,
+                    from_address TEXT,
+                    to_address TEXT,
+                    tool TEXT,
+                    lifi_explorer_link TEXT,
+                    PRIMARY KEY (window, bucket, token_symbol, chain_id, transaction_id)
                 )
             ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_leaderboard_scope_amount
+                ON leaderboard(window, bucket, token_symbol, chain_id, amount_usd DESC)
+            ''')
+            # Per-token/chain day boards are no longer kept (see _leaderboard_scopes)
+            cursor.execute("DELETE FROM leaderboard WHERE window = 'day' AND (token_symbol != '*' OR chain_id != 0)")
 
-            # Create indexes for better performance
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_status ON transactions(status)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_tool ON transactions(tool)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_sending_token_symbol ON sending_transactions(token_symbol)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_sending_amount_usd ON sending_transactions(amount_usd)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_sending_timestamp ON sending_transactions(timestamp)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_receiving_token_symbol ON receiving_transactions(token_symbol)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_receiving_timestamp ON receiving_transactions(timestamp)')
+            # Time ranges fully ingested per filter set (token_symbol '*' is every token), as
+            # disjoint closed ranges of epoch seconds; drives gap detection and repair
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS coverage (
+                    token_symbol TEXT,
+                    min_usd REAL,
+                    start_ts INTEGER,
+                    end_ts INTEGER,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (token_symbol, min_usd, start_ts)
+                )
+            ''')
 
             conn.commit()
             logger.info("Database initialized successfully")
 
+        if self.partitioned:
+            os.makedirs(self.partition_dir, exist_ok=True)
+
+        # Databases created before status tracking existed need their pending set seeded once
+        if not has_pending_table:
+            self.rebuild_pending_index()
+        # ...and those created before sketch rollups existed need them merged once
+        if not has_rollup_table:
+            self.rebuild_sketch_rollups()
+
+    def _create_schema(self, cursor):
+        """Create the transaction tables and indexes on the given cursor's database."""
+        # Main transactions table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS transactions (
+                transaction_id TEXT PRIMARY KEY,
+                from_address TEXT,
+                to_address TEXT,
+                tool TEXT,
+                status TEXT,
+                substatus TEXT,
+                substatus_message TEXT,
+                lifi_explorer_link TEXT,
+                integrator TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Sending transactions details
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sending_transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                transaction_id TEXT,
+                tx_hash TEXT,
+                tx_link TEXT,
+                token_address TEXT,
+                token_symbol TEXT,
+                token_name TEXT,
+                token_decimals INTEGER,
+                token_price_usd DECIMAL,
+                chain_id INTEGER,
+                chain_name TEXT,
+                amount TEXT,
+                amount_usd DECIMAL,
+                gas_price TEXT,
+                gas_used TEXT,
+                gas_amount TEXT,
+                gas_amount_usd DECIMAL,
+                timestamp TIMESTAMP,
+                FOREIGN KEY (transaction_id) REFERENCES transactions (transaction_id)
+            )
+        ''')
+
+        # Receiving transactions details
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS receiving_transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                transaction_id TEXT,
+                tx_hash TEXT,
+                tx_link TEXT,
+                token_address TEXT,
+                token_symbol TEXT,
+                token_name TEXT,
+                token_decimals INTEGER,
+                token_price_usd DECIMAL,
+                chain_id INTEGER,
+                chain_name TEXT,
+                amount TEXT,
+                amount_usd DECIMAL,
+                gas_price TEXT,
+                gas_used TEXT,
+                gas_amount TEXT,
+                gas_amount_usd DECIMAL,
+                timestamp TIMESTAMP,
+                FOREIGN KEY (transaction_id) REFERENCES transactions (transaction_id)
+            )
+        ''')
+
+        # Create indexes for better performance
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_status ON transactions(status)')
+        # Status changes since the analytics mirror last synced
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_updated_at ON transactions(updated_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_tool ON transactions(tool)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sending_token_symbol ON sending_transactions(token_symbol)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sending_amount_usd ON sending_transactions(amount_usd)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sending_timestamp ON sending_transactions(timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_receiving_token_symbol ON receiving_transactions(token_symbol)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_receiving_timestamp ON receiving_transactions(timestamp)')
+        # Leg lookups by transaction, and token + time range scans (aggregates, filtered views)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sending_transaction_id ON sending_transactions(transaction_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_receiving_transaction_id ON receiving_transactions(transaction_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sending_token_timestamp ON sending_transactions(token_symbol, timestamp)')
+
+    def get_generation(self) -> int:
+        """Current data generation; changes whenever stored data changes."""
+        with self.connection() as conn:
+            return conn.execute("SELECT value FROM meta WHERE key = 'data_generation'").fetchone()[0]
+
+    def _bump_generation(self):
+        """Mark committed writes as visible to generation-keyed caches."""
+        with self.connection() as conn:
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'data_generation'")
+            conn.commit()
+
     def get_chain_name(self, chain_id: int) -> str:
         """Convert chain ID to human-readable name."""
-        chain_map = {
-            1: "Ethereum", 10: "Optimism", 56: "BNB Smart Chain", 100: "Gnosis Chain",
-            137: "Polygon", 250: "Fantom", 42161: "Arbitrum", 43114: "Avalanche",
-            20000000000001: "Bitcoin", 747474: "Katana", 8453: "Base",
-            324: "zkSync Era", 59144: "Linea", 534352: "Scroll"
-        }
-        return chain_map.get(chain_id, f"Chain {chain_id}")
+        return chain_name(chain_id)
+
+    # --- Monthly partitions ---
+
+    def _partition_uri(self, file_path: str, frozen: bool) -> str:
+        """Build the SQLite URI used to ATTACH a partition file."""
+        uri = pathlib.Path(file_path).absolute().as_uri()
+        # Frozen partitions never change, so SQLite can skip locking entirely
+        return uri + '?mode=ro&immutable=1' if frozen else uri
+
+    def _ensure_partition(self, month: str) -> Optional[str]:
+        """Return the writable file for a month, creating it if needed (None if frozen)."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT file_path, frozen FROM partitions WHERE month = ?", (month,))
+            row = cursor.fetchone()
+            if row:
+                return None if row['frozen'] else row['file_path']
+
+            file_path = os.path.join(self.partition_dir, f"transactions_{month.replace('-', '_')}.db")
+            os.makedirs(self.partition_dir, exist_ok=True)
+            with self.connection(file_path) as part_conn:
+                part_conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                part_conn.execute("PRAGMA journal_mode=WAL")
+                self._create_schema(part_conn.cursor())
+                part_conn.commit()
+            part_conn.close()
+
+            cursor.execute("INSERT OR IGNORE INTO partitions (month, file_path) VALUES (?, ?)", (month, file_path))
+            conn.commit()
+            logger.info(f"Created partition {month} at {file_path}")
+            return file_path
+
+    def list_partitions(self, start_date: Optional[str] = None,
+                        end_date: Optional[str] = None) -> List[Dict[str, Any]]:
+        """List partitions, pruned to the months overlapping the given date range."""
+        query = "SELECT month, file_path, frozen, frozen_at FROM partitions WHERE 1=1"
+        params = []
+        if start_date:
+            query += " AND month >= ?"
+            params.append(str(start_date)[:7])
+        if end_date:
+            query += " AND month <= ?"
+            params.append(str(end_date)[:7])
+        query += " ORDER BY month DESC"
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            return [dict(row) for row in cursor.fetchall()]
+
+    @contextmanager
+    def _sources(self, start_date: Optional[str] = None,
+                 end_date: Optional[str] = None) -> Iterator[Tuple[sqlite3.Connection, Iterator[str]]]:
+        """Yield a connection plus an iterator of schema names to query.
+
+        The main database is always a source (it holds rows without a timestamp
+        and any data written before partitioning was enabled). Partitions are
+        ATTACHed one at a time as the iterator advances, so the SQLite attach
+        limit never applies no matter how many months are stored.
+        """
+        conn = self.get_connection()
+
+        def schemas():
+            yield 'main'
+            if not self.partitioned:
+                return
+            for partition in self.list_partitions(start_date, end_date):
+                if not os.path.exists(partition['file_path']):
+                    continue
+                conn.execute("ATTACH DATABASE ? AS part",
+                             (self._partition_uri(partition['file_path'], partition['frozen']),))
+                try:
+                    yield 'part'
+                finally:
+                    conn.execute("DETACH DATABASE part")
+
+        try:
+            yield conn, schemas()
+        finally:
+            conn.close()
+
+    def freeze_partitions(self, before_month: Optional[str] = None) -> List[str]:
+        """Compact old partitions and mark them read-only.
+
+        Every partition older than `before_month` (default: the current month)
+        is ANALYZEd, VACUUMed and chmod'ed read-only, unless it still holds
+        non-final transfers. Later inserts for a frozen month are rejected, so
+        writes only ever touch the current partition.
+        """
+        before_month = before_month or datetime.now().strftime('%Y-%m')
+        frozen = []
+
+        with self.connection() as conn:
+            pending_months = {row[0] for row in conn.execute("SELECT DISTINCT month FROM pending_transfers")}
+
+        for partition in self.list_partitions():
+            if partition['frozen'] or partition['month'] >= before_month:
+                continue
+            if partition['month'] in pending_months:
+                # Status refreshes still need to write here
+                continue
+            self._freeze_partition(partition['month'], partition['file_path'])
+            frozen.append(partition['month'])
+
+        return frozen
+
+    def _freeze_partition(self, month: str, file_path: str):
+        """ANALYZE, VACUUM and chmod one partition file read-only, then mark it frozen."""
+        part_conn = self.get_connection(file_path)
+        try:
+            part_conn.execute("ANALYZE")
+            part_conn.commit()
+            # Fold the WAL back in: a read-only file must be self-contained
+            part_conn.execute("PRAGMA journal_mode=DELETE")
+            part_conn.execute("VACUUM")
+        finally:
+            part_conn.close()
+        os.chmod(file_path, 0o444)
+
+        with self.connection() as conn:
+            conn.execute("UPDATE partitions SET frozen = 1, frozen_at = CURRENT_TIMESTAMP WHERE month = ?", (month,))
+            conn.commit()
+        logger.info(f"Froze partition {month}")
+
+    def thaw_partition(self, month: str) -> bool:
+        """Make a frozen partition writable again (e.g. to backfill late data)."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT file_path FROM partitions WHERE month = ? AND frozen = 1", (month,))
+            row = cursor.fetchone()
+            if not row:
+                return False
+            os.chmod(row['file_path'], 0o644)
+            cursor.execute("UPDATE partitions SET frozen = 0, frozen_at = NULL WHERE month = ?", (month,))
+            conn.commit()
+            logger.info(f"Thawed partition {month}")
+            return True
 
-    def insert_transaction(self, tx_data: Dict[str, Any]) -> bool:
+    def _target_path(self, transfer: Transfer) -> Optional[str]:
+        """Database file a transfer is stored in (None if its partition is frozen)."""
+        if not self.partitioned:
+            return self.db_path
+        month = transfer.month
+        if not month:
+            return self.db_path
+        return self._ensure_partition(month)
+
+    def insert_transaction(self, tx_data: Dict[str, Any], flush_sketches: bool = True) -> bool:
         """Insert a single transaction into the database."""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
+            return self.insert_batch(TransferBatch.from_payloads([tx_data]), flush_sketches) == 1
+        except BatchWriteError:
+            return False
+
+    def _thaw_for_late_transfers(self, month: str) -> Optional[str]:
+        """Thaw a frozen month that received late transfers; returns its file (None if it stays frozen)."""
+        try:
+            if not self.thaw_partition(month):
+                return None
+        except OSError as e:
+            logger.error(f"Could not thaw partition {month} for late transfers: {e}")
+            return None
+        PARTITIONS_THAWED.inc()
+        logger.info(f"Thawed partition {month} to store late transfers")
+        return self._ensure_partition(month)
+
+    def insert_batch(self, batch: TransferBatch, flush_sketches: bool = True) -> int:
+        """Insert a page of transfers; returns how many were new.
+
+        Each target file gets one connection and one transaction, with one
+        executemany per table. Transfers already stored are skipped, except
+        that a newer status for a non-final one is taken. Late transfers for a
+        frozen month thaw its partition; the next completed backfill freezes
+        it again.
+
+        Raises BatchWriteError, once the stored transfers are fully recorded,
+        if any could not be written (a failed write or a partition that stays
+        frozen), so callers can tell a page that was only partly saved.
+        """
+        groups: Dict[str, List[Transfer]] = {}
+        paths: Dict[Optional[str], Optional[str]] = {}
+        dropped = 0
+        for transfer in batch:
+            month = transfer.month if self.partitioned else None
+            if month not in paths:
+                paths[month] = self._target_path(transfer)
+                if paths[month] is None:
+                    paths[month] = self._thaw_for_late_transfers(month)
+            if paths[month] is None:
+                ROWS_DROPPED.inc(reason='frozen_partition')
+                logger.warning(f"Skipping transaction {transfer.transaction_id}: its partition is frozen")
+                dropped += 1
+                continue
+            groups.setdefault(paths[month], []).append(transfer)
+
+        inserted: List[Transfer] = []
+        updated: List[Transfer] = []
+        for target_path, transfers in groups.items():
+            try:
+                new, changed = self._write_transfers(target_path, transfers)
+            except Exception as e:
+                ROWS_DROPPED.inc(len(transfers), reason='write_error')
+                logger.error(f"Error inserting {len(transfers)} transactions: {e}")
+                dropped += len(transfers)
+                continue
+            inserted.extend(new)
+            updated.extend(changed)
+
+        if inserted:
+            ROWS_INSERTED.inc(len(inserted))
+        self._track_pending([t for t in inserted if t.status not in FINAL_STATUSES] + updated)
+        for transfer in inserted:
+            sending = transfer.sending
+            if sending:
+                self._record_sketch(sending.time, sending.token_symbol, sending.chain_id,
+                                    transfer.from_address, transfer.to_address, sending.amount_usd)
+        self._update_leaderboard(inserted)
+        if flush_sketches:
+            self.flush_sketches()
+        if inserted or updated:
+            self._bump_generation()
+        if dropped:
+            raise BatchWriteError(len(inserted), dropped)
+        return len(inserted)
+
+    def _write_transfers(self, target_path: str, transfers: List[Transfer]) -> Tuple[List[Transfer], List[Transfer]]:
+        """Store transfers in one file; returns (inserted, existing ones whose status was updated)."""
+        with self.connection(target_path) as conn:
+            cursor = conn.cursor()
+
+            existing = self._stored_states(cursor, [transfer.transaction_id for transfer in transfers])
+            new, changed, seen = [], [], set()
+            for transfer in transfers:
+                if transfer.transaction_id in existing:
+                    # Seen again while still non-final: take the newer state
+                    if self._state_changed(existing[transfer.transaction_id], transfer):
+                        changed.append(transfer)
+                elif transfer.transaction_id not in seen:
+                    seen.add(transfer.transaction_id)
+                    new.append(transfer)
+            self._upsert_statuses(cursor, changed)
+
+            cursor.executemany('''
+                INSERT INTO transactions (
+                    transaction_id, from_address, to_address, tool, status,
+                    substatus, substatus_message, lifi_explorer_link, integrator
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [transfer.row() for transfer in new])
+            cursor.executemany('''
+                INSERT INTO sending_transactions (
+                    transaction_id, tx_hash, tx_link, token_address, token_symbol,
+                    token_name, token_decimals, token_price_usd, chain_id, chain_name,
+                    amount, amount_usd, gas_price, gas_used, gas_amount, gas_amount_usd, timestamp
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [t.sending.row(t.transaction_id) for t in new if t.sending])
+            cursor.executemany('''
+                INSERT INTO receiving_transactions (
+                    transaction_id, tx_hash, tx_link, token_address, token_symbol,
+                    token_name, token_decimals, token_price_usd, chain_id, chain_name,
+                    amount, amount_usd, gas_price, gas_used, gas_amount, gas_amount_usd, timestamp
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [t.receiving.row(t.transaction_id) for t in new if t.receiving])
+            conn.commit()
+        return new, changed
+
+    # --- Status refresh for non-final transfers ---
 
-                # Check if transaction already exists
-                cursor.execute(
-                    "SELECT transaction_id FROM transactions WHERE transaction_id = ?",
-                    (tx_data.get('transactionId'),)
+    @staticmethod
+    def _stored_states(cursor, transaction_ids: List[str]) -> Dict[str, sqlite3.Row]:
+        """Status, substatus and receiving-leg presence of stored transfers, in chunks below the parameter limit."""
+        states = {}
+        for start in range(0, len(transaction_ids), 500):
+            chunk = transaction_ids[start:start + 500]
+            cursor.execute(f'''
+                SELECT t.transaction_id, t.status, t.substatus,
+                       EXISTS (SELECT 1 FROM receiving_transactions r WHERE r.transaction_id = t.transaction_id)
+                           AS has_receiving
+                FROM transactions t WHERE t.transaction_id IN ({','.join('?' * len(chunk))})
+            ''', chunk)
+            states.update((row['transaction_id'], row) for row in cursor.fetchall())
+        return states
+
+    @staticmethod
+    def _state_changed(stored: sqlite3.Row, transfer: Transfer) -> bool:
+        """Whether fresh data moves a non-final stored transfer on (status, substatus or a new receiving leg)."""
+        if stored['status'] in FINAL_STATUSES:
+            return False
+        return (transfer.status != stored['status']
+                or transfer.substatus != stored['substatus']
+                or (transfer.receiving is not None and not stored['has_receiving']))
+
+    def _upsert_statuses(self, cursor, transfers: List[Transfer]):
+        """Update status fields and receiving legs of already stored transfers, one executemany per statement."""
+        if not transfers:
+            return
+        cursor.executemany('''
+            UPDATE transactions
+            SET status = ?, substatus = ?, substatus_message = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE transaction_id = ?
+        ''', [(t.status, t.substatus, t.substatus_message, t.transaction_id) for t in transfers])
+
+        receiving = [t for t in transfers if t.receiving is not None]
+        if not receiving:
+            return
+        leg_ids = {}
+        ids = [t.transaction_id for t in receiving]
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            cursor.execute(
+                f"SELECT id, transaction_id FROM receiving_transactions WHERE transaction_id IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            leg_ids.update((row['transaction_id'], row['id']) for row in cursor.fetchall())
+        cursor.executemany('''
+            UPDATE receiving_transactions SET
+                transaction_id = ?, tx_hash = ?, tx_link = ?, token_address = ?, token_symbol = ?,
+                token_name = ?, token_decimals = ?, token_price_usd = ?, chain_id = ?, chain_name = ?,
+                amount = ?, amount_usd = ?, gas_price = ?, gas_used = ?, gas_amount = ?, gas_amount_usd = ?, timestamp = ?
+            WHERE id = ?
+        ''', [t.receiving.row(t.transaction_id) + (leg_ids[t.transaction_id],)
+              for t in receiving if t.transaction_id in leg_ids])
+        cursor.executemany('''
+            INSERT INTO receiving_transactions (
+                transaction_id, tx_hash, tx_link, token_address, token_symbol,
+                token_name, token_decimals, token_price_usd, chain_id, chain_name,
+                amount, amount_usd, gas_price, gas_used, gas_amount, gas_amount_usd, timestamp
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [t.receiving.row(t.transaction_id) for t in receiving if t.transaction_id not in leg_ids])
+
+    def _track_pending(self, transfers: List[Transfer]):
+        """Add non-final transfers to the pending set, and drop the ones that became final."""
+        if not transfers:
+            return
+        with self.connection() as conn:
+            conn.executemany("DELETE FROM pending_transfers WHERE transaction_id = ?",
+                             [(t.transaction_id,) for t in transfers if t.status in FINAL_STATUSES])
+            conn.executemany('''
+                INSERT INTO pending_transfers (transaction_id, tx_hash, month, status)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(transaction_id) DO UPDATE SET status = excluded.status
+            ''', [
+                (t.transaction_id, t.sending.tx_hash if t.sending else None, t.month, t.status)
+                for t in transfers if t.status not in FINAL_STATUSES
+            ])
+            conn.commit()
+
+    def get_pending_transactions(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Non-final transfers to re-check, least recently checked first."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT transaction_id, tx_hash, month, status, check_count, last_checked_at
+                FROM pending_transfers
+                ORDER BY last_checked_at IS NOT NULL, last_checked_at
+                LIMIT ?
+            ''', (limit,))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def count_pending_transactions(self) -> int:
+        """Number of transfers still waiting for a final status."""
+        with self.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM pending_transfers").fetchone()[0]
+
+    def mark_pending_checked(self, transaction_ids: List[str]):
+        """Record a refresh attempt for transfers whose status did not change."""
+        with self.connection() as conn:
+            conn.executemany('''
+                UPDATE pending_transfers
+                SET check_count = check_count + 1, last_checked_at = CURRENT_TIMESTAMP
+                WHERE transaction_id = ?
+            ''', [(transaction_id,) for transaction_id in transaction_ids])
+            conn.commit()
+
+    def update_transaction_status(self, tx_data: Dict[str, Any]) -> bool:
+        """Upsert status, substatus and receiving leg of a stored transfer from fresh API data."""
+        return bool(self.update_transaction_statuses([tx_data]))
+
+    def update_transaction_statuses(self, payloads: List[Dict[str, Any]]) -> List[str]:
+        """Upsert status, substatus and receiving legs of stored transfers from fresh API data.
+
+        Like insert_batch, each target file gets one connection and one
+        transaction. Only stored transfers whose state moved on (see
+        _state_changed) are written; returns their ids.
+        """
+        groups: Dict[str, List[Transfer]] = {}
+        for tx_data in payloads:
+            try:
+                transfer = Transfer(tx_data)
+                target_path = self._target_path(transfer)
+            except Exception as e:
+                logger.error(f"Error updating transaction status: {e}")
+                continue
+            if target_path is None:
+                logger.warning(f"Cannot refresh {transfer.transaction_id}: its partition is frozen")
+                continue
+            groups.setdefault(target_path, []).append(transfer)
+
+        updated: List[Transfer] = []
+        for target_path, transfers in groups.items():
+            try:
+                with self.connection(target_path) as conn:
+                    cursor = conn.cursor()
+                    stored = self._stored_states(cursor, [t.transaction_id for t in transfers])
+                    found = [t for t in transfers
+                             if t.transaction_id in stored and self._state_changed(stored[t.transaction_id], t)]
+                    self._upsert_statuses(cursor, found)
+                    conn.commit()
+            except Exception as e:
+                logger.error(f"Error updating {len(transfers)} transaction statuses: {e}")
+                continue
+            updated.extend(found)
+
+        if updated:
+            self._track_pending(updated)
+            self.mark_pending_checked([t.transaction_id for t in updated])
+            self._bump_generation()
+        return [t.transaction_id for t in updated]
+
+    def rebuild_pending_index(self) -> int:
+        """Re-derive the pending set from stored statuses (for pre-existing data)."""
+        placeholders = ', '.join('?' for _ in FINAL_STATUSES)
+        rows = []
+        with self._sources() as (conn, schemas):
+            for schema in schemas:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT t.transaction_id, t.status, s.tx_hash, s.timestamp
+                    FROM {schema}.transactions t
+                    LEFT JOIN {schema}.sending_transactions s ON t.transaction_id = s.transaction_id
+                    WHERE t.status IS NULL OR t.status NOT IN ({placeholders})
+                ''', FINAL_STATUSES)
+                rows.extend(
+                    (row['transaction_id'], row['tx_hash'], row['timestamp'][:7] if row['timestamp'] else None, row['status'])
+                    for row in cursor.fetchall()
                 )
-                if cursor.fetchone():
-                    return False  # Transaction already exists
 
-                # Extract metadata
-                metadata = tx_data.get('metadata', {})
+        with self.connection() as conn:
+            conn.execute("DELETE FROM pending_transfers")
+            conn.executemany(
+                "INSERT OR IGNORE INTO pending_transfers (transaction_id, tx_hash, month, status) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            conn.commit()
+        logger.info(f"Tracking {len(rows)} non-final transfers")
+        return len(rows)
+
+    def record_coverage(self, start_ts: int, end_ts: int, token_symbol: Optional[str] = None, min_usd: float = 0):
+        """Mark [start_ts, end_ts] as fully ingested for a filter set, merged with the ranges it touches."""
+        if end_ts < start_ts:
+            return
+        token, min_usd = coverage_scope(token_symbol, min_usd)
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT start_ts, end_ts FROM coverage
+                WHERE token_symbol = ? AND min_usd = ? AND start_ts <= ? AND end_ts >= ?
+            ''', (token, min_usd, end_ts + 1, start_ts - 1))
+            touching = [(row['start_ts'], row['end_ts']) for row in cursor.fetchall()]
+            (merged_start, merged_end), = merge_intervals(touching + [(start_ts, end_ts)])
+            cursor.executemany("DELETE FROM coverage WHERE token_symbol = ? AND min_usd = ? AND start_ts = ?",
+                               [(token, min_usd, interval_start) for interval_start, _ in touching])
+            cursor.execute("INSERT INTO coverage (token_symbol, min_usd, start_ts, end_ts) VALUES (?, ?, ?, ?)",
+                           (token, min_usd, merged_start, merged_end))
+            conn.commit()
+
+    def _covered_intervals(self, token_symbol: Optional[str], min_usd: Optional[float]) -> List[Interval]:
+        """Merged ranges ingested under any filter set that includes token_symbol/min_usd."""
+        with self.connection() as conn:
+            rows = conn.execute("SELECT token_symbol, min_usd, start_ts, end_ts FROM coverage").fetchall()
+        return merge_intervals((row['start_ts'], row['end_ts']) for row in rows
+                               if scope_covers((row['token_symbol'], row['min_usd']), token_symbol, min_usd))
+
+    def find_coverage_gaps(self, start_ts: int, end_ts: int, token_symbol: Optional[str] = None,
+                           min_usd: float = 0) -> List[Interval]:
+        """Ranges of [start_ts, end_ts] not yet fully ingested for the filter set, oldest first."""
+        return find_gaps(self._covered_intervals(token_symbol, min_usd), int(start_ts), int(end_ts),
+                         COVERAGE_MIN_GAP_SECONDS)
+
+    def get_coverage(self, start_ts: int, end_ts: int, token_symbol: Optional[str] = None,
+                     min_usd: float = 0) -> Dict[str, Any]:
+        """Covered ranges and gaps of [start_ts, end_ts] for a filter set, with totals in seconds."""
+        start_ts, end_ts = int(start_ts), int(end_ts)
+
+        def describe(intervals):
+            return [{'start': a, 'end': b,
+                     'start_date': datetime.fromtimestamp(a).isoformat(),
+                     'end_date': datetime.fromtimestamp(b).isoformat(),
+                     'seconds': b - a + 1} for a, b in intervals]
+
+        covered = [(max(a, start_ts), min(b, end_ts)) for a, b in self._covered_intervals(token_symbol, min_usd)
+                   if a <= end_ts and b >= start_ts]
+        gaps = self.find_coverage_gaps(start_ts, end_ts, token_symbol, min_usd)
+        total = max(end_ts - start_ts + 1, 1)
+        covered_seconds = sum(b - a + 1 for a, b in covered)
+        token, min_usd = coverage_scope(token_symbol, min_usd)
+        return {
+            'token_symbol': token,
+            'min_usd': min_usd,
+            'start_date': datetime.fromtimestamp(start_ts).isoformat(),
+            'end_date': datetime.fromtimestamp(end_ts).isoformat(),
+            'covered': describe(covered),
+            'gaps': describe(gaps),
+            'covered_seconds': covered_seconds,
+            'gap_seconds': sum(b - a + 1 for a, b in gaps),
+            'coverage_percent': round(100.0 * covered_seconds / total, 2)
+        }
+
+    def bulk_insert_transactions(self, transactions: Union[TransferBatch, List[Dict[str, Any]]]) -> int:
+        """Insert multiple transactions efficiently (API payloads or an already parsed TransferBatch)."""
+        if not isinstance(transactions, TransferBatch):
+            transactions = TransferBatch.from_payloads(transactions)
+        return self.insert_batch(transactions)
+
+    # --- Approximate analytics sketches ---
+
+    def _record_sketch(self, timestamp, token_symbol: Optional[str], chain_id: Optional[int],
+                       from_address: Optional[str], to_address: Optional[str], amount_usd: Optional[float]):
+        """Fold one transfer into the in-memory sketch buffer (flushed by flush_sketches)."""
+        if not timestamp:
+            return
+        if isinstance(timestamp, str):
+            day = timestamp[:10]
+        elif isinstance(timestamp, datetime):
+            day = timestamp.strftime('%Y-%m-%d')
+        else:
+            day = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')
+        key = (day, token_symbol or '', chain_id or 0)
+
+        with self._sketch_lock:
+            entry = self._sketch_buffer.get(key)
+            if entry is None:
+                entry = self._sketch_buffer[key] = self._new_sketch_entry()
+            entry['tx_count'] += 1
+            entry['volume_usd'] += amount_usd or 0
+            entry['senders'].add(from_address)
+            entry['receivers'].add(to_address)
+            entry['amounts'].add(amount_usd)
+
+    @staticmethod
+    def _new_sketch_entry() -> Dict[str, Any]:
+        return {
+            'tx_count': 0,
+            'volume_usd': 0.0,
+            'senders': HyperLogLog(),
+            'receivers': HyperLogLog(),
+            'amounts': QuantileSketch()
+        }
+
+    @staticmethod
+    def _merge_sketch_entry(entry: Dict[str, Any], other: Dict[str, Any]):
+        """Fold one in-memory sketch entry into another."""
+        entry['tx_count'] += other['tx_count']
+        entry['volume_usd'] += other['volume_usd']
+        entry['senders'].merge(other['senders'])
+        entry['receivers'].merge(other['receivers'])
+        entry['amounts'].merge(other['amounts'])
+
+    @staticmethod
+    def _merge_sketch_rows(entry: Dict[str, Any], rows: Iterable[sqlite3.Row]) -> Dict[str, Any]:
+        """Fold stored sketch rows (of either sketch table) into an in-memory entry."""
+        for row in rows:
+            entry['tx_count'] += row['tx_count']
+            entry['volume_usd'] += row['volume_usd'] or 0
+            entry['senders'].merge_blobs((row['senders_hll'],))
+            entry['receivers'].merge_blobs((row['receivers_hll'],))
+            entry['amounts'].merge(QuantileSketch.from_bytes(row['amount_sketch']))
+        return entry
+
+    def flush_sketches(self) -> int:
+        """Merge buffered sketches into the transfer_sketches table and its rollups."""
+        with self._sketch_lock:
+            buffer, self._sketch_buffer = self._sketch_buffer, {}
+        if not buffer:
+            return 0
+
+        # The buffer's contribution to each rollup, merged in memory first
+        rollups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        labels: Dict[Tuple[str, str], str] = {}
+        for (day, token_symbol, chain_id), entry in buffer.items():
+            for key in (('all', ''), ('token', token_symbol), ('chain', str(chain_id)), ('month', day[:7])):
+                if key not in rollups:
+                    rollups[key] = self._new_sketch_entry()
+                self._merge_sketch_entry(rollups[key], entry)
+            labels[('chain', str(chain_id))] = self.get_chain_name(chain_id)
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            for (day, token_symbol, chain_id), entry in buffer.items():
+                cursor.execute('''
+                    SELECT tx_count, volume_usd, senders_hll, receivers_hll, amount_sketch
+                    FROM transfer_sketches WHERE day = ? AND token_symbol = ? AND chain_id = ?
+                ''', (day, token_symbol, chain_id))
+                self._merge_sketch_rows(entry, cursor.fetchall())
 
-                # Insert main transaction
                 cursor.execute('''
-                    INSERT INTO transactions (
-                        transaction_id, from_address, to_address, tool, status,
-                        substatus, substatus_message, lifi_explorer_link, integrator
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    INSERT OR REPLACE INTO transfer_sketches (
+                        day, token_symbol, chain_id, chain_name, tx_count, volume_usd,
+                        senders_hll, receivers_hll, amount_sketch, updated_at
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
                 ''', (
-                    tx_data.get('transactionId'),
-                    tx_data.get('fromAddress'),
-                    tx_data.get('toAddress'),
-                    tx_data.get('tool'),
-                    tx_data.get('status'),
-                    tx_data.get('substatus'),
-                    tx_data.get('substatusMessage'),
-                    tx_data.get('lifiExplorerLink'),
-                    metadata.get('integrator')
+                    day, token_symbol, chain_id, self.get_chain_name(chain_id),
+                    entry['tx_count'], entry['volume_usd'],
+                    entry['senders'].to_bytes(), entry['receivers'].to_bytes(), entry['amounts'].to_bytes()
                 ))
 
-                # Insert sending transaction details
-                sending = tx_data.get('sending', {})
-                if sending:
-                    sending_token = sending.get('token', {})
-                    cursor.execute('''
-                        INSERT INTO sending_transactions (
-                            transaction_id, tx_hash, tx_link, token_address, token_symbol,
-                            token_name, token_decimals, token_price_usd, chain_id, chain_name,
-                            amount, amount_usd, gas_price, gas_used, gas_amount, gas_amount_usd, timestamp
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        tx_data.get('transactionId'),
-                        sending.get('txHash'),
-                        sending.get('txLink'),
-                        sending_token.get('address'),
-                        sending_token.get('symbol'),
-                        sending_token.get('name'),
-                        sending_token.get('decimals'),
-                        float(sending_token.get('priceUSD', 0)) if sending_token.get('priceUSD') else None,
-                        sending.get('chainId'),
-                        self.get_chain_name(sending.get('chainId', 0)),
-                        sending.get('amount'),
-                        float(sending.get('amountUSD', 0)) if sending.get('amountUSD') else None,
-                        sending.get('gasPrice'),
-                        sending.get('gasUsed'),
-                        sending.get('gasAmount'),
-                        float(sending.get('gasAmountUSD', 0)) if sending.get('gasAmountUSD') else None,
-                        datetime.fromtimestamp(sending.get('timestamp', 0)) if sending.get('timestamp') else None
-                    ))
+            for (scope, key), entry in rollups.items():
+                cursor.execute('''
+                    SELECT tx_count, volume_usd, senders_hll, receivers_hll, amount_sketch
+                    FROM sketch_rollups WHERE scope = ? AND key = ?
+                ''', (scope, key))
+                self._merge_sketch_rows(entry, cursor.fetchall())
+                self._write_sketch_rollup(cursor, scope, key, labels.get((scope, key), key), entry)
+            conn.commit()
+        return len(buffer)
+
+    @staticmethod
+    def _write_sketch_rollup(cursor, scope: str, key: str, label: str, entry: Dict[str, Any]):
+        cursor.execute('''
+            INSERT OR REPLACE INTO sketch_rollups (
+                scope, key, label, tx_count, volume_usd,
+                senders_hll, receivers_hll, amount_sketch, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ''', (
+            scope, key, label, entry['tx_count'], entry['volume_usd'],
+            entry['senders'].to_bytes(), entry['receivers'].to_bytes(), entry['amounts'].to_bytes()
+        ))
+
+    def rebuild_sketch_rollups(self) -> int:
+        """Re-merge every rollup from the day sketches (after day rows were deleted)."""
+        scopes = {
+            'all': "''",
+            'token': 'token_symbol',
+            'chain': 'CAST(chain_id AS TEXT)',
+            'month': 'substr(day, 1, 7)'
+        }
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM sketch_rollups")
+            written = 0
+            for scope, expression in scopes.items():
+                cursor.execute(f"SELECT DISTINCT {expression} AS key FROM transfer_sketches")
+                for key in [row['key'] for row in cursor.fetchall()]:
+                    rows = conn.execute(f'''
+                        SELECT tx_count, volume_usd, senders_hll, receivers_hll, amount_sketch
+                        FROM transfer_sketches WHERE {expression} = ?
+                    ''', (key,))
+                    entry = self._merge_sketch_rows(self._new_sketch_entry(), rows)
+                    label = self.get_chain_name(int(key)) if scope == 'chain' else key
+                    self._write_sketch_rollup(cursor, scope, key, label, entry)
+                    written += 1
+            conn.commit()
+        return written
+
+    def rebuild_sketches(self) -> int:
+        """Recompute all sketches from the stored transactions (for pre-existing data)."""
+        with self.connection() as conn:
+            conn.execute("DELETE FROM transfer_sketches")
+            conn.execute("DELETE FROM sketch_rollups")
+            conn.commit()
+        with self._sketch_lock:
+            self._sketch_buffer = {}
+
+        scanned = 0
+        for row in self._iter_sending_rows():
+            self._record_sketch(row['timestamp'], row['token_symbol'], row['chain_id'],
+                                row['from_address'], row['to_address'], row['amount_usd'])
+            scanned += 1
+            if scanned % 50000 == 0:
+                self.flush_sketches()
+        self.flush_sketches()
+        self._bump_generation()
+        logger.info(f"Rebuilt sketches from {scanned} transactions")
+        return scanned
+
+    def _iter_sending_rows(self, page_size: int = 5000) -> Iterator[sqlite3.Row]:
+        """Yield every transfer joined with its sending leg, from all sources.
+
+        Rows are read in id-keyed pages that are fully fetched before being
+        yielded, so no read lock is held while callers write to the main database.
+        """
+        with self._sources() as (conn, schemas):
+            for schema in schemas:
+                last_id = 0
+                while True:
+                    cursor = conn.cursor()
+                    cursor.execute(f'''
+                        SELECT s.id, t.transaction_id, t.from_address, t.to_address, t.tool, t.lifi_explorer_link,
+                               s.timestamp, s.token_symbol, s.chain_id, s.amount_usd
+                        FROM {schema}.sending_transactions s
+                        JOIN {schema}.transactions t ON t.transaction_id = s.transaction_id
+                        WHERE s.id > ?
+                        ORDER BY s.id
+                        LIMIT ?
+                    ''', (last_id, page_size))
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+                    yield from rows
+                    last_id = rows[-1]['id']
+
+    def get_sketch_statistics(self,
+                              group_by: Optional[str] = None,
+                              token_symbol: Optional[str] = None,
+                              chain_id: Optional[int] = None,
+                              start_date: Optional[str] = None,
+                              end_date: Optional[str] = None,
+                              quantiles: Tuple[float, ...] = (0.5, 0.9, 0.99)) -> List[Dict[str, Any]]:
+        """Approximate distinct wallets and USD percentiles, merged from the sketches.
+
+        group_by is a comma-separated subset of 'day', 'month', 'token' and
+        'chain' (e.g. "token,day"); with no grouping a single overall row is
+        returned. Overall, per-token, per-chain and per-month figures and
+        plain date ranges are read from the pre-merged sketch_rollups (plus
+        the day rows of partially covered months); other combinations merge
+        the day sketches.
+        """
+        dimensions = {'day': 'day', 'month': 'month', 'token': 'token_symbol', 'chain': 'chain_name'}
+        group_columns = []
+        for name in (group_by or '').split(','):
+            name = name.strip()
+            if not name:
+                continue
+            if name not in dimensions:
+                raise ValueError(f"Unsupported group_by dimension: {name}")
+            group_columns.append(dimensions[name])
+
+        rollup_scopes = {'token_symbol': 'token', 'chain_name': 'chain', 'month': 'month'}
+        filters = [(scope, key) for scope, key in (('token', token_symbol), ('chain', str(chain_id) if chain_id else None))
+                   if key]
+        dated = bool(start_date or end_date)
+        use_rollups = 'day' not in group_columns and len(group_columns) + len(filters) <= 1
+        if dated:
+            use_rollups = use_rollups and not filters and group_columns in ([], ['month'])
+
+        day_query = '''
+            SELECT day, substr(day, 1, 7) AS month, token_symbol, chain_name, tx_count, volume_usd,
+                   senders_hll, receivers_hll, amount_sketch
+            FROM transfer_sketches WHERE 1=1
+        '''
+        day_params = []
+        if token_symbol:
+            day_query += " AND token_symbol = ?"
+            day_params.append(token_symbol)
+        if chain_id:
+            day_query += " AND chain_id = ?"
+            day_params.append(chain_id)
+        if start_date:
+            day_query += " AND day >= ?"
+            day_params.append(str(start_date)[:10])
+        if end_date:
+            day_query += " AND day <= ?"
+            day_params.append(str(end_date)[:10])
+
+        groups: Dict[Tuple, Dict[str, Any]] = {}
+
+        def merge(key: Tuple, row: sqlite3.Row):
+            if key not in groups:
+                groups[key] = self._new_sketch_entry()
+            self._merge_sketch_rows(groups[key], (row,))
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            if use_rollups and dated:
+                # Months wholly inside the range come pre-merged; only the edge months' days are merged here
+                cursor.execute("SELECT key FROM sketch_rollups WHERE scope = 'month'")
+                months = [row['key'] for row in cursor.fetchall()
+                          if self._month_within(row['key'], start_date, end_date)]
+                marks = ','.join('?' * len(months))
+                cursor.execute(f'''
+                    SELECT label, tx_count, volume_usd, senders_hll, receivers_hll, amount_sketch
+                    FROM sketch_rollups WHERE scope = 'month' AND key IN ({marks})
+                ''', months)
+                for row in cursor:
+                    merge((row['label'],) * len(group_columns), row)
+                cursor.execute(day_query + f" AND substr(day, 1, 7) NOT IN ({marks})", day_params + months)
+                for row in cursor:
+                    merge(tuple(row[column] for column in group_columns), row)
+            elif use_rollups:
+                if filters:
+                    scope, key = filters[0]
+                else:
+                    scope, key = (rollup_scopes[group_columns[0]], None) if group_columns else ('all', '')
+                query = '''
+                    SELECT label, tx_count, volume_usd, senders_hll, receivers_hll, amount_sketch
+                    FROM sketch_rollups WHERE scope = ?
+                '''
+                params = [scope]
+                if key is not None:
+                    query += " AND key = ?"
+                    params.append(key)
+                cursor.execute(query, params)
+                for row in cursor:
+                    merge((row['label'],) * len(group_columns), row)
+            else:
+                cursor.execute(day_query, day_params)
+                for row in cursor:
+                    merge(tuple(row[column] for column in group_columns), row)
+
+        results = []
+        for key in sorted(groups, key=lambda k: tuple('' if v is None else v for v in k)):
+            group = groups[key]
+            wallets = HyperLogLog().merge(group['senders']).merge(group['receivers'])
+            result = dict(zip(group_columns, key))
+            result.update({
+                'tx_count': group['tx_count'],
+                'volume_usd': group['volume_usd'],
+                'distinct_senders': group['senders'].count(),
+                'distinct_receivers': group['receivers'].count(),
+                'distinct_wallets': wallets.count(),
+                'amount_usd_percentiles': group['amounts'].quantiles(quantiles)
+            })
+            results.append(result)
+        return results
+
+    @staticmethod
+    def _month_within(month: str, start_date: Optional[str], end_date: Optional[str]) -> bool:
+        """Whether every day of a 'YYYY-MM' month lies inside the (inclusive) date range."""
+        year, number = int(month[:4]), int(month[5:7])
+        first = f"{month}-01"
+        last = f"{month}-{calendar.monthrange(year, number)[1]:02d}"
+        return (not start_date or str(start_date)[:10] <= first) and (not end_date or str(end_date)[:10] >= last)
+
+    # --- Large-transfer leaderboard ---
+
+    def _leaderboard_scopes(self, moment: Optional[datetime], token_symbol: Optional[str],
+                            chain_id: Optional[int]) -> List[Tuple[str, str, str, int]]:
+        """Every (window, bucket, token, chain) scope a transfer competes in.
+
+        Day boards only cover all tokens and chains: per-token/chain day boards
+        would multiply the rows kept per transfer for views nobody pages through.
+        """
+        buckets = [('all', 'all')]
+        if moment:
+            buckets.append(('month', moment.strftime('%Y-%m')))
+        tokens = ['*'] + ([token_symbol] if token_symbol else [])
+        chains = [0] + ([chain_id] if chain_id else [])
+        scopes = [(window, bucket, token, chain)
+                  for window, bucket in buckets for token in tokens for chain in chains]
+        if moment:
+            scopes.append(('day', moment.strftime('%Y-%m-%d'), '*', 0))
+        return scopes
+
+    def _leaderboard_floor(self, cursor, scope: Tuple[str, str, str, int]) -> List:
+        """Cached [size, smallest amount] of a leaderboard scope, loaded on first use."""
+        state = self._leaderboard_floors.get(scope)
+        if state is None:
+            cursor.execute('''
+                SELECT COUNT(*), MIN(amount_usd) FROM leaderboard
+                WHERE window = ? AND bucket = ? AND token_symbol = ? AND chain_id = ?
+            ''', scope)
+            count, floor = cursor.fetchone()
+            state = self._leaderboard_floors[scope] = [count, floor or 0.0]
+            # Old month/day scopes stop being touched; drop them rather than grow forever
+            while len(self._leaderboard_floors) > LEADERBOARD_FLOOR_CACHE_SIZE:
+                self._leaderboard_floors.popitem(last=False)
+        else:
+            self._leaderboard_floors.move_to_end(scope)
+        return state
+
+    def _update_leaderboard(self, transfers: List[Transfer]):
+        """Admit newly inserted transfers into every leaderboard scope they beat."""
+        with self._leaderboard_lock:
+            candidates = []
+            for transfer in transfers:
+                sending = transfer.sending
+                if sending is None or sending.amount_usd is None:
+                    continue
+                scopes = self._leaderboard_scopes(sending.time, sending.token_symbol, sending.chain_id)
+                # Most transfers lose to every cached floor; skip opening a connection for them
+                if any(scope not in self._leaderboard_floors
+                       or self._leaderboard_floors[scope][0] < LEADERBOARD_SIZE
+                       or sending.amount_usd > self._leaderboard_floors[scope][1] for scope in scopes):
+                    candidates.append((transfer, scopes))
+            if candidates:
+                self._admit_to_leaderboard(candidates)
+
+    def _admit_to_leaderboard(self, candidates: List[Tuple[Transfer, List[Tuple[str, str, str, int]]]]):
+        """Insert transfers into their scopes, evicting the smallest entry of full boards."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            for transfer, scopes in candidates:
+                sending = transfer.sending
+                amount_usd = sending.amount_usd
+                for scope in scopes:
+                    state = self._leaderboard_floor(cursor, scope)
+                    # Full board and not bigger than its smallest entry: nothing to do
+                    if state[0] >= LEADERBOARD_SIZE and amount_usd <= state[1]:
+                        continue
 
-                # Insert receiving transaction details
-                receiving = tx_data.get('receiving', {})
-                if receiving:
-                    receiving_token = receiving.get('token', {})
                     cursor.execute('''
-                        INSERT INTO receiving_transactions (
-                            transaction_id, tx_hash, tx_link, token_address, token_symbol,
-                            token_name, token_decimals, token_price_usd, chain_id, chain_name,
-                            amount, amount_usd, gas_price, gas_used, gas_amount, gas_amount_usd, timestamp
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        tx_data.get('transactionId'),
-                        receiving.get('txHash'),
-                        receiving.get('txLink'),
-                        receiving_token.get('address'),
-                        receiving_token.get('symbol'),
-                        receiving_token.get('name'),
-                        receiving_token.get('decimals'),
-                        float(receiving_token.get('priceUSD', 0)) if receiving_token.get('priceUSD') else None,
-                        receiving.get('chainId'),
-                        self.get_chain_name(receiving.get('chainId', 0)),
-                        receiving.get('amount'),
-                        float(receiving.get('amountUSD', 0)) if receiving.get('amountUSD') else None,
-                        receiving.get('gasPrice'),
-                        receiving.get('gasUsed'),
-                        receiving.get('gasAmount'),
-                        float(receiving.get('gasAmountUSD', 0)) if receiving.get('gasAmountUSD') else None,
-                        datetime.fromtimestamp(receiving.get('timestamp', 0)) if receiving.get('timestamp') else None
+                        INSERT OR IGNORE INTO leaderboard (
+                            window, bucket, token_symbol, chain_id, transaction_id, amount_usd, timestamp,
+                            sending_token, sending_chain, from_address, to_address, tool, lifi_explorer_link
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', scope + (
+                        transfer.transaction_id,
+                        amount_usd,
+                        sending.time,
+                        sending.token_symbol,
+                        sending.chain_name,
+                        transfer.from_address,
+                        transfer.to_address,
+                        transfer.tool,
+                        transfer.explorer_link
                     ))
+                    if not cursor.rowcount:
+                        continue
 
+                    if state[0] >= LEADERBOARD_SIZE:
+                        # Evict the smallest entry to keep the board bounded
+                        cursor.execute('''
+                            DELETE FROM leaderboard WHERE rowid = (
+                                SELECT rowid FROM leaderboard
+                                WHERE window = ? AND bucket = ? AND token_symbol = ? AND chain_id = ?
+                                ORDER BY amount_usd ASC LIMIT 1
+                            )
+                        ''', scope)
+                    else:
+                        state[0] += 1
+
+                    if state[0] >= LEADERBOARD_SIZE:
+                        cursor.execute('''
+                            SELECT MIN(amount_usd) FROM leaderboard
+                            WHERE window = ? AND bucket = ? AND token_symbol = ? AND chain_id = ?
+                        ''', scope)
+                        state[1] = cursor.fetchone()[0] or 0.0
+                    else:
+                        state[1] = min(state[1], amount_usd) if state[0] > 1 else amount_usd
+            conn.commit()
+
+    def rebuild_leaderboard(self) -> int:
+        """Recompute the leaderboard from stored transactions (for pre-existing data)."""
+        with self._leaderboard_lock:
+            with self.connection() as conn:
+                conn.execute("DELETE FROM leaderboard")
                 conn.commit()
-                return True
+            self._leaderboard_floors = OrderedDict()
 
-        except Exception as e:
-            logger.error(f"Error inserting transaction: {e}")
-            return False
+        scanned = 0
+        page = []
+        for row in self._iter_sending_rows():
+            if row['amount_usd'] is None:
+                continue
+            page.append(self._leaderboard_transfer(row))
+            scanned += 1
+            if len(page) >= 5000:
+                self._update_leaderboard(page)
+                page = []
+        self._update_leaderboard(page)
+        self._bump_generation()
+        logger.info(f"Rebuilt leaderboard from {scanned} transactions")
+        return scanned
 
-    def bulk_insert_transactions(self, transactions: List[Dict[str, Any]]) -> int:
-        """Insert multiple transactions efficiently."""
-        inserted_count = 0
-        for tx in transactions:
-            if self.insert_transaction(tx):
-                inserted_count += 1
-        return inserted_count
+    @staticmethod
+    def _leaderboard_transfer(row: sqlite3.Row) -> Transfer:
+        """The parts of a stored transfer (see _iter_sending_rows) a leaderboard entry needs."""
+        return Transfer({
+            'transactionId': row['transaction_id'],
+            'fromAddress': row['from_address'],
+            'toAddress': row['to_address'],
+            'tool': row['tool'],
+            'lifiExplorerLink': row['lifi_explorer_link'],
+            'sending': {
+                'amountUSD': row['amount_usd'],
+                'chainId': row['chain_id'],
+                'token': {'symbol': row['token_symbol']},
+                'timestamp': datetime.fromisoformat(row['timestamp']).timestamp() if row['timestamp'] else None
+            }
+        })
 
-    def get_transactions(self,
+    def refill_leaderboard(self, scopes: Iterable[Tuple[str, str, str, int]]) -> int:
+        """Top up leaderboard scopes that lost entries (to retention) from the stored transfers.
+
+        Each scope reads at most LEADERBOARD_SIZE of its largest remaining
+        transfers per source, so the cost depends on the scopes touched, not
+        on the database size. Returns how many scopes were refilled.
+        """
+        scopes = set(scopes)
+        if not scopes:
+            return 0
+        queries = {}
+        for scope in scopes:
+            window, bucket, token_symbol, chain_id = scope
+            where, params = ["s.amount_usd IS NOT NULL"], []
+            if window != 'all':
+                # Buckets are prefixes of the stored timestamps; '~' sorts after every timestamp character
+                where.append("s.timestamp >= ? AND s.timestamp < ?")
+                params.extend([bucket, bucket + '~'])
+            if token_symbol != '*':
+                where.append("s.token_symbol = ?")
+                params.append(token_symbol)
+            if chain_id:
+                where.append("s.chain_id = ?")
+                params.append(chain_id)
+            queries[scope] = (' AND '.join(where), params)
+
+        found: Dict[Tuple[str, str, str, int], List[sqlite3.Row]] = {scope: [] for scope in scopes}
+        with self._sources() as (conn, schemas):
+            # Partitions are attached one at a time, so each is visited once for every scope
+            for schema in schemas:
+                for scope, (where, params) in queries.items():
+                    found[scope].extend(conn.execute(f'''
+                        SELECT t.transaction_id, t.from_address, t.to_address, t.tool, t.lifi_explorer_link,
+                               s.timestamp, s.token_symbol, s.chain_id, s.amount_usd
+                        FROM {schema}.sending_transactions s
+                        JOIN {schema}.transactions t ON t.transaction_id = s.transaction_id
+                        WHERE {where}
+                        ORDER BY s.amount_usd DESC
+                        LIMIT ?
+                    ''', params + [LEADERBOARD_SIZE]).fetchall())
+
+        candidates = []
+        for scope, rows in found.items():
+            rows.sort(key=lambda row: row['amount_usd'], reverse=True)
+            candidates.extend((self._leaderboard_transfer(row), [scope]) for row in rows[:LEADERBOARD_SIZE])
+
+        with self._leaderboard_lock:
+            self._leaderboard_floors = OrderedDict()
+            if candidates:
+                self._admit_to_leaderboard(candidates)
+        self._bump_generation()
+        logger.info(f"Refilled {len(scopes)} leaderboard scopes")
+        return len(scopes)
+
+    def _leaderboard_scope(self, token_symbol: Optional[str], chain_id: Optional[int],
+                           window: str, bucket: Optional[str]) -> Tuple[str, str, str, int]:
+        """Normalize leaderboard query arguments into a stored scope key."""
+        if window not in LEADERBOARD_WINDOWS:
+            raise ValueError(f"Unsupported leaderboard window: {window}")
+        if window == 'day' and (token_symbol or chain_id):
+            raise ValueError("Day leaderboards cover all tokens and chains; use the month window to filter")
+        if window == 'all':
+            bucket = 'all'
+        elif not bucket:
+            bucket = datetime.now().strftime('%Y-%m' if window == 'month' else '%Y-%m-%d')
+        return (window, bucket, token_symbol or '*', chain_id or 0)
+
+    def get_leaderboard(self,
                         token_symbol: Optional[str] = None,
-                        min_usd: Optional[float] = None,
-                        max_usd: Optional[float] = None,
-                        start_date: Optional[str] = None,
-                        end_date: Optional[str] = None,
                         chain_id: Optional[int] = None,
-                        limit: int = 1000,
-                        offset: int = 0) -> List[Dict[str, Any]]:
-        """Query transactions with filters."""
+                        window: str = 'all',
+                        bucket: Optional[str] = None,
+                        limit: int = LEADERBOARD_SIZE) -> List[Dict[str, Any]]:
+        """Largest transfers for a token/chain/time window, read from the bounded leaderboard.
+
+        window is 'all', 'month' or 'day' (day boards cover all tokens and chains
+        only); bucket picks the month ('YYYY-MM') or day ('YYYY-MM-DD') and
+        defaults to the current one. The read touches at
+        most LEADERBOARD_SIZE index entries regardless of database size.
+        """
+        scope = self._leaderboard_scope(token_symbol, chain_id, window, bucket)
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT transaction_id, amount_usd, timestamp, sending_token, sending_chain,
+                       from_address, to_address, tool, lifi_explorer_link
+                FROM leaderboard
+                WHERE window = ? AND bucket = ? AND token_symbol = ? AND chain_id = ?
+                ORDER BY amount_usd DESC
+                LIMIT ?
+            ''', scope + (min(limit, LEADERBOARD_SIZE),))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_leaderboard_threshold(self,
+                                  token_symbol: Optional[str] = None,
+                                  chain_id: Optional[int] = None,
+                                  window: str = 'all',
+                                  bucket: Optional[str] = None) -> float:
+        """Smallest USD amount that still makes the top-N (0 while the board has room)."""
+        scope = self._leaderboard_scope(token_symbol, chain_id, window, bucket)
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT amount_usd FROM leaderboard
+                WHERE window = ? AND bucket = ? AND token_symbol = ? AND chain_id = ?
+                ORDER BY amount_usd DESC
+                LIMIT 1 OFFSET ?
+            ''', scope + (LEADERBOARD_SIZE - 1,))
+            row = cursor.fetchone()
+            return row[0] if row else 0.0
+
+    def _transactions_query(self,
+                            token_symbol: Optional[str] = None,
+                            min_usd: Optional[float] = None,
+                            max_usd: Optional[float] = None,
+                            start_date: Optional[str] = None,
+                            end_date: Optional[str] = None,
+                            chain_id: Optional[int] = None,
+                            after: Optional[Tuple[Optional[str], str]] = None) -> Tuple[str, List[Any]]:
+        """Build the filtered transaction query (with a {schema} placeholder) and its params.
 
+        Rows are ordered newest first with transaction_id as a tie-breaker, so
+        `after` — the (sending_timestamp, transaction_id) of the last row of a
+        previous page — continues exactly where that page stopped.
+        """
         query = '''
             SELECT
                 t.transaction_id,
@@ -249,9 +1471,9 @@ class LiFiDatabase:
                 r.amount_usd as receiving_amount_usd,
                 r.chain_name as receiving_chain,
                 t.lifi_explorer_link
-            FROM transactions t
-            LEFT JOIN sending_transactions s ON t.transaction_id = s.transaction_id
-            LEFT JOIN receiving_transactions r ON t.transaction_id = r.transaction_id
+            FROM {schema}.transactions t
+            LEFT JOIN {schema}.sending_transactions s ON t.transaction_id = s.transaction_id
+            LEFT JOIN {schema}.receiving_transactions r ON t.transaction_id = r.transaction_id
             WHERE 1=1
         '''
 
@@ -281,142 +1503,864 @@ class LiFiDatabase:
             query += " AND (s.chain_id = ? OR r.chain_id = ?)"
             params.extend([chain_id, chain_id])
 
-        query += " ORDER BY s.timestamp DESC LIMIT ? OFFSET ?"
-        params.extend([limit, offset])
+        if after is not None:
+            after_timestamp, after_id = after
+            if after_timestamp is None:
+                # Already into the rows without a timestamp, which sort last
+                query += " AND s.timestamp IS NULL AND t.transaction_id < ?"
+                params.append(after_id)
+            else:
+                query += " AND (s.timestamp < ? OR s.timestamp IS NULL OR (s.timestamp = ? AND t.transaction_id < ?))"
+                params.extend([after_timestamp, after_timestamp, after_id])
 
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
+        query += " ORDER BY s.timestamp DESC, t.transaction_id DESC LIMIT ? OFFSET ?"
+        return query, params
+
+    def get_transactions(self,
+                        token_symbol: Optional[str] = None,
+                        min_usd: Optional[float] = None,
+                        max_usd: Optional[float] = None,
+                        start_date: Optional[str] = None,
+                        end_date: Optional[str] = None,
+                        chain_id: Optional[int] = None,
+                        limit: int = 1000,
+                        offset: int = 0) -> List[Dict[str, Any]]:
+        """Query transactions with filters."""
+        query, params = self._transactions_query(token_symbol, min_usd, max_usd, start_date, end_date, chain_id)
+
+        if not self.partitioned:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query.format(schema='main'), params + [limit, offset])
+                rows = cursor.fetchall()
+
+                return [dict(row) for row in rows]
 
-            return [dict(row) for row in rows]
+        # Partitioned: each pruned partition returns its own newest limit+offset
+        # rows, then the sorted runs are merged and the requested page sliced off.
+        runs = []
+        with self._sources(start_date, end_date) as (conn, schemas):
+            for schema in schemas:
+                cursor = conn.cursor()
+                cursor.execute(query.format(schema=schema), params + [limit + offset, 0])
+                runs.append([dict(row) for row in cursor.fetchall()])
+
+        merged = heapq.merge(*runs, key=lambda row: (row['sending_timestamp'] or '', row['transaction_id']), reverse=True)
+        return list(merged)[offset:offset + limit]
+
+    def get_transaction_page(self,
+                             token_symbol: Optional[str] = None,
+                             min_usd: Optional[float] = None,
+                             max_usd: Optional[float] = None,
+                             start_date: Optional[str] = None,
+                             end_date: Optional[str] = None,
+                             chain_id: Optional[int] = None,
+                             limit: int = 100,
+                             after: Optional[Tuple[Optional[str], str]] = None
+                             ) -> Tuple[List[str], List[tuple], Optional[Tuple[Optional[str], str]]]:
+        """Keyset-paginated transactions as (column names, row tuples, continuation key).
+
+        Rows are plain tuples straight from SQLite (no per-row dicts), ready to be
+        serialized as arrays. The continuation key is None on the last page.
+        """
+        query, params = self._transactions_query(token_symbol, min_usd, max_usd, start_date, end_date, chain_id, after)
+
+        runs = []
+        columns: List[str] = []
+        with self._sources(start_date, end_date) as (conn, schemas):
+            for schema in schemas:
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                # One extra row tells us whether another page exists
+                cursor.execute(query.format(schema=schema), params + [limit + 1, 0])
+                columns = [column[0] for column in cursor.description]
+                runs.append(cursor.fetchall())
+
+        timestamp_index = columns.index('sending_timestamp')
+        if len(runs) == 1:
+            rows = runs[0]
+        else:
+            rows = list(heapq.merge(*runs, key=lambda row: (row[timestamp_index] or '', row[0]), reverse=True))
+
+        next_after = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_after = (rows[-1][timestamp_index], rows[-1][0])
+        return columns, rows, next_after
+
+    def iter_transaction_chunks(self,
+                                token_symbol: Optional[str] = None,
+                                min_usd: Optional[float] = None,
+                                max_usd: Optional[float] = None,
+                                start_date: Optional[str] = None,
+                                end_date: Optional[str] = None,
+                                chain_id: Optional[int] = None,
+                                limit: Optional[int] = None,
+                                chunk_size: int = EXPORT_CHUNK_ROWS) -> Tuple[List[str], Iterator[List[tuple]]]:
+        """Every matching transaction, newest first, as (column names, iterator of row-tuple chunks).
+
+        Each source file is read by a single query whose cursor is drained
+        chunk by chunk, rather than a page query (a scan and sort each) per
+        chunk. Partitions hold disjoint months, so they are read one after
+        another, newest first; only the main database's rows (no timestamp,
+        or written before partitioning) are merged in by key.
+        """
+        query, params = self._transactions_query(token_symbol, min_usd, max_usd, start_date, end_date, chain_id)
+        query = query.format(schema='main')
+        params = params + [-1 if limit is None else limit, 0]
+
+        with self.connection() as conn:
+            cursor = conn.execute(query, params[:-2] + [0, 0])
+            columns = [column[0] for column in cursor.description]
+        timestamp_index = columns.index('sending_timestamp')
+
+        def stream(path: str) -> Iterator[tuple]:
+            conn = self.get_connection(path)
+            try:
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                cursor.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        return
+                    yield from rows
+            finally:
+                conn.close()
+
+        def chunks() -> Iterator[List[tuple]]:
+            rows = stream(self.db_path)
+            if self.partitioned:
+                partitions = itertools.chain.from_iterable(
+                    stream(self._partition_uri(p['file_path'], p['frozen']))
+                    for p in self.list_partitions(start_date, end_date) if os.path.exists(p['file_path'])
+                )
+                rows = heapq.merge(rows, partitions, key=lambda row: (row[timestamp_index] or '', row[0]),
+                                   reverse=True)
+            rows = itertools.islice(rows, limit)
+            while True:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    return
+                yield chunk
+
+        return columns, chunks()
+
+    def _analytics_mirror(self) -> Optional[AnalyticsMirror]:
+        """The DuckDB mirror brought up to date, or None when scans should run on SQLite."""
+        if self.analytics_backend != 'duckdb':
+            return None
+        try:
+            with self._analytics_lock:
+                if self._analytics is None:
+                    self._analytics = AnalyticsMirror(self.analytics_path)
+            self._analytics.sync(self)
+            return self._analytics
+        except Exception as e:
+            # e.g. its file is held by another process; retried on the next query
+            logger.warning(f"DuckDB analytics unavailable, scanning SQLite instead: {e}")
+            return None
 
     def get_statistics(self) -> Dict[str, Any]:
         """Get database statistics."""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
+        mirror = self._analytics_mirror()
+        statistics = mirror.statistics() if mirror else self._scan_statistics()
+        # Distinct wallets and USD percentiles come from the sketches, not a scan
+        approximate = self.get_sketch_statistics()
+        statistics['approximate'] = approximate[0] if approximate else None
+        return statistics
 
-            # Total transactions
-            cursor.execute("SELECT COUNT(*) FROM transactions")
-            total_transactions = cursor.fetchone()[0]
+    def _scan_statistics(self) -> Dict[str, Any]:
+        """Totals, top tokens and chains, recent activity and date range, scanned from SQLite."""
+        total_transactions = 0
+        total_volume = 0
+        recent_transactions = 0
+        date_range = {'earliest': None, 'latest': None}
+        token_groups: Dict[str, Dict[str, Any]] = {}
+        chain_groups: Dict[str, Dict[str, Any]] = {}
 
-            # Total USD volume
-            cursor.execute("SELECT SUM(amount_usd) FROM sending_transactions WHERE amount_usd IS NOT NULL")
-            total_volume = cursor.fetchone()[0] or 0
+        # Per-partition groups are merged in Python, so only a single source can push LIMIT down
+        group_limit = -1 if self.partitioned else 10
 
-            # Top tokens by transaction count
-            cursor.execute('''
-                SELECT token_symbol, COUNT(*) as count, SUM(amount_usd) as total_volume
-                FROM sending_transactions
-                WHERE token_symbol IS NOT NULL AND token_symbol != ''
-                GROUP BY token_symbol
-                ORDER BY count DESC
-                LIMIT 10
-            ''')
-            top_tokens = [dict(row) for row in cursor.fetchall()]
+        with self._sources() as (conn, schemas):
+            for schema in schemas:
+                cursor = conn.cursor()
 
-            # Top chains by transaction count
-            cursor.execute('''
-                SELECT chain_name, COUNT(*) as count, SUM(amount_usd) as total_volume
-                FROM sending_transactions
-                WHERE chain_name IS NOT NULL
-                GROUP BY chain_name
-                ORDER BY count DESC
-                LIMIT 10
-            ''')
-            top_chains = [dict(row) for row in cursor.fetchall()]
+                # Total transactions
+                cursor.execute(f"SELECT COUNT(*) FROM {schema}.transactions")
+                total_transactions += cursor.fetchone()[0]
 
-            # Recent activity (last 24 hours)
-            cursor.execute('''
-                SELECT COUNT(*)
-                FROM sending_transactions
-                WHERE timestamp > datetime('now', '-1 day')
-            ''')
-            recent_transactions = cursor.fetchone()[0]
+                # Total USD volume
+                cursor.execute(f"SELECT SUM(amount_usd) FROM {schema}.sending_transactions WHERE amount_usd IS NOT NULL")
+                total_volume += cursor.fetchone()[0] or 0
 
-            # Date range
-            cursor.execute('''
-                SELECT MIN(timestamp) as earliest, MAX(timestamp) as latest
-                FROM sending_transactions
-                WHERE timestamp IS NOT NULL
-            ''')
-            date_range = dict(cursor.fetchone())
+                # Top tokens by transaction count
+                cursor.execute(f'''
+                    SELECT token_symbol, COUNT(*) as count, SUM(amount_usd) as total_volume
+                    FROM {schema}.sending_transactions
+                    WHERE token_symbol IS NOT NULL AND token_symbol != ''
+                    GROUP BY token_symbol
+                    ORDER BY count DESC
+                    LIMIT {group_limit}
+                ''')
+                self._merge_groups(token_groups, 'token_symbol', cursor.fetchall())
 
-            return {
-                'total_transactions': total_transactions,
-                'total_volume_usd': float(total_volume),
-                'recent_transactions_24h': recent_transactions,
-                'date_range': date_range,
-                'top_tokens': top_tokens,
-                'top_chains': top_chains
-            }
+                # Top chains by transaction count
+                cursor.execute(f'''
+                    SELECT chain_name, COUNT(*) as count, SUM(amount_usd) as total_volume
+                    FROM {schema}.sending_transactions
+                    WHERE chain_name IS NOT NULL
+                    GROUP BY chain_name
+                    ORDER BY count DESC
+                    LIMIT {group_limit}
+                ''')
+                self._merge_groups(chain_groups, 'chain_name', cursor.fetchall())
 
-    def export_to_excel(self, filename: str = "lifi_transactions.xlsx",
-                       filters: Optional[Dict[str, Any]] = None) -> str:
-        """Export transactions to Excel file."""
-        transactions = self.get_transactions(**(filters or {}))
-
-        if not transactions:
-            raise ValueError("No transactions found to export")
-
-        df = pd.DataFrame(transactions)
-
-        # Rename columns for better readability
-        column_mapping = {
-            'transaction_id': 'Transaction ID',
-            'from_address': 'From Address',
-            'to_address': 'To Address',
-            'tool': 'Bridge/Tool',
-            'status': 'Status',
-            'sending_token': 'Source Token',
-            'sending_amount_usd': 'Source Amount (USD)',
-            'sending_chain': 'Source Chain',
-            'receiving_token': 'Destination Token',
-            'receiving_amount_usd': 'Destination Amount (USD)',
-            'receiving_chain': 'Destination Chain',
-            'sending_timestamp': 'Timestamp',
-            'lifi_explorer_link': 'Explorer Link'
+                # Recent activity (last 24 hours)
+                cursor.execute(f'''
+                    SELECT COUNT(*)
+                    FROM {schema}.sending_transactions
+                    WHERE timestamp > datetime('now', '-1 day')
+                ''')
+                recent_transactions += cursor.fetchone()[0]
+
+                # Date range
+                cursor.execute(f'''
+                    SELECT MIN(timestamp) as earliest, MAX(timestamp) as latest
+                    FROM {schema}.sending_transactions
+                    WHERE timestamp IS NOT NULL
+                ''')
+                row = cursor.fetchone()
+                if row['earliest'] and (date_range['earliest'] is None or row['earliest'] < date_range['earliest']):
+                    date_range['earliest'] = row['earliest']
+                if row['latest'] and (date_range['latest'] is None or row['latest'] > date_range['latest']):
+                    date_range['latest'] = row['latest']
+
+        top_tokens = sorted(token_groups.values(), key=lambda g: g['count'], reverse=True)[:10]
+        top_chains = sorted(chain_groups.values(), key=lambda g: g['count'], reverse=True)[:10]
+
+        return {
+            'total_transactions': total_transactions,
+            'total_volume_usd': float(total_volume),
+            'recent_transactions_24h': recent_transactions,
+            'date_range': date_range,
+            'top_tokens': top_tokens,
+            'top_chains': top_chains
         }
 
-        df = df.rename(columns=column_mapping)
-        df.to_excel(filename, index=False)
+    def _aggregate_query(self, dimensions: List[str], bucket: Optional[str],
+                         token_symbol: Optional[str] = None, chain_id: Optional[int] = None,
+                         tool: Optional[str] = None, status: Optional[str] = None,
+                         min_usd: Optional[float] = None, start_date: Optional[str] = None,
+                         end_date: Optional[str] = None) -> Tuple[str, List[Any]]:
+        """Compile a whitelisted group-by into SQL (with a {schema} placeholder) and its params.
+
+        The scan is driven from sending_transactions, so time and token filters
+        use its timestamp and (token_symbol, timestamp) indexes; transactions
+        and receiving_transactions are joined only when a dimension or filter
+        needs them. Every group returns the same partial aggregates (count,
+        sum, non-null count, min, max), which merge across partitions.
+        """
+        for name in dimensions:
+            if name not in AGGREGATE_DIMENSIONS:
+                raise ValueError(f"Unsupported group dimension: {name}")
+        if bucket is not None and bucket not in AGGREGATE_BUCKETS:
+            raise ValueError(f"Unsupported bucket: {bucket} (use one of {', '.join(AGGREGATE_BUCKETS)})")
+
+        select = [f"{AGGREGATE_DIMENSIONS[name][0]} AS {name}" for name in dimensions]
+        if bucket:
+            select.append(f"{AGGREGATE_BUCKETS[bucket]} AS bucket")
+        select += ["COUNT(*) AS count", "SUM(s.amount_usd) AS sum_usd", "COUNT(s.amount_usd) AS usd_count",
+                   "MIN(s.amount_usd) AS min_usd", "MAX(s.amount_usd) AS max_usd"]
+
+        tables = {AGGREGATE_DIMENSIONS[name][1] for name in dimensions}
+        if tool or status:
+            tables.add('t')
+        query = f"SELECT {', '.join(select)} FROM {{schema}}.sending_transactions s"
+        if 't' in tables:
+            query += " JOIN {schema}.transactions t ON t.transaction_id = s.transaction_id"
+        if 'r' in tables:
+            query += " LEFT JOIN {schema}.receiving_transactions r ON r.transaction_id = s.transaction_id"
+        query += " WHERE 1=1"
+
+        params: List[Any] = []
+        if token_symbol:
+            query += " AND s.token_symbol = ?"
+            params.append(token_symbol)
+        if chain_id:
+            query += " AND s.chain_id = ?"
+            params.append(chain_id)
+        if tool:
+            query += " AND t.tool = ?"
+            params.append(tool)
+        if status:
+            query += " AND t.status = ?"
+            params.append(status)
+        if min_usd is not None:
+            query += " AND s.amount_usd >= ?"
+            params.append(min_usd)
+        if start_date:
+            query += " AND s.timestamp >= ?"
+            params.append(start_date)
+        if end_date:
+            query += " AND s.timestamp <= ?"
+            params.append(end_date)
+        if bucket and not start_date and not end_date:
+            query += " AND s.timestamp IS NOT NULL"
+
+        group_count = len(dimensions) + (1 if bucket else 0)
+        if group_count:
+            query += " GROUP BY " + ", ".join(str(i) for i in range(1, group_count + 1))
+        return query, params
+
+    def get_aggregate(self,
+                      group: Tuple[str, ...] = (),
+                      bucket: Optional[str] = None,
+                      metrics: Tuple[str, ...] = ('count', 'sum_usd'),
+                      token_symbol: Optional[str] = None,
+                      chain_id: Optional[int] = None,
+                      tool: Optional[str] = None,
+                      status: Optional[str] = None,
+                      min_usd: Optional[float] = None,
+                      start_date: Optional[str] = None,
+                      end_date: Optional[str] = None,
+                      limit: int = 1000,
+                      explain: bool = False) -> Dict[str, Any]:
+        """Transfer counts and USD volume grouped by whitelisted dimensions and an optional time bucket.
+
+        Amounts are measured on the sending leg. Rows come back as arrays in
+        `columns` order, sorted by bucket and then by the first metric
+        (descending); `truncated` says whether `limit` cut groups off. With
+        explain=True the query plan is included (of the main SQLite database,
+        or of the DuckDB mirror when that backend is on); `backend` names it.
+        """
+        dimensions = list(group)
+        for metric in metrics:
+            if metric not in AGGREGATE_METRICS:
+                raise ValueError(f"Unsupported metric: {metric} (use one of {', '.join(AGGREGATE_METRICS)})")
+        if not metrics:
+            raise ValueError("At least one metric is required")
+        if not 1 <= limit <= AGGREGATE_MAX_ROWS:
+            raise ValueError(f"limit must be between 1 and {AGGREGATE_MAX_ROWS}")
+        query, params = self._aggregate_query(dimensions, bucket, token_symbol, chain_id, tool, status,
+                                              min_usd, start_date, end_date)
+        key_size = len(dimensions) + (1 if bucket else 0)
+
+        groups: Dict[Tuple, List[Any]] = {}
+
+        def merge(rows):
+            for row in rows:
+                key = tuple(row[:key_size])
+                count, total, usd_count, low, high = row[key_size:]
+                merged = groups.get(key)
+                if merged is None:
+                    groups[key] = [count, total or 0.0, usd_count, low, high]
+                    continue
+                merged[0] += count
+                merged[1] += total or 0.0
+                merged[2] += usd_count
+                if low is not None:
+                    merged[3] = low if merged[3] is None else min(merged[3], low)
+                if high is not None:
+                    merged[4] = high if merged[4] is None else max(merged[4], high)
+
+        plan = None
+        mirror = self._analytics_mirror()
+        if mirror:
+            rows, plan = mirror.aggregate(dimensions, bucket, token_symbol, chain_id, tool, status,
+                                          min_usd, start_date, end_date, explain)
+            merge(rows)
+        else:
+            with self._sources(start_date, end_date) as (conn, schemas):
+                for schema in schemas:
+                    cursor = conn.cursor()
+                    cursor.row_factory = None
+                    if explain and plan is None:
+                        cursor.execute("EXPLAIN QUERY PLAN " + query.format(schema=schema), params)
+                        plan = [row[-1] for row in cursor.fetchall()]
+                    cursor.execute(query.format(schema=schema), params)
+                    merge(cursor)
+
+        def metric_values(partial):
+            count, total, usd_count, low, high = partial
+            values = {'count': count, 'sum_usd': total, 'avg_usd': total / usd_count if usd_count else None,
+                      'min_usd': low, 'max_usd': high}
+            return [values[metric] for metric in metrics]
+
+        rows = [list(key) + metric_values(partial) for key, partial in groups.items()]
+        first_metric = key_size
+        rows.sort(key=lambda row: -(row[first_metric] or 0))
+        if bucket:
+            # Stable sort: by bucket, then by the first metric within a bucket
+            rows.sort(key=lambda row: row[key_size - 1] or '')
+
+        result = {
+            'group': dimensions,
+            'bucket': bucket,
+            'metrics': list(metrics),
+            'columns': dimensions + (['bucket'] if bucket else []) + list(metrics),
+            'rows': rows[:limit],
+            'truncated': len(rows) > limit,
+            'backend': 'duckdb' if mirror else 'sqlite'
+        }
+        if explain:
+            result['plan'] = plan
+        return result
+
+    def _merge_groups(self, groups: Dict[str, Dict[str, Any]], key: str, rows: List[sqlite3.Row]):
+        """Fold GROUP BY rows of (key, count, total_volume) into an accumulator dict."""
+        for row in rows:
+            group = groups.get(row[key])
+            if group is None:
+                groups[row[key]] = dict(row)
+            else:
+                group['count'] += row['count']
+                if row['total_volume'] is not None:
+                    group['total_volume'] = (group['total_volume'] or 0) + row['total_volume']
+
+    @staticmethod
+    @contextmanager
+    def _atomic_output(filename: str) -> Iterator[str]:
+        """Write to a temporary sibling path, then swap it in over `filename`.
+
+        Readers (e.g. a download in progress) keep the previous version until
+        the new one is complete.
+        """
+        stem, suffix = os.path.splitext(filename)
+        temp_path = f"{stem}.partial-{os.getpid()}-{threading.get_ident()}{suffix}"
+        try:
+            yield temp_path
+            os.replace(temp_path, filename)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def export_to_excel(self, filename: str = "lifi_transactions.xlsx",
+                       filters: Optional[Dict[str, Any]] = None,
+                       progress_callback: Optional[Callable[[str, int, int], None]] = None) -> str:
+        """Export transactions to an Excel file, streamed in chunks (every match unless filters has a limit).
+
+        Memory stays flat with the row count: rows are pulled EXPORT_CHUNK_ROWS
+        at a time and written to write-only worksheets, a new sheet starting
+        whenever one reaches Excel's row limit.
+        """
+        progress = progress_callback or (lambda message, current=0, total=0: None)
+        progress("Querying transactions")
+        filters = {name: value for name, value in (filters or {}).items() if name != 'offset'}
+        columns, chunks = self.iter_transaction_chunks(**filters)
+
+        with self._atomic_output(filename) as temp_path:
+            written = write_xlsx(temp_path, columns, chunks, progress=progress)
+            if not written:
+                raise ValueError("No transactions found to export")
+        progress("Export complete", written, written)
         return filename
 
     def export_to_json(self, filename: str = "lifi_transactions.json",
-                      filters: Optional[Dict[str, Any]] = None) -> str:
-        """Export transactions to JSON file."""
-        transactions = self.get_transactions(**(filters or {}))
+                      filters: Optional[Dict[str, Any]] = None,
+                      progress_callback: Optional[Callable[[str, int, int], None]] = None) -> str:
+        """Export transactions to a JSON array, streamed in chunks like export_to_excel.
 
-        with open(filename, 'w') as f:
-            json.dump(transactions, f, indent=2, default=str)
+        Each object is written as soon as its chunk is read, so the file looks
+        like json.dump(rows, indent=2) without holding every row in memory.
+        """
+        progress = progress_callback or (lambda message, current=0, total=0: None)
+        progress("Querying transactions")
+        filters = {name: value for name, value in (filters or {}).items() if name != 'offset'}
+        columns, chunks = self.iter_transaction_chunks(**filters)
 
+        written = 0
+        with self._atomic_output(filename) as temp_path, open(temp_path, 'w') as f:
+            f.write('[')
+            for chunk in chunks:
+                for row in chunk:
+                    text = json.dumps(dict(zip(columns, row)), indent=2, default=str)
+                    f.write(('\n' if written == 0 else ',\n') + '  ' + text.replace('\n', '\n  '))
+                    written += 1
+                progress(f"Wrote {written:,} rows to JSON", written, written)
+            f.write('\n]' if written else ']')
+
+        progress("Export complete", written, written)
         return filename
 
     def export_to_csv(self, filename: str = "lifi_transactions.csv",
-                     filters: Optional[Dict[str, Any]] = None) -> str:
-        """Export transactions to CSV file."""
-        transactions = self.get_transactions(**(filters or {}))
-
-        if not transactions:
-            raise ValueError("No transactions found to export")
+                     filters: Optional[Dict[str, Any]] = None,
+                     progress_callback: Optional[Callable[[str, int, int], None]] = None) -> str:
+        """Export transactions to a CSV file, streamed in chunks like export_to_excel."""
+        progress = progress_callback or (lambda message, current=0, total=0: None)
+        progress("Querying transactions")
+        filters = {name: value for name, value in (filters or {}).items() if name != 'offset'}
+        columns, chunks = self.iter_transaction_chunks(**filters)
 
-        df = pd.DataFrame(transactions)
-        df.to_csv(filename, index=False)
+        written = 0
+        with self._atomic_output(filename) as temp_path:
+            with open(temp_path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                for chunk in chunks:
+                    writer.writerows(chunk)
+                    written += len(chunk)
+                    progress(f"Wrote {written:,} rows to CSV", written, written)
+            if not written:
+                raise ValueError("No transactions found to export")
+        progress("Export complete", written, written)
         return filename
 
+    # --- Retention ---
+
+    def _retention_predicate(self, rules: List[Dict[str, Any]],
+                             now: Optional[datetime] = None) -> Tuple[Optional[str], List]:
+        """SQL condition on a sending leg `s` that holds for transfers the rules no longer keep.
+
+        Each rule is {'token': symbol or '*', 'max_age_days': days or None,
+        'min_usd': USD or None}. A transfer follows the rule for its token, or
+        the '*' rule when its token has none, and is dropped once it is older
+        than max_age_days or smaller than min_usd. Tokens without any rule
+        are kept. Returns (None, []) when no rule drops anything.
+        """
+        now = now or datetime.now()
+        specific = [rule['token'] for rule in rules if rule['token'] != '*']
+        clauses, params = [], []
+        for rule in rules:
+            conditions, rule_params = [], []
+            if rule.get('max_age_days') is not None:
+                conditions.append("s.timestamp < ?")
+                rule_params.append((now - timedelta(days=rule['max_age_days'])).strftime('%Y-%m-%d %H:%M:%S'))
+            if rule.get('min_usd') is not None:
+                conditions.append("s.amount_usd < ?")
+                rule_params.append(rule['min_usd'])
+            if not conditions:
+                continue
+
+            if rule['token'] != '*':
+                scope, scope_params = "s.token_symbol = ?", [rule['token']]
+            elif specific:
+                scope = f"(s.token_symbol IS NULL OR s.token_symbol NOT IN ({','.join('?' * len(specific))}))"
+                scope_params = list(specific)
+            else:
+                scope, scope_params = "1=1", []
+            clauses.append(f"({scope} AND ({' OR '.join(conditions)}))")
+            params.extend(scope_params + rule_params)
+
+        if not clauses:
+            return None, []
+        return ' OR '.join(clauses), params
+
+    def _retention_drop_month(self, rules: List[Dict[str, Any]]) -> Optional[str]:
+        """First month that may still hold kept transfers, if every rule ages data out."""
+        if not any(rule['token'] == '*' for rule in rules):
+            return None
+        if any(rule.get('max_age_days') is None for rule in rules):
+            return None
+        oldest_kept = datetime.now() - timedelta(days=max(rule['max_age_days'] for rule in rules))
+        return oldest_kept.strftime('%Y-%m')
+
+    def drop_partitions(self, before_month: str) -> List[str]:
+        """Delete whole partition files older than `before_month` ('YYYY-MM'), frozen or not.
+
+        Much cheaper than deleting their rows: nothing is rewritten and the
+        space goes back to the filesystem at once.
+        """
+        dropped = []
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT month, file_path FROM partitions WHERE month < ?", (before_month,))
+            for row in cursor.fetchall():
+                if os.path.exists(row['file_path']):
+                    os.chmod(row['file_path'], 0o644)
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.exists(row['file_path'] + suffix):
+                        os.remove(row['file_path'] + suffix)
+                dropped.append(row['month'])
+            if not dropped:
+                return dropped
+
+            cursor.execute("DELETE FROM partitions WHERE month < ?", (before_month,))
+            cursor.execute("DELETE FROM pending_transfers WHERE month < ?", (before_month,))
+            # Month and day boards of the dropped months go entirely; the all-time boards get refilled
+            cursor.execute('''
+                SELECT DISTINCT window, bucket, token_symbol, chain_id FROM leaderboard
+                WHERE window = 'all' AND timestamp < ?
+            ''', (f"{before_month}-01",))
+            emptied = [tuple(row) for row in cursor.fetchall()]
+            cursor.execute("DELETE FROM leaderboard WHERE timestamp < ?", (f"{before_month}-01",))
+            cursor.execute("UPDATE meta SET value = value + 1 WHERE key = 'data_generation'")
+            conn.commit()
+        self.reset_leaderboard_floors()
+        logger.info(f"Dropped partitions {', '.join(sorted(dropped))}")
+        self.refill_leaderboard(emptied)
+        return dropped
+
+    def _prune_file(self, file_path: str, frozen: bool, where: str, params: List, batch_size: int,
+                    pause: float, dry_run: bool, on_batch: Callable[[int], None],
+                    before_write: Callable[[], None], touched_scopes: set) -> int:
+        """Delete the transfers matching `where` from one database file, `batch_size` at a time.
+
+        Leaderboard scopes that lose entries are added to touched_scopes, for refill_leaderboard.
+        """
+        conn = self.get_connection()
+        try:
+            schema = 'main'
+            if file_path != self.db_path:
+                conn.execute("ATTACH DATABASE ? AS part", (self._partition_uri(file_path, frozen),))
+                schema = 'part'
+            if dry_run:
+                return conn.execute(f"SELECT COUNT(*) FROM {schema}.sending_transactions s WHERE {where}",
+                                    params).fetchone()[0]
+
+            deleted, last_id = 0, 0
+            while True:
+                # Walk the legs in id order so each batch resumes where the last one stopped
+                rows = conn.execute(f'''
+                    SELECT s.id, s.transaction_id FROM {schema}.sending_transactions s
+                    WHERE s.id > ? AND ({where}) ORDER BY s.id LIMIT ?
+                ''', [last_id] + params + [batch_size]).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1]['id']
+                ids = [row['transaction_id'] for row in rows]
+                marks = ','.join('?' * len(ids))
+
+                # One short write transaction per batch, so a concurrent fetch waits for a batch at most
+                before_write()
+                with conn:
+                    for table in ('receiving_transactions', 'sending_transactions', 'transactions'):
+                        conn.execute(f"DELETE FROM {schema}.{table} WHERE transaction_id IN ({marks})", ids)
+                    conn.execute(f"DELETE FROM main.pending_transfers WHERE transaction_id IN ({marks})", ids)
+                    touched_scopes.update(tuple(row) for row in conn.execute(f'''
+                        SELECT DISTINCT window, bucket, token_symbol, chain_id FROM main.leaderboard
+                        WHERE transaction_id IN ({marks})
+                    ''', ids))
+                    conn.execute(f"DELETE FROM main.leaderboard WHERE transaction_id IN ({marks})", ids)
+                    conn.execute("UPDATE main.meta SET value = value + 1 WHERE key = 'data_generation'")
+                deleted += len(rows)
+                on_batch(len(rows))
+                if len(rows) < batch_size:
+                    break
+                time.sleep(pause)
+            return deleted
+        finally:
+            conn.close()
+
+    def _prune_sketches(self, rules: List[Dict[str, Any]]) -> int:
+        """Delete sketch days the age rules have expired.
+
+        Sketches are trimmed by age only: their counters and HyperLogLogs
+        cannot take single transfers back out, so USD rules leave them as is.
+        """
+        specific = [rule['token'] for rule in rules if rule['token'] != '*']
+        removed = 0
+        with self.connection() as conn:
+            for rule in rules:
+                if rule.get('max_age_days') is None:
+                    continue
+                cutoff = (datetime.now() - timedelta(days=rule['max_age_days'])).strftime('%Y-%m-%d')
+                query, params = "DELETE FROM transfer_sketches WHERE day < ?", [cutoff]
+                if rule['token'] != '*':
+                    query += " AND token_symbol = ?"
+                    params.append(rule['token'])
+                elif specific:
+                    query += f" AND token_symbol NOT IN ({','.join('?' * len(specific))})"
+                    params.extend(specific)
+                removed += conn.execute(query, params).rowcount
+            conn.commit()
+        if removed:
+            self.rebuild_sketch_rollups()
+        return removed
+
+    def prune_transactions(self, rules: List[Dict[str, Any]], batch_size: int = 500, pause: float = 0.05,
+                           dry_run: bool = False,
+                           progress_callback: Optional[Callable] = None,
+                           before_write: Optional[Callable[[], None]] = None,
+                           partitions: bool = True) -> Dict[str, Any]:
+        """Delete the transfers the retention rules (see _retention_predicate) no longer keep.
+
+        Rows go in batches of `batch_size`, each its own transaction followed
+        by a `pause`, so writers are never locked out for long. In partitioned
+        mode, months every rule has aged out are dropped as whole files first;
+        frozen partitions that still hold expired rows are thawed, pruned and
+        frozen again. With dry_run, only counts the transfers that would go.
+        before_write, if given, runs before every write transaction and may
+        raise to stop the run (e.g. when the retention lease was lost). With
+        partitions=False only the main database is pruned: partition files
+        are left alone (see run_retention) and reported as skipped.
+        """
+        progress = progress_callback or (lambda message, current=0, total=0: None)
+        before_write = before_write or (lambda: None)
+        result = {'deleted': 0, 'dropped_partitions': [], 'sketch_days_removed': 0, 'leaderboard_scopes_refilled': 0,
+                  'partitions_skipped': self.partitioned and not partitions, 'dry_run': dry_run}
+        where, params = self._retention_predicate(rules)
+        if where is None:
+            return result
+
+        if self.partitioned and partitions and not dry_run:
+            drop_before = self._retention_drop_month(rules)
+            if drop_before:
+                before_write()
+                result['dropped_partitions'] = self.drop_partitions(drop_before)
+
+        files = [(None, self.db_path, False)]
+        if self.partitioned and partitions:
+            files += [(p['month'], p['file_path'], bool(p['frozen'])) for p in self.list_partitions()
+                      if os.path.exists(p['file_path'])]
+
+        # A board that was not full held every transfer of its scope, so only full ones can need a refill
+        touched_scopes = set()
+        with self.connection() as conn:
+            full_scopes = {tuple(row) for row in conn.execute('''
+                SELECT window, bucket, token_symbol, chain_id FROM leaderboard
+                GROUP BY window, bucket, token_symbol, chain_id HAVING COUNT(*) >= ?
+            ''', (LEADERBOARD_SIZE,))}
+
+        def on_batch(count):
+            result['deleted'] += count
+            progress(f"Pruned {result['deleted']:,} transfers", result['deleted'], 0)
+
+        for month, file_path, frozen in files:
+            if frozen and not dry_run:
+                # Frozen files are read-only: only thaw the ones that actually have expired rows
+                if not self._prune_file(file_path, True, where, params, batch_size, pause, True, on_batch,
+                                        before_write, touched_scopes):
+                    continue
+                before_write()
+                self.thaw_partition(month)
+                try:
+                    self._prune_file(file_path, False, where, params, batch_size, pause, False, on_batch,
+                                     before_write, touched_scopes)
+                finally:
+                    try:
+                        self._freeze_partition(month, file_path)
+                    except sqlite3.OperationalError as e:
+                        # A reader still has it open; the next freeze_partitions run picks it up
+                        logger.warning(f"Left partition {month} thawed after pruning: {e}")
+            else:
+                count = self._prune_file(file_path, frozen, where, params, batch_size, pause, dry_run, on_batch,
+                                         before_write, touched_scopes)
+                if dry_run:
+                    result['deleted'] += count
+
+        if not dry_run:
+            before_write()
+            result['sketch_days_removed'] = self._prune_sketches(rules)
+            # Boards that lost entries are topped up from the transfers that are left
+            before_write()
+            result['leaderboard_scopes_refilled'] = self.refill_leaderboard(touched_scopes & full_scopes)
+        logger.info(f"Retention {'would prune' if dry_run else 'pruned'} {result['deleted']} transfers"
+                    f"{', dropped partitions ' + ', '.join(result['dropped_partitions']) if result['dropped_partitions'] else ''}")
+        return result
+
+    def compact(self, vacuum_pages: int = 1000, pause: float = 0.05, full: bool = False,
+                before_write: Optional[Callable[[], None]] = None, partitions: bool = True) -> List[Dict[str, Any]]:
+        """Give freed pages back to the filesystem and refresh planner statistics.
+
+        Files created with auto_vacuum=INCREMENTAL shrink `vacuum_pages` at a
+        time (each step a short write), then get a bounded ANALYZE and a WAL
+        truncate. Older files keep their free pages for reuse by later inserts;
+        `full` runs the one-off VACUUM that converts them, which locks the file
+        for its whole duration. Frozen partitions were vacuumed when frozen;
+        partitions=False leaves every partition file alone.
+        """
+        files = [self.db_path]
+        if self.partitioned and partitions:
+            files += [p['file_path'] for p in self.list_partitions()
+                      if not p['frozen'] and os.path.exists(p['file_path'])]
+
+        report = []
+        for file_path in files:
+            if before_write:
+                before_write()
+            size_before = sum(os.path.getsize(file_path + suffix) for suffix in ('', '-wal')
+                              if os.path.exists(file_path + suffix))
+            conn = self.get_connection(file_path)
+            try:
+                auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+                if auto_vacuum == 0 and full:
+                    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                    conn.execute("VACUUM")
+                    auto_vacuum = 2
+                elif auto_vacuum == 2:
+                    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                    while free:
+                        # execute() would step the pragma once, freeing a single page; a script runs it to the end
+                        conn.executescript(f"PRAGMA incremental_vacuum({int(vacuum_pages)});")
+                        remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                        if remaining >= free:
+                            # Another connection holds the write lock; try again next run
+                            break
+                        free = remaining
+                        time.sleep(pause)
+                free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+                # Bounded sampling keeps ANALYZE cheap on large files
+                conn.execute("PRAGMA analysis_limit=1000")
+                conn.execute("ANALYZE")
+                conn.commit()
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            finally:
+                conn.close()
+            size_after = sum(os.path.getsize(file_path + suffix) for suffix in ('', '-wal')
+                             if os.path.exists(file_path + suffix))
+            report.append({
+                'file': file_path,
+                'auto_vacuum': {0: 'none', 1: 'full', 2: 'incremental'}.get(auto_vacuum, auto_vacuum),
+                'bytes_before': size_before,
+                'bytes_after': size_after,
+                'free_pages': free_pages
+            })
+            logger.info(f"Compacted {file_path}: {size_before:,} -> {size_after:,} bytes")
+        return report
+
     def clear_database(self):
         """Clear all transaction data."""
-        with self.get_connection() as conn:
+        with self.connection() as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM receiving_transactions")
             cursor.execute("DELETE FROM sending_transactions")
             cursor.execute("DELETE FROM transactions")
+
+            # Drop every monthly partition file, frozen or not
+            cursor.execute("SELECT month, file_path FROM partitions")
+            for row in cursor.fetchall():
+                if os.path.exists(row['file_path']):
+                    os.chmod(row['file_path'], 0o644)
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.exists(row['file_path'] + suffix):
+                        os.remove(row['file_path'] + suffix)
+            cursor.execute("DELETE FROM partitions")
+            cursor.execute("DELETE FROM transfer_sketches")
+            cursor.execute("DELETE FROM sketch_rollups")
+            cursor.execute("DELETE FROM leaderboard")
+            cursor.execute("DELETE FROM pending_transfers")
+            cursor.execute("DELETE FROM coverage")
+            cursor.execute("UPDATE meta SET value = value + 1 WHERE key = 'data_generation'")
+
             conn.commit()
             logger.info("Database cleared successfully")
 
+        with self._sketch_lock:
+            self._sketch_buffer = {}
+        self.reset_leaderboard_floors()
+
+    def reset_leaderboard_floors(self):
+        """Forget cached leaderboard floors; they are re-read from the table on next use.
+
+        Needed before writing when another process may have changed the
+        leaderboard since this one last did.
+        """
+        with self._leaderboard_lock:
+            self._leaderboard_floors = OrderedDict()
+
     def get_database_info(self) -> Dict[str, Any]:
         """Get database file information."""
-        import os
+        partitions = self.list_partitions()
+        partition_bytes = sum(os.path.getsize(p['file_path']) for p in partitions if os.path.exists(p['file_path']))
+        partition_info = {
+            'partitioned': self.partitioned,
+            'partition_count': len(partitions),
+            'frozen_partition_count': sum(1 for p in partitions if p['frozen']),
+            'partitions_size_mb': round(partition_bytes / (1024*1024), 2),
+            'analytics_backend': self.analytics_backend
+        }
 
         if os.path.exists(self.db_path):
             stat = os.stat(self.db_path)
@@ -425,10 +2369,28 @@ class LiFiDatabase:
                 'file_size': stat.st_size,
                 'file_size_mb': round(stat.st_size / (1024*1024), 2),
                 'last_modified': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
-                'file_path': os.path.abspath(self.db_path)
+                'file_path': os.path.abspath(self.db_path),
+                **partition_info
             }
         else:
             return {
                 'file_exists': False,
-                'file_path': os.path.abspath(self.db_path)
-            }
\ No newline at end of file
+                'file_path': os.path.abspath(self.db_path),
+                **partition_info
+            }
+
+_shared_database: Optional[LiFiDatabase] = None
+_shared_database_lock = threading.Lock()
+
+def get_database() -> LiFiDatabase:
+    """The process-wide LiFiDatabase, created (and its schema initialized) on first use.
+
+    The server, the fetch jobs and the exports share this handle, so the
+    schema DDL runs once per process and the write-side caches (sketch
+    buffer, leaderboard floors) are not split across instances.
+    """
+    global _shared_database
+    with _shared_database_lock:
+        if _shared_database is None:
+            _shared_database = LiFiDatabase()
+        return _shared_database
@@ -0,0 +1,107 @@
+import os
+from datetime import datetime
+from typing import Any, Callable, Iterable, List, Optional, Sequence
+
+# --- CONFIGURATION ---
+# Data rows per worksheet; Excel's limit is 1,048,576 rows including the header
+EXCEL_SHEET_ROWS = int(os.getenv('LIFI_EXCEL_SHEET_ROWS', 1048575))
+
+# Export column -> (header, width, kind); kind picks the cell format
+EXCEL_COLUMNS = {
+    'transaction_id': ('Transaction ID', 30, None),
+    'from_address': ('From Address', 44, None),
+    'to_address': ('To Address', 44, None),
+    'tool': ('Bridge/Tool', 14, None),
+    'status': ('Status', 10, None),
+    'sending_token': ('Source Token', 12, None),
+    'sending_amount_usd': ('Source Amount (USD)', 18, 'usd'),
+    'sending_chain': ('Source Chain', 16, None),
+    'sending_timestamp': ('Timestamp', 20, 'timestamp'),
+    'receiving_token': ('Destination Token', 12, None),
+    'receiving_amount_usd': ('Destination Amount (USD)', 18, 'usd'),
+    'receiving_chain': ('Destination Chain', 16, None),
+    'lifi_explorer_link': ('Explorer Link', 60, 'link'),
+}
+USD_FORMAT = '"$"#,##0.00'
+TIMESTAMP_FORMAT = 'yyyy-mm-dd hh:mm:ss'
+
+
+def write_xlsx(path: str, columns: Sequence[str], chunks: Iterable[List[tuple]], total: int = 0,
+               progress: Optional[Callable[[str, int, int], None]] = None) -> int:
+    """Stream row chunks into an .xlsx file with openpyxl's write-only worksheets; returns the row count.
+
+    Only the current chunk is held in memory: write-only sheets spill their
+    rows to temporary files as they are appended. A new sheet is started
+    every EXCEL_SHEET_ROWS rows. USD amounts and timestamps get number
+    formats, and explorer links become HYPERLINK formulas (openpyxl keeps
+    hyperlink objects in memory until the workbook is saved).
+    """
+    from openpyxl import Workbook  # Imported on first export: openpyxl is slow to load
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+
+    progress = progress or (lambda message, current=0, total=0: None)
+    specs = [EXCEL_COLUMNS.get(column, (column, 16, None)) for column in columns]
+    workbook = Workbook(write_only=True)
+    sheet = None
+    sheet_rows = 0
+    written = 0
+
+    def new_sheet(number: int):
+        sheet = workbook.create_sheet('Transactions' if number == 1 else f'Transactions ({number})')
+        sheet.freeze_panes = 'A2'
+        for index, (_, width, _) in enumerate(specs, start=1):
+            sheet.column_dimensions[get_column_letter(index)].width = width
+        sheet.append([header for header, _, _ in specs])
+        return sheet
+
+    def formatted_cells(sheet) -> List[Any]:
+        """One styled cell per formatted column, reused row after row: a write-only
+        sheet serializes each row as it is appended, so only the value changes."""
+        cells = []
+        for _, _, kind in specs:
+            if kind is None:
+                cells.append(None)
+                continue
+            formatted = WriteOnlyCell(sheet)
+            if kind == 'usd':
+                formatted.number_format = USD_FORMAT
+            elif kind == 'timestamp':
+                formatted.number_format = TIMESTAMP_FORMAT
+            else:
+                formatted.style = 'Hyperlink'
+            cells.append(formatted)
+        return cells
+
+    kinds = [kind for _, _, kind in specs]
+    formatted = []
+    for chunk in chunks:
+        for row in chunk:
+            if sheet is None or sheet_rows >= EXCEL_SHEET_ROWS:
+                sheet = new_sheet(len(workbook.worksheets) + 1)
+                formatted = formatted_cells(sheet)
+                sheet_rows = 0
+            values = list(row)
+            for index, kind in enumerate(kinds):
+                value = values[index]
+                if kind is None or value is None:
+                    continue
+                if kind == 'timestamp':
+                    try:
+                        value = datetime.fromisoformat(value)
+                    except (TypeError, ValueError):
+                        continue
+                elif kind == 'link' and '"' not in value:
+                    value = f'=HYPERLINK("{value}")'
+                formatted[index].value = value
+                values[index] = formatted[index]
+            sheet.append(values)
+            sheet_rows += 1
+        written += len(chunk)
+        progress(f"Wrote {written:,} rows to Excel", written, max(total, written))
+
+    if sheet is None:
+        new_sheet(1)
+    progress(f"Saving {len(workbook.worksheets)} worksheet(s)", written, max(total, written))
+    workbook.save(path)
+    return written
@@ -0,0 +1,196 @@
+import os
+import time
+import uuid
+import hashlib
+import logging
+import threading
+import concurrent.futures
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from query_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+EXPORT_DIR = os.getenv('LIFI_EXPORT_DIR', 'exports')
+EXPORT_MAX_CONCURRENT = int(os.getenv('LIFI_EXPORT_MAX_CONCURRENT', 2))
+EXPORT_CACHE_TTL = float(os.getenv('LIFI_EXPORT_CACHE_TTL', 3600))  # seconds
+EXPORT_CACHE_MAX_MB = float(os.getenv('LIFI_EXPORT_CACHE_MAX_MB', 512))
+EXPORT_JOB_HISTORY = int(os.getenv('LIFI_EXPORT_JOB_HISTORY', 100))
+# Seconds a ?download=1 request waits for its job before answering 202 with the job page
+EXPORT_DOWNLOAD_WAIT = float(os.getenv('LIFI_EXPORT_DOWNLOAD_WAIT', 20))
+
+EXPORT_EXTENSIONS = {'excel': 'xlsx', 'json': 'json', 'csv': 'csv'}
+
+
+class ExportJob:
+    """One export run: its request, progress and result file."""
+
+    def __init__(self, export_format: str, filters: Dict[str, Any], generation: int, key):
+        self.id = uuid.uuid4().hex[:12]
+        self.format = export_format
+        self.filters = filters
+        self.generation = generation
+        self.key = key
+        self.status = 'queued'
+        self.progress = {'message': 'Queued', 'current': 0, 'total': 0}
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.last_used_at = self.created_at
+        self.path: Optional[str] = None
+        self.size = 0
+        self.error: Optional[str] = None
+        self.done = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('completed', 'failed')
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'format': self.format,
+            'filters': self.filters,
+            'generation': self.generation,
+            'status': self.status,
+            'progress': dict(self.progress),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'size': self.size,
+            'error': self.error,
+            'url': f'/download?job={self.id}' if self.status == 'completed' else None
+        }
+
+
+class ExportManager:
+    """Runs exports in the background with deduplication and a result cache.
+
+    Requests are keyed by format, filters and the database's data generation.
+    A request matching a queued or running job joins it instead of starting
+    another; one matching a completed job whose file is still cached returns
+    that job at once. At most `max_concurrent` exports run at the same time,
+    the rest wait in the queue. Cached files expire after `ttl` seconds and
+    the least recently used ones are deleted once they exceed `max_mb`.
+    """
+
+    def __init__(self, db, export_dir: str = EXPORT_DIR, max_concurrent: int = EXPORT_MAX_CONCURRENT,
+                 ttl: float = EXPORT_CACHE_TTL, max_mb: float = EXPORT_CACHE_MAX_MB,
+                 history: int = EXPORT_JOB_HISTORY):
+        self.db = db
+        self.export_dir = export_dir
+        self.ttl = ttl
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.history = history
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrent,
+                                                               thread_name_prefix='export-worker')
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, ExportJob]" = OrderedDict()
+        self._by_key: Dict[Any, ExportJob] = {}
+
+    def submit(self, export_format: str, filters: Optional[Dict[str, Any]] = None) -> ExportJob:
+        """Start (or join, or reuse) the export for these filters at the current data generation."""
+        if export_format not in EXPORT_EXTENSIONS:
+            raise ValueError(f"Unsupported format: {export_format}")
+        filters = {k: v for k, v in (filters or {}).items() if v is not None and v != ''}
+        generation = self.db.get_generation()
+        key = normalize_query(export_format, generation=generation, **filters)
+
+        with self._lock:
+            self._evict()
+            job = self._by_key.get(key)
+            if job is not None and job.status != 'failed':
+                job.last_used_at = time.time()
+                return job
+
+            job = ExportJob(export_format, filters, generation, key)
+            self._jobs[job.id] = job
+            self._by_key[key] = job
+            self._trim_history()
+        self._executor.submit(self._run, job)
+        logger.info(f"Export job {job.id} queued: {export_format} {filters}")
+        return job
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.last_used_at = time.time()
+            return job
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [job.to_dict() for job in reversed(self._jobs.values())]
+
+    def _run(self, job: ExportJob):
+        def progress(message, current=0, total=0):
+            job.progress = {'message': message, 'current': current, 'total': total}
+
+        job.status = 'running'
+        job.started_at = time.time()
+        os.makedirs(self.export_dir, exist_ok=True)
+        digest = hashlib.sha1(repr(job.key).encode()).hexdigest()[:16]
+        # One file per job: a rerun of the same key never writes (or, once evicted, removes) a file being downloaded
+        stem = os.path.join(self.export_dir, f"lifi_{job.format}_{digest}_{job.id}")
+        path = f"{stem}.{EXPORT_EXTENSIONS[job.format]}"
+        partial = f"{stem}.part.{EXPORT_EXTENSIONS[job.format]}"
+        try:
+            getattr(self.db, f'export_to_{job.format}')(filename=partial, filters=job.filters, progress_callback=progress)
+            os.replace(partial, path)
+            job.path = path
+            job.size = os.path.getsize(path)
+            job.finished_at = time.time()
+            job.status = 'completed'
+            logger.info(f"Export job {job.id} completed: {path} ({job.size} bytes)")
+        except Exception as e:
+            job.error = str(e)
+            job.finished_at = time.time()
+            job.status = 'failed'
+            progress(f"Error: {e}")
+            logger.error(f"Export job {job.id} failed: {e}")
+            if os.path.exists(partial):
+                os.remove(partial)
+        finally:
+            with self._lock:
+                self._evict()
+            job.done.set()
+
+    def _evict(self):
+        """Drop expired results, then least recently used ones beyond the size budget."""
+        now = time.time()
+        cached = [job for job in self._by_key.values() if job.status == 'completed']
+        for job in cached:
+            if now - job.finished_at > self.ttl or not os.path.exists(job.path):
+                self._forget(job)
+
+        cached = sorted((job for job in self._by_key.values() if job.status == 'completed'),
+                        key=lambda job: job.last_used_at)
+        total = sum(job.size for job in cached)
+        for job in cached:
+            if total <= self.max_bytes:
+                break
+            total -= job.size
+            self._forget(job)
+
+    def _forget(self, job: ExportJob):
+        """Remove a completed job's file from the cache; the job record stays as expired."""
+        if self._by_key.get(job.key) is job:
+            del self._by_key[job.key]
+        job.status = 'expired'
+        if job.path and os.path.exists(job.path):
+            # A download in progress keeps its open descriptor
+            os.remove(job.path)
+        logger.info(f"Export job {job.id} evicted from the export cache")
+
+    def _trim_history(self):
+        while len(self._jobs) > self.history:
+            _, oldest = next(iter(self._jobs.items()))
+            if not oldest.finished and oldest.status != 'expired':
+                break
+            self._jobs.popitem(last=False)
+            if oldest.status == 'completed':
+                self._forget(oldest)
+            elif self._by_key.get(oldest.key) is oldest:
+                del self._by_key[oldest.key]
@@ -0,0 +1,126 @@
+import os
+import re
+import mimetypes
+from email.utils import formatdate, parsedate_to_datetime
+from http import HTTPStatus
+from typing import Optional, Tuple
+
+_RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def file_etag(stat_result: os.stat_result) -> str:
+    """Strong validator for a file version: changes whenever it is rewritten."""
+    return f'"{stat_result.st_ino:x}-{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) for a single 'bytes=' range.
+
+    Returns None when the header is absent or not a single byte range (the
+    whole file is sent) and raises ValueError when it cannot be satisfied.
+    """
+    match = _RANGE_PATTERN.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+class FileResponseMixin:
+    """Serve files from disk with conditional requests, byte ranges and sendfile.
+
+    Mix into a BaseHTTPRequestHandler subclass. The body goes from the file
+    to the socket with socket.sendfile (os.sendfile where the platform has
+    it, a chunked copy elsewhere), so large exports are never read into
+    Python memory.
+    """
+
+    def send_file(self, path: str, download_name: Optional[str] = None, content_type: Optional[str] = None):
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return
+
+        with f:
+            # Validators come from the open descriptor, so a concurrent rewrite
+            # (which replaces the file) cannot mix two versions in one response
+            stat_result = os.fstat(f.fileno())
+            size = stat_result.st_size
+            etag = file_etag(stat_result)
+            last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+
+            if self._not_modified(etag, stat_result.st_mtime):
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', last_modified)
+                self.end_headers()
+                return
+
+            byte_range = None
+            if self._if_range_matches(etag, stat_result.st_mtime):
+                try:
+                    byte_range = parse_range(self.headers.get('Range'), size)
+                except ValueError:
+                    self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                    self.send_header('Content-Range', f'bytes */{size}')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+            start, end = byte_range if byte_range else (0, size - 1)
+            length = end - start + 1 if size else 0
+
+            self.send_response(HTTPStatus.PARTIAL_CONTENT if byte_range else HTTPStatus.OK)
+            self.send_header('Content-type', content_type or mimetypes.guess_type(path)[0] or 'application/octet-stream')
+            self.send_header('Content-Length', str(length))
+            if byte_range:
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', last_modified)
+            self.send_header('Content-Disposition', f'attachment; filename="{download_name or os.path.basename(path)}"')
+            self.end_headers()
+
+            if self.command != 'HEAD' and length:
+                self.wfile.flush()
+                self.connection.sendfile(f, start, length)
+
+    def _not_modified(self, etag: str, mtime: float) -> bool:
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or etag in tags or f'W/{etag}' in tags
+        return self._not_modified_since(self.headers.get('If-Modified-Since'), mtime)
+
+    def _if_range_matches(self, etag: str, mtime: float) -> bool:
+        """A Range is honoured unless If-Range names a different version."""
+        if_range = self.headers.get('If-Range')
+        if if_range is None:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith('"') or if_range.startswith('W/'):
+            return if_range == etag
+        return self._not_modified_since(if_range, mtime)
+
+    @staticmethod
+    def _not_modified_since(value: Optional[str], mtime: float) -> bool:
+        if not value:
+            return False
+        try:
+            since = parsedate_to_datetime(value).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= since
@@ -4,6 +4,10 @@ from datetime import datetime
 import os
 import time
 import concurrent.futures
+from urllib.parse import urlparse, parse_qs
+from metrics import API_PAGE_FETCH_SECONDS, API_RESPONSES, API_RETRIES, ROWS_FETCHED, ROWS_FILTERED, ROWS_INSERTED
+from transfer_batch import TransferBatch
+from tracing import current_trace, join_trace, span
 
 # --- CONFIGURATION ---
 OUTPUT_FILENAME = "txns_2023_to_2025.xlsx"
@@ -15,30 +19,31 @@ SOURCE_TOKEN_FILTER = "BTC"
 
 # --- SCRIPT ---
 
-def get_chain_name(chain_id):
-    """Converts a chain ID to its name."""
-    # (Chain map remains the same)
-    chain_map = {
-        1: "Ethereum", 10: "Optimism", 56: "BNB Smart Chain", 100: "Gnosis Chain",
-        137: "Polygon", 250: "Fantom", 42161: "Arbitrum", 43114: "Avalanche",
-        20000000000001: "btc",
-    }
-    return chain_map.get(chain_id, f"Unknown Chain (ID: {chain_id})")
+def page_cursor(url):
+    """The `next` cursor a page URL continues from (None for the first page)."""
+    return parse_qs(urlparse(url).query).get('next', [None])[0]
 
 def fetch_single_page(url):
+    endpoint = urlparse(url).path.rsplit('/', 1)[-1]
     response = None
     for attempt in range(5): # Retry up to 5 times
-        response = requests.get(url)
+        with API_PAGE_FETCH_SECONDS.time(endpoint=endpoint), \
+                span('http.request', endpoint=endpoint, cursor=page_cursor(url), attempt=attempt + 1) as trace:
+            response = requests.get(url)
+            trace.update(status_code=response.status_code, bytes=len(response.content))
+        API_RESPONSES.inc(endpoint=endpoint, status_code=response.status_code)
         if response.status_code == 200:
             break # Success
         elif 500 <= response.status_code < 600:
             print(f"API returned a server error ({response.status_code}). Retrying in 10 seconds... (Attempt {attempt + 1}/5)")
+            API_RETRIES.inc(status_code=response.status_code)
             time.sleep(10)
         else:
             break # Don't retry for non-server errors (e.g., 4xx)
 
     response.raise_for_status() # Raise an exception for the last failed attempt or non-retryable errors
-    data = response.json()
+    with span('response.decode', cursor=page_cursor(url), bytes=len(response.content)):
+        data = response.json()
     return data, data.get("next")
 
 def fetch_and_process_data():
@@ -71,7 +76,8 @@ def fetch_and_process_data():
 
     saved_records_count = 0
     # --- Main Fetching Loop (Concurrent) ---
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=5, thread_name_prefix='fetch',
+                                               initializer=join_trace, initargs=(current_trace(),)) as executor:
         futures = {}
         current_page_url = "https://li.quest/v2/analytics/transfers"
         if os.path.exists(RESUME_FILE):
@@ -93,54 +99,37 @@ def fetch_and_process_data():
                 for future in concurrent.futures.as_completed(futures):
                     original_url = futures.pop(future) # Get URL for context
                     data, next_cursor = future.result()
-                    transfers = data.get("data", [])
+                    cursor = page_cursor(original_url)
+                    with span('parse', cursor=cursor, rows=len(data.get("data", []))):
+                        transfers = TransferBatch.from_payloads(data.get("data", []))
 
                     if not transfers:
                         print("No more transfers found.")
                         break # Break from inner loop, will eventually exit outer while
+                    ROWS_FETCHED.inc(len(transfers))
 
-                    first_tx_time = datetime.fromtimestamp(transfers[0].get("sending", {}).get("timestamp", 0))
-                    last_tx_time = datetime.fromtimestamp(transfers[-1].get("sending", {}).get("timestamp", 0))
+                    first_tx_time = datetime.fromtimestamp(transfers.first_timestamp or 0)
+                    last_tx_time = datetime.fromtimestamp(transfers.last_timestamp or 0)
                     print(f"Fetched a page of {len(transfers)} transfers. Timestamps from {first_tx_time} to {last_tx_time}. Filtering and saving...")
 
                     # Filter and append in real-time
-                    new_records = []
-                    for tx in transfers:
-                        sending_info = tx.get("sending", {})
-                        timestamp = sending_info.get("timestamp")
-                        if timestamp and start_date_timestamp <= timestamp <= end_date_timestamp and sending_info.get("token", {}).get("symbol", "N/A").upper() == SOURCE_TOKEN_FILTER:
-                            source_token_symbol = sending_info.get("token", {}).get("symbol", "N/A")
-                            amount_usd_str = sending_info.get("amountUSD")
-                            try:
-                                amount_usd = float(amount_usd_str)
-                            except (ValueError, TypeError):
-                                amount_usd = 0.0
-
-                            receiving_info = tx.get("receiving", {})
-                            metadata = tx.get("metadata", {})
-                            bridge_name = tx.get("tool", "Unknown")
-
-                            new_records.append({
-                                "Time": datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S'),
-                                "Source Token": source_token_symbol,
-                                "Source Chain Name": get_chain_name(sending_info.get("chainId")),
-                                "Source Wallet Address": tx.get("fromAddress", "N/A"),
-                                "Destination Token": receiving_info.get("token", {}).get("symbol", "N/A"),
-                                "Destination Chain Name": get_chain_name(receiving_info.get("chainId")),
-                                "Destination Wallet Address": tx.get("toAddress", "N/A"),
-                                "USD Value": amount_usd,
-                                "Integrator": metadata.get("integrator", "N/A"),
-                                "Bridge App Name": bridge_name,
-                            })
+                    with span('filter', cursor=cursor, rows=len(transfers)) as trace:
+                        new_records = transfers.filter(start_date_timestamp, end_date_timestamp,
+                                                       token_symbol=SOURCE_TOKEN_FILTER,
+                                                       min_usd=USD_THRESHOLD).excel_records()
+                        trace['matched'] = len(new_records)
 
+                    ROWS_FILTERED.inc(len(new_records))
                     if new_records:
-                        df_to_append = pd.DataFrame(new_records)
-                        with pd.ExcelWriter(OUTPUT_FILENAME, mode='a', engine='openpyxl', if_sheet_exists='overlay') as writer:
-                            df_to_append.to_excel(writer, header=False, index=False, startrow=writer.sheets['Sheet1'].max_row)
+                        with span('excel.write', cursor=cursor, rows=len(new_records)):
+                            df_to_append = pd.DataFrame(new_records)
+                            with pd.ExcelWriter(OUTPUT_FILENAME, mode='a', engine='openpyxl', if_sheet_exists='overlay') as writer:
+                                df_to_append.to_excel(writer, header=False, index=False, startrow=writer.sheets['Sheet1'].max_row)
+                        ROWS_INSERTED.inc(len(new_records))
                         print(f"Found and saved {len(new_records)} matching transactions.")
 
                     # --- Stop if we are past the date range ---
-                    last_tx_timestamp = transfers[-1].get("sending", {}).get("timestamp")
+                    last_tx_timestamp = transfers.last_timestamp
                     if last_tx_timestamp and last_tx_timestamp < start_date_timestamp:
                         print("Reached the beginning of the desired date range. Stopping fetch.")
                         break # Break from inner loop, will eventually exit outer while
@@ -1,11 +1,16 @@
 import requests
-import pandas as pd
 from datetime import datetime
 import os
 import time
 import concurrent.futures
+from urllib.parse import urlparse, parse_qs
 import logging
-from database import LiFiDatabase
+from database import BatchWriteError, get_database
+from transfer_batch import TransferBatch
+from coverage_map import COVERAGE_REPAIR_WORKERS, CoverageWalk
+from tracing import current_trace, join_trace, span
+from job_coordination import LeaseLost
+from metrics import API_PAGE_FETCH_SECONDS, API_RESPONSES, API_RETRIES, ROWS_FETCHED, ROWS_FILTERED
 
 # --- CONFIGURATION ---
 OUTPUT_FILENAME = "txns_2023_to_2025.xlsx"
@@ -14,37 +19,74 @@ START_DATE = datetime(2023, 1, 1)
 END_DATE = datetime(2025, 9, 30, 23, 59, 59)
 USD_THRESHOLD = 0
 SOURCE_TOKEN_FILTER = "BTC"
+LIFI_API_BASE = os.getenv('LIFI_API_BASE', 'https://li.quest').rstrip('/')  # overridden to point load tests at a mock
+TRANSFERS_URL = f"{LIFI_API_BASE}/v2/analytics/transfers"
+STATUS_URL = f"{LIFI_API_BASE}/v1/status"
+REFRESH_BATCH_SIZE = 50
 
-# Database instance
-db = LiFiDatabase()
+# Shared with the web server when it runs the fetch
+db = get_database()
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def page_cursor(url):
+    """The `next` cursor a page URL continues from (None for the first page)."""
+    return parse_qs(urlparse(url).query).get('next', [None])[0]
+
 def fetch_single_page(url):
     """Fetch a single page of transactions from the API."""
+    endpoint = urlparse(url).path.rsplit('/', 1)[-1]
     response = None
     for attempt in range(5):  # Retry up to 5 times
-        response = requests.get(url)
+        with API_PAGE_FETCH_SECONDS.time(endpoint=endpoint), \
+                span('http.request', endpoint=endpoint, cursor=page_cursor(url), attempt=attempt + 1) as trace:
+            response = requests.get(url)
+            trace.update(status_code=response.status_code, bytes=len(response.content))
+        API_RESPONSES.inc(endpoint=endpoint, status_code=response.status_code)
         if response.status_code == 200:
             break  # Success
         elif 500 <= response.status_code < 600:
             logger.warning(f"API returned a server error ({response.status_code}). Retrying in 10 seconds... (Attempt {attempt + 1}/5)")
+            API_RETRIES.inc(status_code=response.status_code)
             time.sleep(10)
         else:
             break  # Don't retry for non-server errors (e.g., 4xx)
 
     response.raise_for_status()  # Raise an exception for the last failed attempt or non-retryable errors
-    data = response.json()
+    with span('response.decode', cursor=page_cursor(url), bytes=len(response.content)):
+        data = response.json()
     return data, data.get("next")
 
-def fetch_and_process_data_db(progress_callback=None):
+def token_filter():
+    """SOURCE_TOKEN_FILTER as a filter value: None (every token) for "ALL"."""
+    return SOURCE_TOKEN_FILTER if SOURCE_TOKEN_FILTER != "ALL" else None
+
+def read_resume_file():
+    """Saved (cursor, boundary): the boundary is the newest second the resumed walk has yet to cover."""
+    if not os.path.exists(RESUME_FILE):
+        return None, None
+    with open(RESUME_FILE, 'r') as f:
+        lines = f.read().split()
+    cursor = lines[0] if lines else None
+    boundary = int(lines[1]) if len(lines) > 1 and lines[1].lstrip('-').isdigit() else None
+    return cursor, boundary
+
+def fetch_transfer_page(url):
+    """Fetch a page of transfers, parsed into a TransferBatch (filter columns included) on the fetching thread."""
+    data, next_cursor = fetch_single_page(url)
+    with span('parse', cursor=page_cursor(url), rows=len(data.get("data", []))):
+        batch = TransferBatch.from_payloads(data.get("data", []), build_columns=True)
+    return batch, next_cursor
+
+def fetch_and_process_data_db(progress_callback=None, lease=None):
     """
     Fetches, filters, and saves transaction data to database with resume capability.
 
     Args:
         progress_callback: Optional function to call with progress updates
+        lease: Optional LeaseGuard of the ingestion lease, checked before every write
     """
 
     def update_progress(message, current=0, total=0):
@@ -55,31 +97,38 @@ def fetch_and_process_data_db(progress_callback=None):
     update_progress("Initializing database connection")
 
     # --- Resume Logic ---
-    next_page_url = "https://li.quest/v2/analytics/transfers"
-    if os.path.exists(RESUME_FILE):
-        with open(RESUME_FILE, 'r') as f:
-            resume_cursor = f.read().strip()
-            if resume_cursor:
-                next_page_url = f"https://li.quest/v2/analytics/transfers?next={resume_cursor}"
-                logger.info(f"Resuming from saved cursor: {resume_cursor}")
+    next_page_url = TRANSFERS_URL
+    resume_cursor, resume_boundary = read_resume_file()
+    if resume_cursor:
+        next_page_url = f"{TRANSFERS_URL}?next={resume_cursor}"
+        logger.info(f"Resuming from saved cursor: {resume_cursor}")
+    else:
+        resume_boundary = None
 
     start_date_timestamp = START_DATE.timestamp()
     end_date_timestamp = END_DATE.timestamp()
 
+    # Stored pages extend the coverage map; a resumed walk continues below the saved boundary
+    walk = CoverageWalk(db, start_date_timestamp, end_date_timestamp, token_filter(), USD_THRESHOLD,
+                        upper=resume_boundary)
+
     update_progress(f"Fetching transactions from {START_DATE.strftime('%Y-%m-%d')} to {END_DATE.strftime('%Y-%m-%d')}")
 
     saved_records_count = 0
     total_processed = 0
+    failed_pages = 0
+    reached_end = False
 
     # --- Main Fetching Loop (Concurrent) ---
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=5, thread_name_prefix='fetch',
+                                               initializer=join_trace, initargs=(current_trace(),)) as executor:
         futures = {}
         current_page_url = next_page_url
 
         # Submit initial tasks
         for _ in range(5):  # Start with 5 concurrent fetches
             if current_page_url:
-                future = executor.submit(fetch_single_page, current_page_url)
+                future = executor.submit(fetch_transfer_page, current_page_url)
                 futures[future] = current_page_url  # Store URL for context
                 current_page_url = None  # Prevent re-submitting the same URL immediately
 
@@ -87,65 +136,96 @@ def fetch_and_process_data_db(progress_callback=None):
             try:
                 for future in concurrent.futures.as_completed(futures):
                     original_url = futures.pop(future)  # Get URL for context
-                    data, next_cursor = future.result()
-                    transfers = data.get("data", [])
+                    transfers, next_cursor = future.result()
 
                     if not transfers:
                         update_progress("No more transfers found")
+                        if lease:
+                            lease.check()
+                        walk.finish()
                         break  # Break from inner loop, will eventually exit outer while
 
                     total_processed += len(transfers)
+                    ROWS_FETCHED.inc(len(transfers))
 
-                    first_tx_time = datetime.fromtimestamp(transfers[0].get("sending", {}).get("timestamp", 0))
-                    last_tx_time = datetime.fromtimestamp(transfers[-1].get("sending", {}).get("timestamp", 0))
+                    first_tx_time = datetime.fromtimestamp(transfers.first_timestamp or 0)
+                    last_tx_time = datetime.fromtimestamp(transfers.last_timestamp or 0)
+
+                    # Pages arrive newest first, so the share of the date range already
+                    # walked gives an estimate of how many transfers there are in total
+                    covered = (end_date_timestamp - min(last_tx_time.timestamp(), end_date_timestamp)) / (end_date_timestamp - start_date_timestamp)
+                    estimated_total = int(total_processed / covered) if covered > 0 else total_processed + 100
 
                     update_progress(f"Processing batch of {len(transfers)} transfers ({first_tx_time} to {last_tx_time})",
-                                  total_processed, total_processed + 100)
-
-                    # Filter transactions based on criteria
-                    filtered_transactions = []
-                    for tx in transfers:
-                        sending_info = tx.get("sending", {})
-                        timestamp = sending_info.get("timestamp")
-
-                        # Apply filters
-                        if timestamp and start_date_timestamp <= timestamp <= end_date_timestamp:
-                            # If SOURCE_TOKEN_FILTER is specified, apply it
-                            if SOURCE_TOKEN_FILTER and SOURCE_TOKEN_FILTER != "ALL":
-                                if sending_info.get("token", {}).get("symbol", "").upper() == SOURCE_TOKEN_FILTER.upper():
-                                    filtered_transactions.append(tx)
-                            else:
-                                # No token filter, include all transactions in date range
-                                filtered_transactions.append(tx)
+                                  total_processed, max(estimated_total, total_processed))
+
+                    # Filter transactions based on criteria (no token filter means every token in the date range)
+                    cursor = page_cursor(original_url)
+                    with span('filter', cursor=cursor, rows=len(transfers)) as trace:
+                        filtered_transactions = transfers.filter(
+                            start_date_timestamp, end_date_timestamp,
+                            token_symbol=token_filter(),
+                            min_usd=USD_THRESHOLD
+                        )
+                        trace['matched'] = len(filtered_transactions)
+
+                    ROWS_FILTERED.inc(len(filtered_transactions))
 
                     # Insert filtered transactions into database
+                    if lease:
+                        lease.check()
+                    page_saved = True
                     if filtered_transactions:
-                        inserted_count = db.bulk_insert_transactions(filtered_transactions)
+                        with span('db.transaction', cursor=cursor, rows=len(filtered_transactions)) as trace:
+                            try:
+                                inserted_count = db.insert_batch(filtered_transactions)
+                            except BatchWriteError as e:
+                                inserted_count = e.inserted
+                                page_saved = False
+                                failed_pages += 1
+                                trace['dropped'] = e.dropped
+                            trace['inserted'] = inserted_count
                         saved_records_count += inserted_count
-                        update_progress(f"Saved {inserted_count} new transactions (Total: {saved_records_count})")
+                        if page_saved:
+                            update_progress(f"Saved {inserted_count} new transactions (Total: {saved_records_count})")
+                        else:
+                            update_progress(f"Saved {inserted_count} new transactions (Total: {saved_records_count}); "
+                                            f"the rest of the batch failed and its time range stays a coverage gap")
                     else:
                         update_progress("No transactions matched filters in this batch")
 
-                    # Save resume cursor
-                    if next_cursor:
-                        with open(RESUME_FILE, 'w') as f:
-                            f.write(next_cursor)
+                    # Save resume cursor, with the boundary the coverage map has reached
+                    if lease:
+                        lease.check()
+                    with span('checkpoint', cursor=cursor, next_cursor=next_cursor):
+                        if page_saved:
+                            walk.page(transfers.first_timestamp, transfers.last_timestamp)
+                        else:
+                            walk.skip(transfers.last_timestamp)
+                        if next_cursor:
+                            with open(RESUME_FILE, 'w') as f:
+                                f.write(next_cursor if walk.upper is None else f"{next_cursor}\n{walk.upper}")
 
                     # --- Stop if we are past the date range ---
-                    last_tx_timestamp = transfers[-1].get("sending", {}).get("timestamp")
+                    last_tx_timestamp = transfers.last_timestamp
                     if last_tx_timestamp and last_tx_timestamp < start_date_timestamp:
                         update_progress("Reached the beginning of the desired date range. Stopping fetch.")
+                        reached_end = True
                         break  # Break from inner loop, will eventually exit outer while
 
                     # Submit next task if available
                     if next_cursor:
-                        next_page_url = f"https://li.quest/v2/analytics/transfers?next={next_cursor}"
-                        future = executor.submit(fetch_single_page, next_page_url)
+                        next_page_url = f"{TRANSFERS_URL}?next={next_cursor}"
+                        future = executor.submit(fetch_transfer_page, next_page_url)
                         futures[future] = next_page_url
                     else:
                         update_progress("Reached the end of all transaction history.")
+                        if lease:
+                            lease.check()
+                        walk.finish()
                         if os.path.exists(RESUME_FILE):
                             os.remove(RESUME_FILE)  # Clean up resume file on successful completion
+                        reached_end = True
                         break  # Break from inner loop, will eventually exit outer while
 
             except requests.exceptions.RequestException as e:
@@ -153,6 +233,9 @@ def fetch_and_process_data_db(progress_callback=None):
                 update_progress(error_msg)
                 logger.error(error_msg)
                 break  # Stop execution, the resume file has the last good cursor
+            except LeaseLost:
+                # Another process owns ingestion now: no freezing or export either
+                raise
             except Exception as e:
                 error_msg = f"An unexpected error occurred: {e}"
                 update_progress(error_msg)
@@ -161,6 +244,14 @@ def fetch_and_process_data_db(progress_callback=None):
 
     update_progress(f"Database update complete! Saved {saved_records_count} transactions.")
 
+    # Past months are complete once the backfill has reached its end with every page stored, so freeze them
+    if reached_end and not failed_pages and db.partitioned:
+        if lease:
+            lease.check()
+        frozen = db.freeze_partitions()
+        if frozen:
+            update_progress(f"Froze {len(frozen)} completed monthly partitions")
+
     # Also create Excel export for compatibility
     try:
         update_progress("Creating Excel export for compatibility")
@@ -168,7 +259,8 @@ def fetch_and_process_data_db(progress_callback=None):
         if SOURCE_TOKEN_FILTER and SOURCE_TOKEN_FILTER != "ALL":
             filters['token_symbol'] = SOURCE_TOKEN_FILTER
 
-        excel_file = db.export_to_excel(OUTPUT_FILENAME, filters)
+        with span('excel.write', rows=saved_records_count):
+            excel_file = db.export_to_excel(OUTPUT_FILENAME, filters)
         update_progress(f"Excel file created: {excel_file}")
 
     except Exception as e:
@@ -176,27 +268,262 @@ def fetch_and_process_data_db(progress_callback=None):
 
     return saved_records_count
 
+def fetch_transfer_status(tx_hash):
+    """Fetch the current state of a single transfer by its sending transaction hash."""
+    data, _ = fetch_single_page(f"{STATUS_URL}?txHash={tx_hash}")
+    return data
+
+def refresh_pending_transactions(progress_callback=None, batch_size=REFRESH_BATCH_SIZE, lease=None):
+    """
+    Re-fetches transfers that are not final yet and upserts their status and receiving leg.
+
+    Only the pending set is touched, least recently checked first, so the cost
+    is proportional to the number of non-final transfers rather than a rebuild.
+
+    Args:
+        progress_callback: Optional function to call with progress updates
+        batch_size: Number of transfers fetched (concurrently) per batch
+        lease: Optional LeaseGuard of the ingestion lease, checked before every write
+    """
+
+    def update_progress(message, current=0, total=0):
+        if progress_callback:
+            progress_callback(message, current, total)
+        logger.info(f"Progress: {message} ({current}/{total})")
+
+    pending_total = db.count_pending_transactions()
+    update_progress(f"Refreshing {pending_total} non-final transfers", 0, pending_total)
+
+    checked_count = 0
+    updated_count = 0
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=5, thread_name_prefix='fetch',
+                                               initializer=join_trace, initargs=(current_trace(),)) as executor:
+        while checked_count < pending_total:
+            batch = db.get_pending_transactions(min(batch_size, pending_total - checked_count))
+            if not batch:
+                break
+
+            futures = {
+                executor.submit(fetch_transfer_status, item['tx_hash']): item
+                for item in batch if item['tx_hash']
+            }
+            unchanged = [item['transaction_id'] for item in batch if not item['tx_hash']]
+            fresh = []
+
+            for future in concurrent.futures.as_completed(futures):
+                item = futures[future]
+                try:
+                    status_data = future.result()
+                except requests.exceptions.RequestException as e:
+                    logger.warning(f"Could not refresh {item['transaction_id']}: {e}")
+                    unchanged.append(item['transaction_id'])
+                    continue
+
+                status_data['transactionId'] = status_data.get('transactionId') or item['transaction_id']
+                fresh.append(status_data)
+
+            # The whole batch is written in one transaction per file; update_transaction_statuses
+            # compares status, substatus and the receiving leg with what is stored and skips the rest
+            if lease:
+                lease.check()
+            updated = set(db.update_transaction_statuses(fresh))
+            updated_count += len(updated)
+            unchanged.extend(data['transactionId'] for data in fresh if data['transactionId'] not in updated)
+            db.mark_pending_checked(unchanged)
+            checked_count += len(batch)
+            update_progress(f"Checked {checked_count} pending transfers, updated {updated_count}",
+                            checked_count, pending_total)
+
+    update_progress(f"Status refresh complete! Updated {updated_count} transfers, "
+                    f"{db.count_pending_transactions()} still pending.")
+    return updated_count
+
+def window_url(start_ts, end_ts, cursor=None):
+    """Transfers page URL limited to sending times within [start_ts, end_ts]."""
+    url = f"{TRANSFERS_URL}?fromTimestamp={start_ts}&toTimestamp={end_ts}"
+    return f"{url}&next={cursor}" if cursor else url
+
+def repair_coverage_gaps(progress_callback=None, start_date=START_DATE, end_date=END_DATE, lease=None):
+    """
+    Fetches only the time ranges between start_date and end_date that the coverage map is missing.
+
+    Each gap is walked newest first through the API's fromTimestamp/toTimestamp
+    window, up to COVERAGE_REPAIR_WORKERS gaps at a time. Pages are written and
+    recorded as covered on this thread, so an interrupted repair leaves only
+    smaller gaps behind. Frozen partitions the gaps fall in are thawed first.
+
+    Args:
+        progress_callback: Optional function to call with progress updates
+        start_date: Beginning of the range to repair
+        end_date: End of the range to repair
+        lease: Optional LeaseGuard of the ingestion lease, checked before every write
+    """
+
+    def update_progress(message, current=0, total=0):
+        if progress_callback:
+            progress_callback(message, current, total)
+        logger.info(f"Progress: {message} ({current}/{total})")
+
+    token_symbol = token_filter()
+    gaps = db.find_coverage_gaps(start_date.timestamp(), end_date.timestamp(), token_symbol, USD_THRESHOLD)
+    if not gaps:
+        update_progress("No coverage gaps to repair")
+        return 0
+
+    gap_seconds = sum(end - start + 1 for start, end in gaps)
+    update_progress(f"Repairing {len(gaps)} coverage gaps ({gap_seconds / 86400:.1f} days)", 0, gap_seconds)
+
+    if lease:
+        lease.check()
+    if db.partitioned:
+        for start, end in gaps:
+            for partition in db.list_partitions(datetime.fromtimestamp(start).strftime('%Y-%m'),
+                                                datetime.fromtimestamp(end).strftime('%Y-%m')):
+                if partition['frozen']:
+                    db.thaw_partition(partition['month'])
+
+    walks = [CoverageWalk(db, start, end, token_symbol, USD_THRESHOLD, upper=end) for start, end in reversed(gaps)]
+    queued = iter(walks)
+    saved_records_count = 0
+    repaired_gaps = 0
+    failed_gaps = 0
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=COVERAGE_REPAIR_WORKERS, thread_name_prefix='fetch',
+                                               initializer=join_trace, initargs=(current_trace(),)) as executor:
+        futures = {}
+
+        def start_next_gap():
+            walk = next(queued, None)
+            if walk:
+                futures[executor.submit(fetch_transfer_page, window_url(walk.start, walk.end))] = walk
+
+        for _ in range(COVERAGE_REPAIR_WORKERS):
+            start_next_gap()
+
+        while futures:
+            done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                walk = futures.pop(future)
+                try:
+                    transfers, next_cursor = future.result()
+                except requests.exceptions.RequestException as e:
+                    logger.warning(f"Could not repair gap {datetime.fromtimestamp(walk.start)} to "
+                                   f"{datetime.fromtimestamp(walk.end)}: {e}; what is left of it stays open")
+                    failed_gaps += 1
+                    start_next_gap()
+                    continue
+
+                ROWS_FETCHED.inc(len(transfers))
+                with span('filter', gap_start=walk.start, rows=len(transfers)) as trace:
+                    filtered_transactions = transfers.filter(walk.start, walk.end, token_symbol=token_symbol,
+                                                             min_usd=USD_THRESHOLD)
+                    trace['matched'] = len(filtered_transactions)
+                ROWS_FILTERED.inc(len(filtered_transactions))
+                if lease:
+                    lease.check()
+                if filtered_transactions:
+                    with span('db.transaction', gap_start=walk.start, rows=len(filtered_transactions)) as trace:
+                        try:
+                            trace['inserted'] = db.insert_batch(filtered_transactions)
+                        except BatchWriteError as e:
+                            trace['inserted'], trace['dropped'] = e.inserted, e.dropped
+                    saved_records_count += trace['inserted']
+                    if 'dropped' in trace:
+                        logger.warning(f"Could not repair gap {datetime.fromtimestamp(walk.start)} to "
+                                       f"{datetime.fromtimestamp(walk.end)}: {trace['dropped']} transactions "
+                                       f"could not be stored; what is left of it stays open")
+                        failed_gaps += 1
+                        start_next_gap()
+                        continue
+                with span('checkpoint', gap_start=walk.start, next_cursor=next_cursor):
+                    walk.page(transfers.first_timestamp, transfers.last_timestamp)
+
+                # The window is done once it runs out of pages or a page reaches below its start
+                last_tx_timestamp = transfers.last_timestamp
+                if not transfers or not next_cursor or (last_tx_timestamp and last_tx_timestamp < walk.start):
+                    walk.finish()
+                    repaired_gaps += 1
+                    start_next_gap()
+                else:
+                    futures[executor.submit(fetch_transfer_page, window_url(walk.start, walk.end, next_cursor))] = walk
+
+                covered = sum(w.end - w.upper for w in walks)
+                update_progress(f"Repaired {repaired_gaps}/{len(gaps)} gaps, saved {saved_records_count} transactions",
+                                covered, gap_seconds)
+
+    update_progress(f"Coverage repair complete! Repaired {repaired_gaps} gaps ({failed_gaps} failed), "
+                    f"saved {saved_records_count} transactions.")
+
+    if not failed_gaps and db.partitioned:
+        if lease:
+            lease.check()
+        frozen = db.freeze_partitions()
+        if frozen:
+            update_progress(f"Froze {len(frozen)} completed monthly partitions")
+
+    return saved_records_count
+
 def fetch_and_process_data():
     """Legacy function for backward compatibility."""
     return fetch_and_process_data_db()
 
 if __name__ == "__main__":
+    import argparse
+    import uuid
+    from job_coordination import SharedJobState
+    from tracing import start_trace, stop_trace
+
+    parser = argparse.ArgumentParser(description="Fetch LI.FI transfers into the database")
+    parser.add_argument('--repair-gaps', action='store_true',
+                        help="only fetch the time ranges missing from the coverage map")
+    parser.add_argument('--trace', metavar='PATH',
+                        help="write the run's Chrome trace JSON here (default: the traces directory)")
+    args = parser.parse_args()
+
     print("🚀 Starting LiFi transaction fetching with database storage...")
 
-    def progress_callback(message, current=0, total=0):
-        print(f"📊 {message}")
+    # Same single-writer rule as the web server: run only while no server job is fetching
+    jobs = SharedJobState()
+    if not jobs.start("Starting command-line fetch..."):
+        print(f"❌ A fetch is already running in process {jobs.lease_holder()}; try again when it finishes")
+        raise SystemExit(1)
 
-    try:
-        count = fetch_and_process_data_db(progress_callback)
-        print(f"✅ Successfully processed {count} transactions!")
+    # Traced like server jobs; the server serves the saved file from /jobs/<job_id>/trace
+    job_id = uuid.uuid4().hex[:12]
+    tracer = start_trace(job_id, 'repair' if args.repair_gaps else 'fetch')
+    tracer_started = time.perf_counter()
+    progress = {"current": 0, "total": 0, "message": "Starting command-line fetch...", "job_id": job_id}
 
-        # Show database statistics
-        stats = db.get_statistics()
-        print(f"📈 Database now contains {stats['total_transactions']} total transactions")
-        print(f"💰 Total volume: ${stats['total_volume_usd']:,.2f}")
+    def progress_callback(message, current=0, total=0):
+        progress.update(current=current, total=total, message=message)
+        jobs.update(progress)
+        print(f"📊 {message}")
 
-    except KeyboardInterrupt:
-        print("❌ Process interrupted by user")
-    except Exception as e:
-        print(f"❌ Error: {e}")
-        logger.error(f"Fatal error: {e}")
\ No newline at end of file
+    status = "error"
+    with jobs.keep_lease() as lease:
+        try:
+            fetch = repair_coverage_gaps if args.repair_gaps else fetch_and_process_data_db
+            count = fetch(progress_callback, lease=lease)
+            print(f"✅ Successfully processed {count} transactions!")
+            progress["message"] = f"Command-line fetch completed! Saved {count} transactions."
+            status = "completed"
+
+            # Show database statistics
+            stats = db.get_statistics()
+            print(f"📈 Database now contains {stats['total_transactions']} total transactions")
+            print(f"💰 Total volume: ${stats['total_volume_usd']:,.2f}")
+
+        except KeyboardInterrupt:
+            progress["message"] = "Interrupted"
+            print("❌ Process interrupted by user")
+        except Exception as e:
+            progress["message"] = f"Error: {e}"
+            print(f"❌ Error: {e}")
+        finally:
+            tracer.record(tracer.name, 'job', tracer_started, time.perf_counter(), {'status': status})
+            tracer.metadata.update(status=status, message=progress["message"])
+            trace_file = stop_trace(tracer, args.trace)
+            if trace_file:
+                print(f"🧭 Trace written to {trace_file}")
+            jobs.update(progress, status=status)
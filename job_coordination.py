@@ -0,0 +1,261 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+JOB_STATE_DB = os.getenv('LIFI_JOB_STATE_DB', 'lifi_jobs.db')
+INGESTION_LEASE = 'ingestion'
+INGESTION_LEASE_TTL = float(os.getenv('LIFI_INGESTION_LEASE_TTL', 30))  # seconds
+JOB_STATE_WRITE_INTERVAL = float(os.getenv('LIFI_JOB_STATE_WRITE_INTERVAL', 0.25))  # seconds between progress writes
+JOB_STATE_POLL_INTERVAL = float(os.getenv('LIFI_JOB_STATE_POLL_INTERVAL', 0.5))  # seconds
+
+
+class LeaseLost(RuntimeError):
+    """A job's lease expired or was taken over, so it must not write again."""
+
+
+class LeaseGuard:
+    """Handed out by SharedJobState.keep_lease; `lost` is set once the lease cannot be renewed."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lost = threading.Event()
+
+    def check(self):
+        """Raise LeaseLost if the lease is gone; jobs call this before each write transaction."""
+        if self.lost.is_set():
+            raise LeaseLost(f"Lost the {self.name} lease; stopped before writing again")
+
+
+def process_owner() -> str:
+    """Identity of the calling process as recorded on leases and job state."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SharedJobState:
+    """Background job status and progress, plus writer leases, in a small SQLite file.
+
+    Every server process (and the command-line fetch) opens the same file,
+    so /progress and /status look the same whichever process answers. A
+    lease is a row naming its owner and an expiry time; taking one is a
+    BEGIN IMMEDIATE transaction, so exactly one process wins. The holder
+    renews it while working; if that process dies, the lease simply expires
+    and the next job may start. The file needs a local filesystem: SQLite
+    locking is not reliable over network mounts.
+    """
+
+    def __init__(self, path: str = JOB_STATE_DB, name: str = INGESTION_LEASE,
+                 ttl: float = INGESTION_LEASE_TTL, write_interval: float = JOB_STATE_WRITE_INTERVAL):
+        self.path = path
+        self.name = name
+        self.ttl = ttl
+        self.write_interval = write_interval
+        self._last_write = 0.0
+        self._write_lock = threading.Lock()
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS job_state (
+                    name TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    progress TEXT NOT NULL,
+                    start_time REAL,
+                    owner TEXT,
+                    version INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL
+                )
+            ''')
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit; transactions that must be atomic use an explicit BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    # --- Leases ---
+
+    @staticmethod
+    def _take_lease(conn: sqlite3.Connection, name: str, ttl: float) -> bool:
+        now = time.time()
+        row = conn.execute("SELECT owner, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+        if row is not None and row[1] > now:
+            return False
+        conn.execute("INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)",
+                     (name, process_owner(), now + ttl))
+        if row is not None:
+            logger.warning(f"Took over expired {name} lease from {row[0]}")
+        return True
+
+    def acquire_lease(self, name: Optional[str] = None) -> bool:
+        """Take the lease unless someone (this process included) holds an unexpired one."""
+        with self._transaction() as conn:
+            return self._take_lease(conn, name or self.name, self.ttl)
+
+    def renew_lease(self, name: Optional[str] = None) -> bool:
+        """Extend a lease held by this process; False if it was lost in the meantime."""
+        with self._transaction() as conn:
+            cursor = conn.execute("UPDATE leases SET expires_at = ? WHERE name = ? AND owner = ?",
+                                  (time.time() + self.ttl, name or self.name, process_owner()))
+            return cursor.rowcount == 1
+
+    def release_lease(self, name: Optional[str] = None):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name or self.name, process_owner()))
+
+    def lease_holder(self, name: Optional[str] = None) -> Optional[str]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT owner FROM leases WHERE name = ? AND expires_at > ?",
+                               (name or self.name, time.time())).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    @contextmanager
+    def keep_lease(self, name: Optional[str] = None) -> Iterator[LeaseGuard]:
+        """Renew an acquired lease in the background for the duration of the block, then release it.
+
+        Yields a LeaseGuard whose check() raises once the lease was taken
+        over, or could not be renewed for a whole TTL.
+        """
+        name = name or self.name
+        stop = threading.Event()
+        guard = LeaseGuard(name)
+
+        def renew():
+            renewed_at = time.monotonic()
+            while not stop.wait(self.ttl / 3):
+                try:
+                    if not self.renew_lease(name):
+                        guard.lost.set()
+                        logger.error(f"Lost the {name} lease; the job stops before its next write")
+                        return
+                    renewed_at = time.monotonic()
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not renew the {name} lease: {e}")
+                    if time.monotonic() - renewed_at >= self.ttl:
+                        guard.lost.set()
+                        logger.error(f"The {name} lease expired while it could not be renewed; "
+                                     f"the job stops before its next write")
+                        return
+
+        thread = threading.Thread(target=renew, name=f'{name}-lease', daemon=True)
+        thread.start()
+        try:
+            yield guard
+        finally:
+            stop.set()
+            thread.join()
+            self.release_lease(name)
+
+    # --- Job state ---
+
+    def start(self, message: str = "Starting...") -> bool:
+        """Take the lease and mark the job running, atomically; False if another job holds it."""
+        now = time.time()
+        with self._transaction() as conn:
+            if not self._take_lease(conn, self.name, self.ttl):
+                return False
+            self._write(conn, 'running', {"current": 0, "total": 0, "message": message}, start_time=now)
+        self._last_write = now
+        return True
+
+    def update(self, progress: Dict[str, Any], status: Optional[str] = None, force: bool = False):
+        """Record progress; writes are throttled to one per write_interval unless forced or status changes."""
+        now = time.time()
+        with self._write_lock:
+            if not force and status is None and now - self._last_write < self.write_interval:
+                return
+            self._last_write = now
+        with self._transaction() as conn:
+            self._write(conn, status, progress)
+
+    def _write(self, conn: sqlite3.Connection, status: Optional[str], progress: Dict[str, Any],
+               start_time: Optional[float] = None):
+        conn.execute('''
+            INSERT INTO job_state (name, status, progress, start_time, owner, version, updated_at)
+            VALUES (?, COALESCE(?, 'running'), ?, ?, ?, 1, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                status = COALESCE(?, status),
+                progress = excluded.progress,
+                start_time = COALESCE(?, start_time),
+                owner = excluded.owner,
+                version = version + 1,
+                updated_at = excluded.updated_at
+        ''', (self.name, status, json.dumps(progress, default=str), start_time, process_owner(), time.time(),
+              status, start_time))
+
+    def read(self) -> Dict[str, Any]:
+        """The stored job state; a 'running' job whose lease has expired is reported as an error."""
+        conn = self._connect()
+        try:
+            row = conn.execute('''
+                SELECT j.status, j.progress, j.start_time, j.owner, j.version, l.owner
+                FROM job_state j LEFT JOIN leases l ON l.name = j.name AND l.expires_at > ?
+                WHERE j.name = ?
+            ''', (time.time(), self.name)).fetchone()
+        finally:
+            conn.close()
+
+        if row is None:
+            return {"status": "idle", "progress": {"current": 0, "total": 0, "message": "Ready"},
+                    "start_time": None, "owner": None, "version": 0}
+        status, progress, start_time, owner, version, holder = row
+        progress = json.loads(progress)
+        if status == 'running' and holder != owner:
+            status = 'error'
+            progress['message'] = f"Job stopped: process {owner} exited without finishing"
+        return {"status": status, "progress": progress, "start_time": start_time,
+                "owner": owner, "version": version}
+
+    def follow(self, callback: Callable[[Dict[str, Any]], None],
+               interval: float = JOB_STATE_POLL_INTERVAL) -> threading.Thread:
+        """Call callback with the state whenever it changes (polled in a daemon thread)."""
+        def poll():
+            seen = None
+            while True:
+                try:
+                    state = self.read()
+                    # The status alone changes when a dead job's lease expires
+                    if (state['version'], state['status']) != seen:
+                        seen = (state['version'], state['status'])
+                        callback(state)
+                except Exception as e:
+                    logger.warning(f"Could not read shared job state: {e}")
+                time.sleep(interval)
+
+        thread = threading.Thread(target=poll, name='job-state-follower', daemon=True)
+        thread.start()
+        return thread
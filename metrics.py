@@ -0,0 +1,233 @@
+import os
+import time
+import bisect
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# --- CONFIGURATION ---
+METRICS_ENABLED = os.getenv('LIFI_METRICS', '1').lower() not in ('0', 'false', 'no')
+
+# Latency buckets in seconds, from sub-millisecond SQLite commits to slow API pages
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Sample = Tuple[Dict[str, str], float]
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + '}'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    """Base for a named metric family with a fixed set of label names."""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    @abstractmethod
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        """(sample name, labels, value) for every series of the family."""
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally per label combination."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, self._labels(key), value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets, plus sum and count."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (+Inf last), sum]
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def time(self, **labels) -> '_Timer':
+        """Context manager observing the elapsed wall time of its block."""
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', dict(labels, le=_format_value(bound) if bound != float('inf') else '+Inf'), cumulative
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, cumulative
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class StartupTimer:
+    """Durations of consecutive startup phases, for the boot log line and /metrics."""
+
+    def __init__(self, started: float = None):
+        self.started = time.perf_counter() if started is None else started
+        self._last = self.started
+        self.phases: List[Tuple[str, float]] = []
+
+    def mark(self, phase: str):
+        """End the current phase, naming it."""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    @property
+    def total(self) -> float:
+        return self._last - self.started
+
+    def report(self) -> str:
+        phases = ', '.join(f'{phase} {seconds * 1000:.0f}ms' for phase, seconds in self.phases)
+        return f'Startup took {self.total * 1000:.0f}ms ({phases})'
+
+
+class Registry:
+    """Metric families plus callback collectors, rendered in Prometheus text format.
+
+    Collectors are called at scrape time and return (name, kind, help,
+    samples) for values that already live elsewhere, such as cache
+    statistics or file sizes, so they cost nothing between scrapes.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        for collector in collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry shared by the fetch scripts, LiFiDatabase and the server
+REGISTRY = Registry()
+
+API_PAGE_FETCH_SECONDS = REGISTRY.histogram(
+    'lifi_api_page_fetch_seconds', 'LI.FI API request latency per attempt', ['endpoint'])
+API_RESPONSES = REGISTRY.counter(
+    'lifi_api_responses_total', 'LI.FI API responses by status code', ['endpoint', 'status_code'])
+API_RETRIES = REGISTRY.counter(
+    'lifi_api_retries_total', 'LI.FI API requests retried, by the status code that caused the retry', ['status_code'])
+ROWS_FETCHED = REGISTRY.counter(
+    'lifi_rows_fetched_total', 'Transfers received from the API')
+ROWS_FILTERED = REGISTRY.counter(
+    'lifi_rows_filtered_total', 'Transfers that passed the USD, date and token filters')
+ROWS_INSERTED = REGISTRY.counter(
+    'lifi_rows_inserted_total', 'Transfers newly written to the database')
+ROWS_DROPPED = REGISTRY.counter(
+    'lifi_rows_dropped_total', 'Transfers that could not be written, by reason', ['reason'])
+PARTITIONS_THAWED = REGISTRY.counter(
+    'lifi_partitions_thawed_total', 'Frozen monthly partitions made writable again for late transfers')
+SQLITE_COMMIT_SECONDS = REGISTRY.histogram(
+    'lifi_sqlite_commit_seconds', 'SQLite transaction commit latency')
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'lifi_http_request_seconds', 'Web server request latency per endpoint', ['endpoint', 'status'])
+ADMISSION_REJECTED = REGISTRY.counter(
+    'lifi_admission_rejected_total', 'Heavy requests answered 429 because their concurrency slots were full', ['group'])
+CONNECTIONS_REJECTED = REGISTRY.counter(
+    'lifi_connections_rejected_total', 'Connections answered 503 because every worker was busy and the queue was full')
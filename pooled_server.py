@@ -0,0 +1,174 @@
+import os
+import sys
+import signal
+import socket
+import subprocess
+import socketserver
+import threading
+import concurrent.futures
+import logging
+from metrics import CONNECTIONS_REJECTED
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', 16))
+# Accepted connections allowed to wait for a free worker; beyond that they get a 503
+SERVER_QUEUE_SIZE = int(os.getenv('SERVER_QUEUE_SIZE', 64))
+SERVER_BUSY_RETRY_AFTER = 1
+SERVER_REQUEST_TIMEOUT = float(os.getenv('SERVER_REQUEST_TIMEOUT', 30))
+SERVER_KEEPALIVE_TIMEOUT = float(os.getenv('SERVER_KEEPALIVE_TIMEOUT', 5))
+SERVER_PROCESSES = int(os.getenv('SERVER_PROCESSES', 1))
+# Set by serve_processes() in the children: the inherited listening socket
+SERVER_LISTEN_FD = int(os.environ['SERVER_LISTEN_FD']) if os.getenv('SERVER_LISTEN_FD') else None
+
+
+class PooledHTTPServer(socketserver.TCPServer):
+    """TCP server that hands each connection to a bounded pool of worker threads.
+
+    A slow request (an export, a heavy stats query) only occupies one worker,
+    so the remaining workers keep serving /progress polls and health checks.
+    Up to queue_size connections beyond the pool size wait in the executor
+    queue; further ones are answered 503 right away instead of piling up
+    (each waiting connection holds a socket and its request).
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, workers: int = SERVER_WORKERS, listen_fd=None,
+                 queue_size: int = SERVER_QUEUE_SIZE):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='http-worker')
+        self._detached = set()
+        self._detached_lock = threading.Lock()
+        super().__init__(server_address, handler_class, bind_and_activate=listen_fd is None)
+        if listen_fd is not None:
+            # Accept on a socket bound and listening in the parent (see serve_processes)
+            self.socket.close()
+            self.socket = socket.socket(fileno=listen_fd)
+            self.server_address = self.socket.getsockname()
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            self._reject_request(request)
+            return
+        try:
+            self.executor.submit(self._process_request_worker, request, client_address)
+        except RuntimeError:
+            # Executor already shut down
+            self._slots.release()
+            self.shutdown_request(request)
+
+    def _reject_request(self, request):
+        """Answer 503 on the accept thread without reading the request."""
+        CONNECTIONS_REJECTED.inc()
+        try:
+            request.settimeout(1)
+            request.sendall(b"HTTP/1.1 503 Service Unavailable\r\n"
+                            b"Content-Type: text/plain\r\n"
+                            b"Retry-After: " + str(SERVER_BUSY_RETRY_AFTER).encode() + b"\r\n"
+                            b"Content-Length: 12\r\n"
+                            b"Connection: close\r\n\r\n"
+                            b"Server busy\n")
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self._slots.release()
+            with self._detached_lock:
+                detached = request in self._detached
+                self._detached.discard(request)
+            if not detached:
+                self.shutdown_request(request)
+
+    def detach_request(self, request):
+        """Leave a connection open after its handler returns; the caller now owns the socket.
+
+        Used for long-lived streams that are written from another thread, so
+        they do not keep a pool worker busy.
+        """
+        with self._detached_lock:
+            self._detached.add(request)
+
+    def handle_error(self, request, client_address):
+        logger.exception(f"Error handling request from {client_address}")
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False)
+
+
+def serve_processes(server_address, processes: int = SERVER_PROCESSES, argv=None):
+    """Run `processes` copies of this program accepting on one shared listening socket.
+
+    The socket is bound here and passed to each child as SERVER_LISTEN_FD;
+    the kernel spreads incoming connections over the children, so request
+    handling uses as many cores as there are processes. Children that exit
+    are restarted; SIGTERM or SIGINT stops them all.
+    """
+    listener = socket.create_server(server_address, backlog=PooledHTTPServer.request_queue_size)
+    fd = listener.fileno()
+    argv = argv or [sys.executable] + sys.argv
+    env = dict(os.environ, SERVER_LISTEN_FD=str(fd))
+    children = {}
+    stopping = threading.Event()
+
+    def spawn(slot):
+        children[slot] = subprocess.Popen(argv, env=dict(env, SERVER_PROCESS_INDEX=str(slot)), pass_fds=(fd,))
+        logger.info(f"Started server process {slot} (pid {children[slot].pid})")
+
+    def stop(signum, frame):
+        stopping.set()
+        for child in children.values():
+            if child.poll() is None:
+                child.send_signal(signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for slot in range(processes):
+        spawn(slot)
+
+    while not stopping.wait(1):
+        for slot, child in list(children.items()):
+            if child.poll() is not None and not stopping.is_set():
+                logger.warning(f"Server process {slot} (pid {child.pid}) exited with {child.returncode}; restarting")
+                spawn(slot)
+
+    for child in children.values():
+        child.wait()
+    listener.close()
+
+
+class KeepAliveMixin:
+    """HTTP/1.1 keep-alive with separate timeouts for idle and in-progress requests.
+
+    Mix into a BaseHTTPRequestHandler subclass. An idle keep-alive connection
+    gives its worker back after SERVER_KEEPALIVE_TIMEOUT; once a request line
+    has arrived, reading and writing it may take up to SERVER_REQUEST_TIMEOUT.
+    Responses must send a Content-Length header for the connection to stay open.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    timeout = SERVER_REQUEST_TIMEOUT
+    # Headers and body go out in separate writes; with Nagle on, the body of a
+    # keep-alive response waits for the client's delayed ACK (~40ms)
+    disable_nagle_algorithm = True
+
+    def handle_one_request(self):
+        if getattr(self, 'requests_handled', 0):
+            self.connection.settimeout(SERVER_KEEPALIVE_TIMEOUT)
+        super().handle_one_request()
+        self.requests_handled = getattr(self, 'requests_handled', 0) + 1
+
+    def parse_request(self):
+        self.connection.settimeout(SERVER_REQUEST_TIMEOUT)
+        return super().parse_request()
@@ -0,0 +1,254 @@
+import os
+import sys
+import time
+import hmac
+import marshal
+import threading
+import traceback
+import tracemalloc
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# --- CONFIGURATION ---
+ADMIN_TOKEN = os.getenv('LIFI_ADMIN_TOKEN')  # Admin endpoints are disabled when unset
+PROFILE_DEFAULT_SECONDS = float(os.getenv('LIFI_PROFILE_SECONDS', 30))
+PROFILE_MAX_SECONDS = float(os.getenv('LIFI_PROFILE_MAX_SECONDS', 600))
+PROFILE_DEFAULT_INTERVAL_MS = float(os.getenv('LIFI_PROFILE_INTERVAL_MS', 10))
+TRACEMALLOC_FRAMES = int(os.getenv('LIFI_TRACEMALLOC_FRAMES', 10))
+TRACEMALLOC_MAX_SNAPSHOTS = int(os.getenv('LIFI_TRACEMALLOC_MAX_SNAPSHOTS', 5))
+
+# Leaf frames of threads that are parked waiting for work rather than running
+IDLE_LEAVES = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('selectors.py', 'select'),
+    ('socket.py', 'accept'),
+    ('socket.py', 'readinto'),
+    ('socketserver.py', 'serve_forever'),
+    ('queue.py', 'get'),
+    ('thread.py', '_worker'),
+}
+
+FrameKey = Tuple[str, int, str]  # (filename, first line, function) as used by pstats
+
+
+def is_authorized(authorization: Optional[str]) -> bool:
+    """True when the Authorization header carries the configured admin bearer token."""
+    if not ADMIN_TOKEN or not authorization:
+        return False
+    scheme, _, token = authorization.partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(token.strip(), ADMIN_TOKEN)
+
+
+def _frame_label(key: FrameKey) -> str:
+    filename, line, function = key
+    return f"{function} ({os.path.basename(filename)}:{line})"
+
+
+class SamplingProfiler:
+    """Wall-clock sampling profiler over every thread in the process.
+
+    A daemon thread reads all thread stacks every `interval` seconds with
+    sys._current_frames(), so nothing is installed in the profiled threads
+    and the server keeps serving while a profile runs. That also covers
+    threads that were already running when profiling started, such as the
+    fetch job. One profile runs at a time; the last result is kept for
+    download as collapsed stacks or as a pstats file.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stacks: Dict[Tuple[str, Tuple[FrameKey, ...]], List[float]] = {}
+        self._state: Dict[str, Any] = {'status': 'idle'}
+
+    def start(self, seconds: float = PROFILE_DEFAULT_SECONDS,
+              interval_ms: float = PROFILE_DEFAULT_INTERVAL_MS, include_idle: bool = False) -> Dict[str, Any]:
+        if not 0 < seconds <= PROFILE_MAX_SECONDS:
+            raise ValueError(f"seconds must be between 0 and {PROFILE_MAX_SECONDS:g}")
+        if not 1 <= interval_ms <= 1000:
+            raise ValueError("interval_ms must be between 1 and 1000")
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                raise RuntimeError("A profile is already running")
+            self._stop.clear()
+            self._stacks = {}
+            self._state = {
+                'status': 'running',
+                'started_at': datetime.now().isoformat(timespec='seconds'),
+                'seconds': seconds,
+                'interval_ms': interval_ms,
+                'include_idle': include_idle,
+                'samples': 0
+            }
+            self._thread = threading.Thread(target=self._run, args=(seconds, interval_ms / 1000.0, include_idle),
+                                            name='sampling-profiler', daemon=True)
+            self._thread.start()
+        return self.status()
+
+    def stop(self) -> Dict[str, Any]:
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+        return self.status()
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._state)
+
+    def _run(self, seconds: float, interval: float, include_idle: bool):
+        own_ident = threading.get_ident()
+        started = last = time.perf_counter()
+        deadline = started + seconds
+        samples = 0
+        while not self._stop.wait(interval):
+            now = time.perf_counter()
+            weight, last = now - last, now
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            with self._lock:
+                for ident, frame in sys._current_frames().items():
+                    if ident == own_ident:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                        frame = frame.f_back
+                    if not stack:
+                        continue
+                    if not include_idle and (os.path.basename(stack[0][0]), stack[0][2]) in IDLE_LEAVES:
+                        continue
+                    stack.reverse()
+                    key = (names.get(ident, f'thread-{ident}'), tuple(stack))
+                    entry = self._stacks.setdefault(key, [0, 0.0])
+                    entry[0] += 1
+                    entry[1] += weight
+                samples += 1
+                self._state['samples'] = samples
+            if now >= deadline:
+                break
+        with self._lock:
+            self._state['status'] = 'completed'
+            self._state['duration'] = round(time.perf_counter() - started, 3)
+
+    def collapsed(self) -> str:
+        """Folded stacks ("thread;outer;...;inner count" lines) for flame graph tools."""
+        with self._lock:
+            items = list(self._stacks.items())
+        lines = [
+            ';'.join([thread_name.replace(';', '_')] + [_frame_label(key) for key in stack]) + f' {count}'
+            for (thread_name, stack), (count, _) in items
+        ]
+        return '\n'.join(sorted(lines)) + '\n'
+
+    def pstats_data(self) -> bytes:
+        """The samples as a marshalled pstats table, loadable with pstats.Stats(path).
+
+        Times are sampled wall-clock seconds: a function's own time comes
+        from samples where it is the innermost frame, its cumulative time
+        from samples where it appears anywhere. Call counts are sample counts.
+        """
+        stats: Dict[FrameKey, list] = {}
+        with self._lock:
+            items = list(self._stacks.items())
+        for (_, stack), (count, seconds) in items:
+            for function in set(stack):
+                entry = stats.setdefault(function, [0, 0, 0.0, 0.0, {}])
+                entry[0] += count
+                entry[1] += count
+                entry[3] += seconds
+            stats[stack[-1]][2] += seconds
+            seen = set()
+            for caller, callee in zip(stack, stack[1:]):
+                if (caller, callee) in seen:
+                    continue
+                seen.add((caller, callee))
+                callers = stats[callee][4]
+                nc, cc, tt, ct = callers.get(caller, (0, 0, 0.0, 0.0))
+                own = seconds if callee == stack[-1] else 0.0
+                callers[caller] = (nc + count, cc + count, tt + own, ct + seconds)
+        return marshal.dumps({key: tuple(value) for key, value in stats.items()})
+
+
+class MemoryTracer:
+    """tracemalloc snapshots kept in a short ring so any two can be compared.
+
+    Tracing starts with the first snapshot (allocations made before that are
+    not attributed) and costs memory and CPU until stopped.
+    """
+
+    def __init__(self, max_snapshots: int = TRACEMALLOC_MAX_SNAPSHOTS):
+        self._lock = threading.Lock()
+        self._snapshots: deque = deque(maxlen=max_snapshots)
+        self._next_id = 1
+
+    def snapshot(self, limit: int = 25) -> Dict[str, Any]:
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>')
+            ])
+            snapshot_id = self._next_id
+            self._next_id += 1
+            self._snapshots.append((snapshot_id, datetime.now().isoformat(timespec='seconds'), snapshot))
+            current, peak = tracemalloc.get_traced_memory()
+
+        stats = snapshot.statistics('lineno')
+        return {
+            'id': snapshot_id,
+            'traced_current_bytes': current,
+            'traced_peak_bytes': peak,
+            'total_bytes': sum(stat.size for stat in stats),
+            'top': [{'location': str(stat.traceback[0]), 'size_bytes': stat.size, 'count': stat.count}
+                    for stat in stats[:limit]]
+        }
+
+    def diff(self, from_id: Optional[int] = None, to_id: Optional[int] = None, limit: int = 25) -> Dict[str, Any]:
+        """Allocation growth between two snapshots (default: the last two)."""
+        with self._lock:
+            snapshots = {snapshot_id: (taken_at, snapshot) for snapshot_id, taken_at, snapshot in self._snapshots}
+            ids = sorted(snapshots)
+        if from_id is None or to_id is None:
+            if len(ids) < 2:
+                raise ValueError("Take at least two snapshots before diffing")
+            from_id, to_id = ids[-2], ids[-1]
+        if from_id not in snapshots or to_id not in snapshots:
+            raise ValueError(f"Unknown snapshot id; available: {ids}")
+
+        stats = snapshots[to_id][1].compare_to(snapshots[from_id][1], 'lineno')
+        return {
+            'from': {'id': from_id, 'taken_at': snapshots[from_id][0]},
+            'to': {'id': to_id, 'taken_at': snapshots[to_id][0]},
+            'size_diff_bytes': sum(stat.size_diff for stat in stats),
+            'top': [{'location': str(stat.traceback[0]), 'size_diff_bytes': stat.size_diff,
+                     'size_bytes': stat.size, 'count_diff': stat.count_diff}
+                    for stat in stats[:limit]]
+        }
+
+    def snapshots(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{'id': snapshot_id, 'taken_at': taken_at} for snapshot_id, taken_at, _ in self._snapshots]
+
+    def stop(self):
+        with self._lock:
+            self._snapshots.clear()
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+
+def thread_stacks() -> str:
+    """Current stack of every thread, innermost call last, as plain text."""
+    threads = {thread.ident: thread for thread in threading.enumerate()}
+    sections = []
+    for ident, frame in sorted(sys._current_frames().items()):
+        thread = threads.get(ident)
+        name = thread.name if thread else f'thread-{ident}'
+        daemon = ' daemon' if thread is not None and thread.daemon else ''
+        sections.append(f'Thread "{name}" (ident {ident}{daemon}):\n' + ''.join(traceback.format_stack(frame)))
+    return '\n'.join(sections)
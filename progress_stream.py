@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import socket
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+PROGRESS_STREAM_MAX_RATE = float(os.getenv('PROGRESS_STREAM_MAX_RATE', 4))  # events per second
+PROGRESS_STREAM_HEARTBEAT = float(os.getenv('PROGRESS_STREAM_HEARTBEAT', 15))  # seconds
+PROGRESS_STREAM_MAX_CLIENTS = int(os.getenv('PROGRESS_STREAM_MAX_CLIENTS', 500))
+PROGRESS_RATE_WINDOW = float(os.getenv('PROGRESS_RATE_WINDOW', 10))  # seconds
+
+
+class ProgressRates:
+    """Sliding-window pages/s and rows/s for a job, with an ETA estimate.
+
+    Fed with the (current, total) pairs of a progress callback. A page is
+    counted whenever `current` advances; messages that report no count
+    (current=0) leave the rates alone.
+    """
+
+    def __init__(self, window: float = PROGRESS_RATE_WINDOW):
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.pages = 0
+        self.rows = 0
+        self._samples = deque([(time.monotonic(), 0, 0)])
+
+    def update(self, current: int = 0, total: int = 0) -> Dict[str, Any]:
+        now = time.monotonic()
+        if current > self.rows:
+            self.rows = current
+            self.pages += 1
+            self._samples.append((now, self.pages, self.rows))
+            while len(self._samples) > 2 and now - self._samples[0][0] > self.window:
+                self._samples.popleft()
+
+        first, last = self._samples[0], self._samples[-1]
+        elapsed = now - first[0]
+        pages_per_sec = (last[1] - first[1]) / elapsed if elapsed > 0 else 0.0
+        rows_per_sec = (last[2] - first[2]) / elapsed if elapsed > 0 else 0.0
+        eta = (total - self.rows) / rows_per_sec if total > self.rows and rows_per_sec > 0 else None
+        return {
+            'pages': self.pages,
+            'pages_per_sec': round(pages_per_sec, 2),
+            'rows_per_sec': round(rows_per_sec, 1),
+            'eta_seconds': round(eta, 1) if eta is not None else None
+        }
+
+
+def format_event(snapshot: Dict[str, Any], event_id: int = 0) -> bytes:
+    """A Server-Sent Events 'progress' message carrying the snapshot as JSON."""
+    data = json.dumps(snapshot, separators=(',', ':'), default=str)
+    return f"id: {event_id}\nevent: progress\ndata: {data}\n\n".encode()
+
+
+class ProgressStream:
+    """Fans progress snapshots out to Server-Sent Events subscribers.
+
+    Publishing only swaps in the latest snapshot, so the job thread never
+    waits on clients. A single pump thread writes to every subscribed socket
+    at most `max_rate` times per second; updates in between are coalesced
+    into the newest one. Subscribers are plain sockets detached from the HTTP
+    worker pool, so watchers do not hold a worker each. Clients that cannot
+    take a write immediately are dropped (EventSource reconnects by itself).
+    """
+
+    def __init__(self, max_rate: float = PROGRESS_STREAM_MAX_RATE,
+                 heartbeat: float = PROGRESS_STREAM_HEARTBEAT,
+                 max_clients: int = PROGRESS_STREAM_MAX_CLIENTS):
+        self.interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self.heartbeat = heartbeat
+        self.max_clients = max_clients
+        self._cond = threading.Condition()
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._version = 0
+        self._clients: List[socket.socket] = []
+        self._thread: Optional[threading.Thread] = None
+
+    def publish(self, snapshot: Dict[str, Any]):
+        """Make snapshot the latest state; subscribers see it on the next tick."""
+        with self._cond:
+            self._snapshot = snapshot
+            self._version += 1
+            self._cond.notify()
+
+    def full(self) -> bool:
+        with self._cond:
+            return len(self._clients) >= self.max_clients
+
+    def subscribe(self, sock: socket.socket) -> bool:
+        """Take ownership of a connected socket that already received the response headers."""
+        with self._cond:
+            if len(self._clients) >= self.max_clients:
+                return False
+            sock.setblocking(False)
+            self._clients.append(sock)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='progress-stream', daemon=True)
+                self._thread.start()
+            return True
+
+    def client_count(self) -> int:
+        with self._cond:
+            return len(self._clients)
+
+    def _run(self):
+        sent_version = self._version
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._version != sent_version, timeout=self.heartbeat)
+                version, snapshot, clients = self._version, self._snapshot, list(self._clients)
+
+            if version != sent_version and snapshot is not None:
+                payload = format_event(snapshot, version)
+            else:
+                payload = b": keep-alive\n\n"
+            sent_version = version
+
+            dead = [sock for sock in clients if not self._send(sock, payload)]
+            if dead:
+                with self._cond:
+                    self._clients = [sock for sock in self._clients if sock not in dead]
+                for sock in dead:
+                    self._close(sock)
+                logger.info(f"Progress stream dropped {len(dead)} clients, {self.client_count()} remaining")
+
+            # Anything published while we sleep is coalesced into one event
+            time.sleep(self.interval)
+
+    @staticmethod
+    def _send(sock: socket.socket, payload: bytes) -> bool:
+        try:
+            sock.sendall(payload)
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def _close(sock: socket.socket):
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
@@ -0,0 +1,156 @@
+import os
+import sys
+import itertools
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv('QUERY_CACHE_MAX_ENTRIES', 256))
+QUERY_CACHE_MAX_MB = float(os.getenv('QUERY_CACHE_MAX_MB', 32))
+# Items of a container measured by _size_of before extrapolating to the rest
+SIZE_SAMPLE = 32
+
+
+def normalize_query(name: str, **params) -> Tuple:
+    """Cache key for a query: its name plus the non-empty parameters, order-independent."""
+    return (name,) + tuple(sorted((k, v) for k, v in params.items() if v is not None and v != ''))
+
+
+class _InFlight:
+    """A computation other threads can wait on instead of repeating it."""
+
+    def __init__(self, generation: int):
+        self.generation = generation
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class QueryCache:
+    """In-process LRU cache for query results, invalidated by a data generation number.
+
+    Every entry remembers the generation it was computed at; a lookup with a
+    newer generation treats it as stale, as does a lookup with a max_age older
+    than the entry (for results that also depend on the clock). Entries are evicted least recently
+    used first once either the entry count or the estimated total size is
+    exceeded. Concurrent misses for the same key are coalesced so only one
+    caller computes while the others wait for its result.
+
+    Cached values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries: int = QUERY_CACHE_MAX_ENTRIES, max_mb: float = QUERY_CACHE_MAX_MB):
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._entries: "OrderedDict[Hashable, Tuple[int, Any, int, float]]" = OrderedDict()
+        self._in_flight: Dict[Hashable, _InFlight] = {}
+        self._lock = threading.Lock()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key: Hashable, generation: int, compute: Callable[[], Any],
+                       max_age: Optional[float] = None) -> Any:
+        """Return the cached value for key at this generation (and at most max_age seconds old),
+        computing it at most once."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == generation and (max_age is None or time.monotonic() - entry[3] <= max_age):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self._discard(key)
+
+            flight = self._in_flight.get(key)
+            if flight is not None and flight.generation == generation:
+                # A computation already under way is as fresh as any max_age asks for
+                self.coalesced += 1
+                leader = False
+            else:
+                flight = self._in_flight[key] = _InFlight(generation)
+                self.misses += 1
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            size = self._size_of(flight.value) if flight.error is None else None
+            with self._lock:
+                if self._in_flight.get(key) is flight:
+                    del self._in_flight[key]
+                if size is not None and size <= self.max_bytes:
+                    self._store(key, generation, flight.value, size)
+            flight.done.set()
+        return flight.value
+
+    @classmethod
+    def _size_of(cls, value: Any, depth: int = 0) -> int:
+        """Rough memory footprint of a value.
+
+        sys.getsizeof of the value plus its contents; large containers are
+        extrapolated from their first SIZE_SAMPLE items, so the cost does
+        not grow with the result size.
+        """
+        size = sys.getsizeof(value)
+        if depth >= 4:
+            return size
+        if isinstance(value, dict):
+            items = list(itertools.islice(value.items(), SIZE_SAMPLE))
+            sampled = sum(cls._size_of(k, depth + 1) + cls._size_of(v, depth + 1) for k, v in items)
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            items = list(itertools.islice(value, SIZE_SAMPLE))
+            sampled = sum(cls._size_of(item, depth + 1) for item in items)
+        else:
+            return size
+        return size + (sampled * len(value) // len(items) if items else 0)
+
+    def _store(self, key: Hashable, generation: int, value: Any, size: int):
+        existing = self._entries.get(key)
+        if existing is not None and existing[0] > generation:
+            # A slower computation from an older generation finished last; keep the newer result
+            return
+        self._discard(key)
+        self._entries[key] = (generation, value, size, time.monotonic())
+        self._size += size
+        while self._entries and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._discard(oldest)
+            self.evictions += 1
+
+    def _discard(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[2]
+
+    def clear(self):
+        """Drop every cached entry."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'entries': len(self._entries),
+                'size_bytes': self._size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'hit_rate': round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,126 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+# Comma-separated "token:max_age_days[:min_usd]" rules. '*' covers every token without a
+# rule of its own and an empty field disables that check, e.g. "*:365:1000,BTC:1825"
+# keeps a year of transfers of at least $1,000 plus five years of BTC.
+RETENTION_RULES = os.getenv('LIFI_RETENTION_RULES', '')
+RETENTION_INTERVAL = float(os.getenv('LIFI_RETENTION_INTERVAL', 0))  # seconds between scheduled runs; 0 = on request only
+RETENTION_BATCH_SIZE = int(os.getenv('LIFI_RETENTION_BATCH_SIZE', 500))  # transfers deleted per transaction
+RETENTION_BATCH_PAUSE = float(os.getenv('LIFI_RETENTION_BATCH_PAUSE', 0.05))  # seconds between delete batches
+RETENTION_VACUUM_PAGES = int(os.getenv('LIFI_RETENTION_VACUUM_PAGES', 1000))  # pages freed per incremental vacuum step
+RETENTION_LEASE = 'retention'
+
+
+def parse_retention_rules(text: str) -> List[Dict[str, Any]]:
+    """Parse "token:max_age_days[:min_usd],..." into rule dicts for LiFiDatabase.prune_transactions."""
+    rules = []
+    for item in text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        parts = [part.strip() for part in item.split(':')]
+        if len(parts) > 3 or not parts[0]:
+            raise ValueError(f"Bad retention rule '{item}': expected token:max_age_days[:min_usd]")
+        parts += [''] * (3 - len(parts))
+        token, max_age_days, min_usd = parts
+        if any(rule['token'] == token for rule in rules):
+            raise ValueError(f"Duplicate retention rule for {token}")
+        try:
+            rule = {
+                'token': token,
+                'max_age_days': int(max_age_days) if max_age_days else None,
+                'min_usd': float(min_usd) if min_usd else None
+            }
+        except ValueError:
+            raise ValueError(f"Bad retention rule '{item}': max_age_days and min_usd must be numbers")
+        if (rule['max_age_days'] or 0) < 0 or (rule['min_usd'] or 0) < 0:
+            raise ValueError(f"Bad retention rule '{item}': values cannot be negative")
+        rules.append(rule)
+    return rules
+
+
+def describe_rule(rule: Dict[str, Any]) -> str:
+    target = 'Other tokens' if rule['token'] == '*' else rule['token']
+    limits = []
+    if rule['max_age_days'] is not None:
+        limits.append(f"older than {rule['max_age_days']} days")
+    if rule['min_usd'] is not None:
+        limits.append(f"under ${rule['min_usd']:,.0f}")
+    return f"{target}: delete transfers {' or '.join(limits)}" if limits else f"{target}: keep everything"
+
+
+@contextmanager
+def _partition_access(ingestion, dry_run: bool) -> Iterator[Optional[Any]]:
+    """Yield the ingestion LeaseGuard to check while partition files are touched, False if they must be left alone.
+
+    Partitions are only frozen, thawed, dropped or rewritten under the
+    ingestion lease, so a run never changes a file a fetch is writing to
+    (or freezes one it is about to write). Without a SharedJobState to
+    coordinate with, or on a dry run, there is nothing to hold (None).
+    """
+    if ingestion is None or dry_run:
+        yield None
+        return
+    if not ingestion.acquire_lease():
+        yield False
+        return
+    with ingestion.keep_lease() as guard:
+        yield guard
+
+
+def run_retention(db, rules: List[Dict[str, Any]], dry_run: bool = False, full_vacuum: bool = False,
+                  progress_callback: Optional[Callable] = None, lease=None, ingestion=None) -> Dict[str, Any]:
+    """Prune by the rules, then compact the database files (not on a dry run).
+
+    With a LeaseGuard of the retention lease, every delete batch and
+    compaction step first checks that the lease is still held. With the
+    ingestion SharedJobState, partition files are only pruned and compacted
+    if its lease is free, and it is held until the run ends; while a fetch
+    runs only the main database is, and the partitions wait for a later run.
+    """
+    progress = progress_callback or (lambda message, current=0, total=0: None)
+    started = time.time()
+    with _partition_access(ingestion, dry_run) as ingestion_lease:
+        if ingestion_lease is False:
+            logger.info("Retention leaves the partitions alone: a fetch holds the ingestion lease")
+        guards = [guard for guard in (lease, ingestion_lease) if guard]
+
+        def before_write():
+            for guard in guards:
+                guard.check()
+
+        partitions = ingestion_lease is not False
+        result = db.prune_transactions(rules, batch_size=RETENTION_BATCH_SIZE, pause=RETENTION_BATCH_PAUSE,
+                                       dry_run=dry_run, progress_callback=progress, before_write=before_write,
+                                       partitions=partitions)
+        if not dry_run:
+            progress(f"Pruned {result['deleted']:,} transfers; compacting...", result['deleted'], result['deleted'])
+            result['files'] = db.compact(vacuum_pages=RETENTION_VACUUM_PAGES, pause=RETENTION_BATCH_PAUSE,
+                                         full=full_vacuum, before_write=before_write, partitions=partitions)
+            result['bytes_freed'] = sum(f['bytes_before'] - f['bytes_after'] for f in result['files'])
+    result['seconds'] = round(time.time() - started, 2)
+    return result
+
+
+def schedule_retention(start_job: Callable[[], bool], interval: float = RETENTION_INTERVAL) -> threading.Thread:
+    """Call start_job every `interval` seconds in a daemon thread (it returns False while a run is going)."""
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                if not start_job():
+                    logger.info("Scheduled retention skipped: a retention run is already going")
+            except Exception as e:
+                logger.error(f"Could not start scheduled retention: {e}")
+
+    thread = threading.Thread(target=loop, name='retention-schedule', daemon=True)
+    thread.start()
+    return thread
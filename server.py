@@ -1,80 +1,582 @@
+import time
+# Startup phases are timed from here; see startup.report() below
+_boot_started = time.perf_counter()
+
 import os
+import html
 import http.server
-import socketserver
 import json
 import threading
 import logging
-import time
+import base64
+import binascii
+import uuid
 from urllib.parse import urlparse, parse_qs
 from http import HTTPStatus
 from datetime import datetime
-from get_large_transactions import fetch_and_process_data
-from get_large_transactions_db import fetch_and_process_data_db
-from database import LiFiDatabase
-
-# Global variables for tracking progress
+from database import get_database, AGGREGATE_MAX_ROWS
+from query_cache import QueryCache, normalize_query
+from pooled_server import PooledHTTPServer, KeepAliveMixin, SERVER_WORKERS, SERVER_PROCESSES, SERVER_LISTEN_FD, serve_processes
+from progress_stream import ProgressStream, ProgressRates, format_event
+from file_response import FileResponseMixin
+from metrics import REGISTRY, HTTP_REQUEST_SECONDS, StartupTimer
+from export_jobs import ExportManager, EXPORT_DOWNLOAD_WAIT
+from profiling import ADMIN_TOKEN, PROFILE_DEFAULT_SECONDS, PROFILE_DEFAULT_INTERVAL_MS, SamplingProfiler, MemoryTracer, is_authorized, thread_stacks
+from job_coordination import SharedJobState, process_owner
+from tracing import start_trace, stop_trace, active_trace, trace_path
+from compression import compress_body, is_compressible
+from admission import LIMITERS, ADMISSION_RETRY_AFTER, limiter_for
+from retention import RETENTION_RULES, RETENTION_INTERVAL, RETENTION_BATCH_SIZE, RETENTION_LEASE, parse_retention_rules, describe_rule, run_retention, schedule_retention
+
+startup = StartupTimer(_boot_started)
+startup.mark('imports')
+
+# Fetch job thread of this process, if it is the ingestion leader
 current_process = None
-process_status = "idle"
-process_progress = {"current": 0, "total": 0, "message": "Ready"}
-process_start_time = None
+
+# Job status and progress shared by all server processes; holding its lease makes
+# a process the only one allowed to write to the database
+shared_jobs = SharedJobState()
+
+# Retention runs under a lease of its own: it deletes in small batches next to a running fetch
+retention_jobs = SharedJobState(name=RETENTION_LEASE)
+retention_rules = parse_retention_rules(RETENTION_RULES)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Database instance
-db = LiFiDatabase()
-
-def fetch_with_progress_tracking(config_params=None, use_database=True):
-    """Wrapper function to track progress of the fetch process."""
-    global process_status, process_progress, process_start_time
+# Database instance, shared with the fetch jobs and exports
+db = get_database()
+startup.mark('database')
+
+# Dashboard query results, reused until the writer bumps the data generation
+query_cache = QueryCache()
+
+# Queries whose results also move with the clock (get_statistics counts the last 24 hours),
+# with the seconds a cached result may be served for
+CLOCK_DEPENDENT_QUERIES = {'get_statistics': int(os.getenv('LIFI_STATISTICS_CACHE_SECONDS', 60))}
+
+# Progress pushed to /progress/stream watchers, with throughput of the running job
+progress_stream = ProgressStream()
+progress_rates = ProgressRates()
+
+# Live progress line for HTML pages, fed by /progress/stream instead of polling
+PROGRESS_WIDGET = '''
+<p id="live-progress" style="padding: 10px; background: #f8f9fa; border-radius: 5px;">⏳ Waiting for progress...</p>
+<script>
+    var progressSource = new EventSource('/progress/stream');
+    progressSource.addEventListener('progress', function (event) {
+        var state = JSON.parse(event.data);
+        var p = state.progress;
+        var eta = p.eta_seconds == null ? 'n/a' : Math.round(p.eta_seconds) + 's';
+        document.getElementById('live-progress').textContent =
+            state.status.toUpperCase() + ' - ' + p.message +
+            ' | ' + (p.pages_per_sec || 0) + ' pages/s, ' + (p.rows_per_sec || 0) + ' rows/s, ETA ' + eta;
+    });
+</script>
+'''
+
+def cached_query(name, **params):
+    """Run a read-only LiFiDatabase query through the generation-aware result cache."""
+    return query_cache.get_or_compute(
+        normalize_query(name, **params),
+        db.get_generation(),
+        lambda: getattr(db, name)(**params),
+        max_age=CLOCK_DEPENDENT_QUERIES.get(name)
+    )
+
+def fetch_with_progress_tracking(config_params=None, use_database=True, refresh_only=False, repair_gaps=False):
+    """Run a fetch while holding the ingestion lease, recording progress in the shared job state.
+
+    The run is traced; its timeline is served as Chrome trace JSON from /jobs/<job_id>/trace.
+    """
+    job_id = uuid.uuid4().hex[:12]
+    progress = {"current": 0, "total": 0, "message": "Starting transaction fetch...", "job_id": job_id}
+    start_time = time.time()
+    job_kind = 'repair' if repair_gaps else 'refresh' if refresh_only else 'fetch' if use_database else 'excel-fetch'
+    tracer = start_trace(job_id, job_kind)
+    tracer_started = time.perf_counter()
+
+    def publish(status, force=False):
+        shared_jobs.update(progress, status=status, force=force)
+        progress_stream.publish(job_state_snapshot(status or "running", progress, start_time, process_owner()))
 
     def progress_callback(message, current=0, total=0):
-        global process_progress
-        process_progress = {"current": current, "total": total, "message": message}
+        nonlocal progress
+        progress = {"current": current, "total": total, "message": message, "job_id": job_id}
+        progress.update(progress_rates.update(current, total))
+        publish(None)
 
-    try:
-        process_status = "running"
-        process_start_time = time.time()
-        process_progress = {"current": 0, "total": 0, "message": "Starting transaction fetch..."}
-        logger.info("Starting transaction fetch process")
-
-        if use_database:
-            # Use the new database-enabled fetch function
-            count = fetch_and_process_data_db(progress_callback)
-            process_progress["message"] = f"Database fetch completed! Saved {count} transactions."
-        else:
-            # Use the legacy Excel-only function
-            fetch_and_process_data()
-            process_progress["message"] = "Excel-only fetch completed successfully"
+    status = "error"
+    with shared_jobs.keep_lease() as lease:
+        try:
+            progress_rates.reset()
+            # Another process may have written since this one last led ingestion
+            db.reset_leaderboard_floors()
+            publish(None, force=True)
+            logger.info("Starting transaction fetch process")
+
+            # Imported here: the fetchers pull in requests (and pandas for the Excel-only path)
+            from get_large_transactions_db import fetch_and_process_data_db, refresh_pending_transactions, repair_coverage_gaps
+
+            if repair_gaps:
+                # Only fetch the time ranges missing from the coverage map
+                count = repair_coverage_gaps(progress_callback, lease=lease)
+                progress["message"] = f"Coverage repair completed! Saved {count} transactions."
+            elif refresh_only:
+                # Only re-check transfers whose status is not final yet
+                count = refresh_pending_transactions(progress_callback, lease=lease)
+                progress["message"] = f"Status refresh completed! Updated {count} transactions."
+            elif use_database:
+                # Use the new database-enabled fetch function
+                count = fetch_and_process_data_db(progress_callback, lease=lease)
+                progress["message"] = f"Database fetch completed! Saved {count} transactions."
+            else:
+                # Use the legacy Excel-only function
+                from get_large_transactions import fetch_and_process_data
+                fetch_and_process_data()
+                progress["message"] = "Excel-only fetch completed successfully"
+
+            status = "completed"
+            logger.info("Transaction fetch completed successfully")
 
-        process_status = "completed"
-        logger.info("Transaction fetch completed successfully")
+        except Exception as e:
+            progress["message"] = f"Error: {str(e)}"
+            logger.error(f"Transaction fetch failed: {str(e)}")
+        finally:
+            # Saved before the final status goes out, so a finished job's trace is always on disk
+            tracer.record(job_kind, 'job', tracer_started, time.perf_counter(), {'status': status})
+            tracer.metadata.update(status=status, message=progress["message"])
+            stop_trace(tracer)
+            publish(status)
+
+def start_background_job(**kwargs):
+    """Start fetch_with_progress_tracking in a thread unless a job is running in any server process."""
+    global current_process
+
+    if not shared_jobs.start("Starting transaction fetch..."):
+        return False
+    current_process = threading.Thread(target=fetch_with_progress_tracking, kwargs=kwargs)
+    current_process.daemon = True
+    current_process.start()
+    return True
+
+def run_retention_job(dry_run=False, full_vacuum=False):
+    """Prune and compact per the retention rules while holding the retention lease."""
+    progress = {"current": 0, "total": 0, "message": "Applying retention rules..."}
+
+    def progress_callback(message, current=0, total=0):
+        progress.update(message=message, current=current, total=total)
+        retention_jobs.update(progress)
 
+    status = "error"
+    with retention_jobs.keep_lease() as lease:
+        try:
+            result = run_retention(db, retention_rules, dry_run=dry_run, full_vacuum=full_vacuum,
+                                   progress_callback=progress_callback, lease=lease, ingestion=shared_jobs)
+            progress["result"] = result
+            if dry_run:
+                progress["message"] = f"Preview: {result['deleted']:,} transfers would be deleted"
+            else:
+                progress["message"] = (f"Deleted {result['deleted']:,} transfers, dropped "
+                                       f"{len(result['dropped_partitions'])} partitions, freed "
+                                       f"{result['bytes_freed'] / (1024*1024):.1f} MB in {result['seconds']}s")
+                if result['partitions_skipped']:
+                    progress["message"] += "; partitions were skipped while a fetch was running"
+            status = "completed"
+            logger.info(f"Retention run finished: {progress['message']}")
+        except Exception as e:
+            progress["message"] = f"Error: {str(e)}"
+            logger.error(f"Retention run failed: {str(e)}")
+        finally:
+            retention_jobs.update(progress, status=status)
+
+def start_retention_job(dry_run=False, full_vacuum=False):
+    """Start run_retention_job in a thread unless a retention run is going in any server process."""
+    if not retention_rules:
+        return False
+    if not retention_jobs.start("Applying retention rules..."):
+        return False
+    thread = threading.Thread(target=run_retention_job, kwargs={'dry_run': dry_run, 'full_vacuum': full_vacuum})
+    thread.daemon = True
+    thread.start()
+    return True
+
+API_MAX_PAGE_SIZE = 1000
+OUTPUT_FILE = "txns_2023_to_2025.xlsx"
+EXPORT_FILES = {
+    'excel': 'lifi_transactions.xlsx',
+    'json': 'lifi_transactions.json',
+    'csv': 'lifi_transactions.csv'
+}
+
+def api_json(data):
+    """Compact JSON body for /api/v1/ responses."""
+    return json.dumps(data, separators=(',', ':'), default=str)
+
+def encode_cursor(after):
+    """Opaque continuation token for a (sending_timestamp, transaction_id) keyset position."""
+    return base64.urlsafe_b64encode(api_json(list(after)).encode()).decode().rstrip('=')
+
+def decode_cursor(token):
+    """Keyset position from encode_cursor's token; raises ValueError for anything it could not have produced."""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (binascii.Error, ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if (not isinstance(position, list) or len(position) != 2
+            or not isinstance(position[0], (str, type(None))) or not isinstance(position[1], str)):
+        raise ValueError("Invalid cursor")
+    return (position[0], position[1])
+
+def parse_transaction_filters(query_params):
+    """Typed get_transactions filters from query parameters; raises ValueError on bad input."""
+    def param(name):
+        value = query_params.get(name, [None])[0]
+        return value.strip() if value and value.strip() else None
+
+    def typed(name, convert, label):
+        value = param(name)
+        if value is None:
+            return None
+        try:
+            return convert(value)
+        except ValueError:
+            raise ValueError(f"{name} must be {label}")
+
+    def date(value):
+        datetime.fromisoformat(value)
+        return value
+
+    return {
+        'token_symbol': param('token'),
+        'min_usd': typed('min_usd', float, 'a number'),
+        'max_usd': typed('max_usd', float, 'a number'),
+        'start_date': typed('start_date', date, 'an ISO date'),
+        'end_date': typed('end_date', date, 'an ISO date'),
+        'chain_id': typed('chain_id', int, 'an integer')
+    }
+
+def parse_aggregate(query_params):
+    """get_aggregate arguments from /api/v1/aggregate parameters; raises ValueError on bad input."""
+    def names(name, default):
+        value = query_params.get(name, [default])[0] or ''
+        return tuple(part.strip() for part in value.split(',') if part.strip())
+
+    # from/to are the aggregate spellings of start_date/end_date
+    dates = dict(query_params)
+    for alias, name in (('from', 'start_date'), ('to', 'end_date')):
+        if alias in query_params:
+            dates[name] = query_params[alias]
+    filters = parse_transaction_filters(dates)
+    tool = query_params.get('tool', [None])[0]
+    status = query_params.get('status', [None])[0]
+    return {
+        'group': names('group', ''),
+        'bucket': query_params.get('bucket', [None])[0] or None,
+        'metrics': names('metric', 'count,sum_usd'),
+        'token_symbol': filters['token_symbol'],
+        'chain_id': filters['chain_id'],
+        'tool': tool or None,
+        'status': status or None,
+        'min_usd': filters['min_usd'],
+        'start_date': filters['start_date'],
+        'end_date': filters['end_date'],
+        'limit': parse_limit(query_params, 1000, AGGREGATE_MAX_ROWS),
+        'explain': query_params.get('explain', ['0'])[0].lower() in ('1', 'true', 'yes')
+    }
+
+def parse_coverage(query_params):
+    """get_coverage arguments: the fetch job's date range and filters unless overridden; token=ALL is every token."""
+    from get_large_transactions_db import START_DATE, END_DATE, USD_THRESHOLD, token_filter
+    filters = parse_transaction_filters(query_params)
+    start = datetime.fromisoformat(filters['start_date']) if filters['start_date'] else START_DATE
+    end = datetime.fromisoformat(filters['end_date']) if filters['end_date'] else END_DATE
+    if start > end:
+        raise ValueError("start_date must not be after end_date")
+    token = filters['token_symbol']
+    return {
+        'start_ts': start.timestamp(),
+        'end_ts': end.timestamp(),
+        'token_symbol': token_filter() if token is None else (None if token.upper() == 'ALL' else token),
+        'min_usd': USD_THRESHOLD if filters['min_usd'] is None else filters['min_usd']
+    }
+
+def parse_limit(query_params, default, maximum):
+    value = query_params.get('limit', [None])[0]
+    try:
+        limit = int(value) if value else default
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if not 1 <= limit <= maximum:
+        raise ValueError(f"limit must be between 1 and {maximum}")
+    return limit
+
+# Routes reported individually in HTTP metrics; anything else is counted as "other"
+METRIC_ENDPOINTS = frozenset([
+    '/', '/fetch', '/rebuild', '/refresh', '/progress', '/progress/stream', '/clear', '/status', '/download',
+    '/metrics', '/data/stats', '/data/view', '/data/export', '/data/export/job', '/data/whales',
+    '/api/v1/transactions', '/api/v1/stats', '/api/v1/whales', '/api/v1/aggregate', '/api/v1/jobs',
+    '/api/v1/exports', '/api/v1/retention', '/retention', '/api/v1/coverage', '/coverage'
+])
+
+def metric_endpoint(path):
+    path = path.rstrip('/') or '/'
+    if path.startswith('/jobs/') and path.endswith('/trace'):
+        return '/jobs/{id}/trace'
+    return path if path in METRIC_ENDPOINTS else 'other'
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def collect_server_metrics():
+    """Scrape-time metrics read from the query cache, the database files and the progress stream."""
+    cache = query_cache.stats()
+    yield ('lifi_query_cache_lookups_total', 'counter', 'Dashboard query cache lookups by outcome', [
+        ({'result': 'hit'}, cache['hits']),
+        ({'result': 'miss'}, cache['misses']),
+        ({'result': 'coalesced'}, cache['coalesced'])
+    ])
+    yield ('lifi_query_cache_hit_ratio', 'gauge', 'Share of lookups answered without running the query',
+           [({}, cache['hit_rate'])])
+    yield ('lifi_query_cache_evictions_total', 'counter', 'Entries evicted from the query cache',
+           [({}, cache['evictions'])])
+    yield ('lifi_query_cache_bytes', 'gauge', 'Estimated size of cached query results',
+           [({}, cache['size_bytes'])])
+
+    partitions_size = 0
+    if os.path.isdir(db.partition_dir):
+        partitions_size = sum(entry.stat().st_size for entry in os.scandir(db.partition_dir) if entry.is_file())
+    yield ('lifi_db_file_bytes', 'gauge', 'Size of the SQLite database files', [
+        ({'file': 'main'}, file_size(db.db_path)),
+        ({'file': 'wal'}, file_size(db.db_path + '-wal')),
+        ({'file': 'partitions'}, partitions_size)
+    ])
+    yield ('lifi_progress_stream_clients', 'gauge', 'Connected /progress/stream watchers',
+           [({}, progress_stream.client_count())])
+    yield ('lifi_admission_in_flight', 'gauge', 'Heavy requests running, per concurrency group',
+           [({'group': name}, limiter.in_flight) for name, limiter in LIMITERS.items()])
+    yield ('lifi_admission_waiting', 'gauge', 'Heavy requests queued for a slot, per concurrency group',
+           [({'group': name}, limiter.waiting) for name, limiter in LIMITERS.items()])
+    yield ('lifi_startup_seconds', 'gauge', 'Time spent in each server startup phase',
+           [({'phase': phase}, seconds) for phase, seconds in startup.phases])
+
+REGISTRY.add_collector(collect_server_metrics)
+
+# Exports run in the background; results are cached per filters and data generation
+export_jobs = ExportManager(db)
+
+# On-demand diagnostics behind /admin/ (enabled by LIFI_ADMIN_TOKEN)
+profiler = SamplingProfiler()
+memory_tracer = MemoryTracer()
+startup.mark('services')
+
+def job_state_snapshot(status, progress, start_time, owner=None):
+    return {
+        "status": status,
+        "progress": dict(progress),
+        "start_time": start_time,
+        "elapsed_time": time.time() - start_time if start_time else 0,
+        "owner": owner,
+        "timestamp": time.time()
+    }
+
+def job_state():
+    """Current background job status, whichever server process runs the job."""
+    state = shared_jobs.read()
+    return job_state_snapshot(state["status"], state["progress"], state["start_time"], state["owner"])
+
+def follow_shared_job_state(state):
+    """Relay job progress recorded by other processes to this process's stream watchers."""
+    if current_process is None or not current_process.is_alive():
+        progress_stream.publish(job_state_snapshot(state["status"], state["progress"],
+                                                   state["start_time"], state["owner"]))
+
+def export_job_page(job):
+    """HTML status page for an export job; it reloads itself until the job has finished."""
+    info = job.to_dict()
+    progress = info['progress']
+    if job.status == 'completed':
+        heading = f"✅ {job.format.upper()} Export Complete"
+        detail = (f'<p>{job.size:,} bytes, data generation {job.generation}.</p>'
+                  f'<p><a href="{info["url"]}">⬇️ Download</a></p>')
+        refresh = ''
+    elif job.status == 'failed':
+        heading = f"❌ {job.format.upper()} Export Failed"
+        detail = f'<p>{html.escape(str(job.error))}</p>'
+        refresh = ''
+    elif job.status == 'expired':
+        heading = f"⌛ {job.format.upper()} Export Expired"
+        detail = '<p>The result was removed from the export cache. Start the export again.</p>'
+        refresh = ''
+    else:
+        heading = f"⏳ {job.format.upper()} Export {job.status.capitalize()}"
+        detail = (f'<p>{html.escape(str(progress["message"]))} ({progress["current"]:,}/{progress["total"]:,})</p>'
+                  f'<p>This page reloads until the file is ready: <a href="/data/export/job?id={job.id}">job status</a></p>')
+        refresh = f'<meta http-equiv="refresh" content="2;url=/data/export/job?id={job.id}">'
+
+    return f'''
+    <html>
+    <head>
+        <title>Export Job {job.id} - LiFi Fetcher</title>
+        {refresh}
+    </head>
+    <body style="font-family: Arial, sans-serif; margin: 40px;">
+        <h2>{heading}</h2>
+        <p>Job <code>{job.id}</code> · filters: {html.escape(str(job.filters or 'none'))}</p>
+        {detail}
+        <p><a href="/data/export">Back to Export</a> | <a href="/">🏠 Home</a></p>
+    </body>
+    </html>
+    '''
+
+def handle_api_v1(path, query_params):
+    """Route an /api/v1/ request; returns (HTTPStatus, compact JSON body)."""
+    endpoint = path[len('/api/v1/'):].rstrip('/')
+    try:
+        if endpoint == 'transactions':
+            filters = parse_transaction_filters(query_params)
+            cursor = query_params.get('cursor', [None])[0]
+            columns, rows, next_after = cached_query(
+                'get_transaction_page',
+                limit=parse_limit(query_params, 100, API_MAX_PAGE_SIZE),
+                after=decode_cursor(cursor) if cursor else None,
+                **filters
+            )
+            return HTTPStatus.OK, api_json({
+                'columns': columns,
+                'rows': rows,
+                'next': encode_cursor(next_after) if next_after else None
+            })
+
+        if endpoint == 'stats':
+            group_by = query_params.get('group_by', [None])[0]
+            if group_by is None:
+                return HTTPStatus.OK, api_json(cached_query('get_statistics'))
+            filters = parse_transaction_filters(query_params)
+            return HTTPStatus.OK, api_json(cached_query(
+                'get_sketch_statistics',
+                group_by=group_by,
+                token_symbol=filters['token_symbol'],
+                chain_id=filters['chain_id'],
+                start_date=filters['start_date'],
+                end_date=filters['end_date']
+            ))
+
+        if endpoint == 'whales':
+            filters = parse_transaction_filters(query_params)
+            window = query_params.get('window', ['all'])[0]
+            bucket = query_params.get('bucket', [None])[0]
+            if window in ('month', 'day') and not bucket:
+                bucket = datetime.now().strftime('%Y-%m' if window == 'month' else '%Y-%m-%d')
+            return HTTPStatus.OK, api_json(cached_query(
+                'get_leaderboard',
+                token_symbol=filters['token_symbol'],
+                chain_id=filters['chain_id'],
+                window=window,
+                bucket=bucket,
+                limit=parse_limit(query_params, 25, API_MAX_PAGE_SIZE)
+            ))
+
+        if endpoint == 'aggregate':
+            return HTTPStatus.OK, api_json(cached_query('get_aggregate', **parse_aggregate(query_params)))
+
+        if endpoint == 'jobs':
+            return HTTPStatus.OK, api_json(job_state())
+
+        if endpoint == 'coverage':
+            return HTTPStatus.OK, api_json(db.get_coverage(**parse_coverage(query_params)))
+
+        if endpoint == 'retention':
+            return HTTPStatus.OK, api_json({'rules': retention_rules, 'interval': RETENTION_INTERVAL,
+                                            **retention_jobs.read()})
+
+        if endpoint == 'exports':
+            export_format = query_params.get('format', [None])[0]
+            if export_format is None:
+                return HTTPStatus.OK, api_json(export_jobs.jobs())
+            job = export_jobs.submit(export_format, parse_transaction_filters(query_params))
+            return (HTTPStatus.OK if job.status == 'completed' else HTTPStatus.ACCEPTED), api_json(job.to_dict())
+
+        if endpoint.startswith('exports/'):
+            job = export_jobs.get(endpoint[len('exports/'):])
+            if job is None:
+                return HTTPStatus.NOT_FOUND, api_json({'error': 'Unknown export job'})
+            return HTTPStatus.OK, api_json(job.to_dict())
+
+        return HTTPStatus.NOT_FOUND, api_json({'error': f"Unknown endpoint: {path}"})
+
+    except ValueError as e:
+        return HTTPStatus.BAD_REQUEST, api_json({'error': str(e)})
     except Exception as e:
-        process_status = "error"
-        process_progress["message"] = f"Error: {str(e)}"
-        logger.error(f"Transaction fetch failed: {str(e)}")
-    finally:
-        if process_status != "error":
-            process_status = "completed"
-
-class Handler(http.server.SimpleHTTPRequestHandler):
-    def do_GET(self):
-        global current_process, process_status, process_progress, process_start_time
+        logger.error(f"API error on {path}: {e}")
+        return HTTPStatus.INTERNAL_SERVER_ERROR, api_json({'error': str(e)})
 
+class Handler(KeepAliveMixin, FileResponseMixin, http.server.SimpleHTTPRequestHandler):
+    def do_GET(self):
+        start = time.perf_counter()
+        self.response_status = 0
+        limiter = limiter_for(urlparse(self.path).path)
+        self.admitted = None
+        try:
+            if limiter is None:
+                self.route_GET()
+            elif limiter.acquire():
+                self.admitted = limiter
+                try:
+                    self.route_GET()
+                finally:
+                    if self.admitted is not None:
+                        self.admitted.release()
+            else:
+                self.send_too_busy(limiter.name)
+        finally:
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start,
+                                         endpoint=metric_endpoint(urlparse(self.path).path),
+                                         status=self.response_status)
+
+    def switch_limiter(self, group):
+        """Trade the request's admission slot for one of LIMITERS[group]; False (holding none) if none frees up."""
+        if self.admitted is not None:
+            self.admitted.release()
+            self.admitted = None
+        limiter = LIMITERS[group]
+        if not limiter.acquire():
+            return False
+        self.admitted = limiter
+        return True
+
+    def send_response(self, code, message=None):
+        self.response_status = int(code)
+        super().send_response(code, message)
+
+    def route_GET(self):
         parsed_path = urlparse(self.path)
         path = parsed_path.path
         query_params = parse_qs(parsed_path.query)
 
-        self.send_response(HTTPStatus.OK)
+        if path == '/progress/stream':
+            self.stream_progress()
+            return
+        if path.startswith('/admin/'):
+            self.route_admin(path, query_params)
+            return
+        if path.startswith('/jobs/') and path.endswith('/trace'):
+            self.send_trace(path[len('/jobs/'):-len('/trace')])
+            return
 
         # Set content type based on endpoint
-        if path == '/progress':
-            self.send_header('Content-type', 'application/json')
+        if path == '/progress' or path.startswith('/api/'):
+            content_type = 'application/json'
+        elif path == '/metrics':
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
         else:
-            self.send_header('Content-type', 'text/html')
-        self.end_headers()
+            content_type = 'text/html'
+        status_code = HTTPStatus.OK
 
         if path == '/':
             msg = '''
@@ -101,6 +603,12 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                 <div class="endpoint">
                     <a href="/fetch">/fetch</a> - 📥 Legacy Excel-only fetch (old method)
                 </div>
+                <div class="endpoint">
+                    <a href="/refresh">/refresh</a> - 🔁 Refresh status of pending (non-final) transfers
+                </div>
+                <div class="endpoint">
+                    <a href="/coverage">/coverage</a> - 🧩 Time ranges ingested so far, with gap repair
+                </div>
 
                 <h2>🗄️ Database Operations:</h2>
                 <div class="endpoint">
@@ -112,6 +620,9 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                 <div class="endpoint">
                     <a href="/data/export">/data/export</a> - 💾 Export data (Excel, JSON, CSV)
                 </div>
+                <div class="endpoint">
+                    <a href="/data/whales">/data/whales</a> - 🐋 Largest transfers by token, chain and time window
+                </div>
 
                 <h2>📈 Monitoring:</h2>
                 <div class="endpoint">
@@ -120,11 +631,17 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                 <div class="endpoint">
                     <a href="/progress">/progress</a> - ⏱️ Real-time progress tracking (JSON)
                 </div>
+                <div class="endpoint">
+                    <a href="/progress/stream">/progress/stream</a> - 📡 Live progress events with pages/s, rows/s and ETA (SSE)
+                </div>
 
                 <h2>🛠️ Management:</h2>
                 <div class="endpoint">
                     <a href="/clear">/clear</a> - 🗑️ Clear files and database
                 </div>
+                <div class="endpoint">
+                    <a href="/retention">/retention</a> - 🧹 Retention rules, pruning and compaction
+                </div>
                 <div class="endpoint">
                     <a href="/download">/download</a> - 📁 File download information
                 </div>
@@ -146,8 +663,15 @@ class Handler(http.server.SimpleHTTPRequestHandler):
             </html>
             '''
         elif path == '/fetch' or path == '/rebuild':
+            # Parse configuration parameters
+            config_params = {
+                'token_filter': query_params.get('token', ['BTC'])[0],
+                'start_date': query_params.get('start_date', ['2023-01-01'])[0],
+                'end_date': query_params.get('end_date', ['2025-09-30'])[0]
+            }
+
             # Start the fetch process in a background thread
-            if process_status == "running":
+            if not start_background_job(config_params=config_params):
                 msg = '''
                 <html>
                 <body>
@@ -159,17 +683,6 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                 '''
             else:
                 try:
-                    # Parse configuration parameters
-                    config_params = {
-                        'token_filter': query_params.get('token', ['BTC'])[0],
-                        'start_date': query_params.get('start_date', ['2023-01-01'])[0],
-                        'end_date': query_params.get('end_date', ['2025-09-30'])[0]
-                    }
-
-                    current_process = threading.Thread(target=fetch_with_progress_tracking, args=(config_params,))
-                    current_process.daemon = True
-                    current_process.start()
-
                     endpoint_name = "Rebuild" if path == '/rebuild' else "Fetch"
                     logger.info(f"{endpoint_name} process started with params: {config_params}")
 
@@ -190,12 +703,7 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                             <a href="/progress">⏱️ View Progress</a> |
                             <a href="/">🏠 Back to Home</a>
                         </p>
-                        <script>
-                            // Auto-refresh every 5 seconds
-                            setTimeout(function(){{
-                                window.location.href = '/status';
-                            }}, 5000);
-                        </script>
+                        {PROGRESS_WIDGET}
                     </body>
                     </html>
                     '''
@@ -210,17 +718,113 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                     </body>
                     </html>
                     '''
+        elif path == '/refresh':
+            # Re-check non-final (e.g. PENDING) transfers in the background
+            pending_count = db.count_pending_transactions()
+            if not start_background_job(refresh_only=True):
+                msg = '''
+                <html>
+                <body>
+                    <h2>⚠️ Process Already Running</h2>
+                    <p>A transaction fetching process is already running.</p>
+                    <p><a href="/status">Check Status</a> | <a href="/progress">View Progress</a> | <a href="/">Back to Home</a></p>
+                </body>
+                </html>
+                '''
+            else:
+                logger.info(f"Status refresh started for {pending_count} pending transfers")
+
+                msg = f'''
+                <html>
+                <body>
+                    <h2>✅ Status Refresh Started!</h2>
+                    <p>Re-checking {pending_count:,} transfers that are not final yet (PENDING, NOT_FOUND, ...).</p>
+                    <p>
+                        <a href="/status">📊 Check Status</a> |
+                        <a href="/progress">⏱️ View Progress</a> |
+                        <a href="/">🏠 Back to Home</a>
+                    </p>
+                    {PROGRESS_WIDGET}
+                </body>
+                </html>
+                '''
+        elif path == '/coverage':
+            # Coverage map of the fetch job's date range, with a button to fetch only the gaps
+            notice = ''
+            if query_params.get('repair', ['0'])[0] == '1':
+                if start_background_job(repair_gaps=True):
+                    notice = '✅ Gap repair started.'
+                    logger.info("Coverage gap repair started")
+                else:
+                    notice = f"⚠️ A job is already running in process {shared_jobs.lease_holder() or 'unknown'}."
+
+            try:
+                coverage = db.get_coverage(**parse_coverage(query_params))
+            except ValueError as e:
+                coverage = None
+                notice = f'❌ {e}'
+
+            def ranges(intervals, limit=100):
+                rows = ''.join(
+                    f"<tr><td>{i['start_date']}</td><td>{i['end_date']}</td><td>{i['seconds'] / 3600:,.1f}</td></tr>"
+                    for i in intervals[:limit]
+                )
+                more = f"<p>... and {len(intervals) - limit:,} more</p>" if len(intervals) > limit else ''
+                return (f"<table><tr><th>From</th><th>To</th><th>Hours</th></tr>{rows}</table>{more}"
+                        if rows else '<p>None</p>')
+
+            summary = f'''
+                <table>
+                    <tr><th>Date Range</th><td>{coverage['start_date']} to {coverage['end_date']}</td></tr>
+                    <tr><th>Token Filter</th><td>{'All tokens' if coverage['token_symbol'] == '*' else coverage['token_symbol']}</td></tr>
+                    <tr><th>Minimum USD</th><td>${coverage['min_usd']:,.2f}</td></tr>
+                    <tr><th>Covered</th><td>{coverage['coverage_percent']}% ({coverage['covered_seconds'] / 86400:,.1f} days)</td></tr>
+                    <tr><th>Gaps</th><td>{len(coverage['gaps']):,} ({coverage['gap_seconds'] / 86400:,.1f} days)</td></tr>
+                </table>
+                <h3>Gaps</h3>
+                {ranges(coverage['gaps'])}
+                <h3>Covered Ranges</h3>
+                {ranges(coverage['covered'])}
+            ''' if coverage else ''
+
+            msg = f'''
+            <html>
+            <head>
+                <title>Coverage - LiFi Transaction Fetcher</title>
+                <style>
+                    body {{ font-family: Arial, sans-serif; margin: 40px; }}
+                    table {{ border-collapse: collapse; margin: 10px 0; }}
+                    th, td {{ padding: 8px; text-align: left; border-bottom: 1px solid #ddd; }}
+                    th {{ background-color: #f2f2f2; }}
+                    .notice {{ padding: 10px; background: #fff3cd; border-radius: 5px; }}
+                </style>
+            </head>
+            <body>
+                <h1>🧩 Coverage</h1>
+                {f'<p class="notice">{notice}</p>' if notice else ''}
+                {PROGRESS_WIDGET if notice.startswith('✅') else ''}
+                <p>Time ranges whose transfers have all been stored, recorded page by page as fetches write them.
+                   A repair fetches only the gaps, using the API's time window.</p>
+                {summary}
+                <p>
+                    <a href="/coverage?repair=1">🧩 Repair Gaps</a> |
+                    <a href="/api/v1/coverage">JSON</a> |
+                    <a href="/status">📊 Check Status</a> |
+                    <a href="/">🏠 Back to Home</a>
+                </p>
+            </body>
+            </html>
+            '''
         elif path == '/progress':
             # Return JSON progress data
-            progress_data = {
-                "status": process_status,
-                "progress": process_progress.copy(),
-                "start_time": process_start_time,
-                "elapsed_time": time.time() - process_start_time if process_start_time else 0,
-                "timestamp": time.time()
-            }
+            msg = json.dumps(job_state(), indent=2)
+
+        elif path.startswith('/api/v1/'):
+            status_code, msg = handle_api_v1(path, query_params)
 
-            msg = json.dumps(progress_data, indent=2)
+        elif path == '/metrics':
+            # Prometheus text exposition of the shared metrics registry
+            msg = REGISTRY.render()
 
         elif path == '/clear':
             # Delete existing Excel file and clear database
@@ -228,10 +832,21 @@ class Handler(http.server.SimpleHTTPRequestHandler):
             resume_file = "resume_cursor.txt"
             clear_db = query_params.get('database', ['yes'])[0].lower() == 'yes'
 
+            leased = retention_leased = False
             try:
                 files_deleted = []
                 actions_performed = []
 
+                # Only the ingestion leader may write; clearing takes the lease while no job runs
+                leased = shared_jobs.acquire_lease()
+                if not leased:
+                    raise RuntimeError(f"A job is running in process {shared_jobs.lease_holder() or 'unknown'}; "
+                                       "wait for it to finish before clearing")
+                retention_leased = retention_jobs.acquire_lease()
+                if not retention_leased:
+                    raise RuntimeError(f"A retention run is going in process "
+                                       f"{retention_jobs.lease_holder() or 'unknown'}; wait for it to finish")
+
                 # Clear files
                 if os.path.exists(output_file):
                     os.remove(output_file)
@@ -293,15 +908,94 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                 </body>
                 </html>
                 '''
+            finally:
+                if leased:
+                    shared_jobs.release_lease()
+                if retention_leased:
+                    retention_jobs.release_lease()
+
+        elif path == '/retention':
+            # Retention rules, the last run, and buttons to preview or start a run
+            action = query_params.get('run', [None])[0]
+            notice = ''
+            if action in ('preview', 'now'):
+                if not retention_rules:
+                    notice = '⚠️ No retention rules configured (set LIFI_RETENTION_RULES).'
+                elif start_retention_job(dry_run=action == 'preview',
+                                         full_vacuum=query_params.get('full', ['0'])[0] == '1'):
+                    notice = '✅ Retention run started.' if action == 'now' else '✅ Preview started.'
+                    logger.info(f"Retention {'preview' if action == 'preview' else 'run'} started")
+                else:
+                    notice = f"⚠️ A retention run is already going in process {retention_jobs.lease_holder() or 'unknown'}."
+
+            state = retention_jobs.read()
+            result = state['progress'].get('result') or {}
+            files = ''.join(
+                f"<tr><td>{os.path.basename(f['file'])}</td><td>{f['auto_vacuum']}</td>"
+                f"<td>{f['bytes_before']:,}</td><td>{f['bytes_after']:,}</td><td>{f['free_pages']:,}</td></tr>"
+                for f in result.get('files', [])
+            )
+            schedule = f"every {RETENTION_INTERVAL:g}s" if RETENTION_INTERVAL > 0 else 'on request only'
 
+            msg = f'''
+            <html>
+            <head>
+                <title>Retention - LiFi Transaction Fetcher</title>
+                <style>
+                    body {{ font-family: Arial, sans-serif; margin: 40px; }}
+                    table {{ border-collapse: collapse; margin: 10px 0; }}
+                    th, td {{ padding: 8px; text-align: left; border-bottom: 1px solid #ddd; }}
+                    th {{ background-color: #f2f2f2; }}
+                    .notice {{ padding: 10px; background: #fff3cd; border-radius: 5px; }}
+                </style>
+            </head>
+            <body>
+                <h1>🧹 Retention</h1>
+                {f'<p class="notice">{notice}</p>' if notice else ''}
+                <h3>Rules</h3>
+                <ul>
+                    {''.join(f'<li>{describe_rule(rule)}</li>' for rule in retention_rules) or '<li>None: all transfers are kept</li>'}
+                </ul>
+                <p>Scheduled: {schedule}. Deletes go {RETENTION_BATCH_SIZE} transfers per transaction, followed by
+                   incremental vacuum and ANALYZE.</p>
+
+                <h3>Last Run</h3>
+                <table>
+                    <tr><th>Status</th><td>{state['status']}</td></tr>
+                    <tr><th>Message</th><td>{state['progress'].get('message', 'N/A')}</td></tr>
+                    <tr><th>Process</th><td>{state['owner'] or 'N/A'}</td></tr>
+                    <tr><th>Dropped Partitions</th><td>{', '.join(result.get('dropped_partitions', [])) or 'None'}</td></tr>
+                </table>
+                {f'<table><tr><th>File</th><th>Auto-vacuum</th><th>Bytes Before</th><th>Bytes After</th><th>Free Pages</th></tr>{files}</table>' if files else ''}
+
+                <p>
+                    <a href="/retention?run=preview">🔍 Preview</a> |
+                    <a href="/retention?run=now">🧹 Run Now</a> |
+                    <a href="/retention?run=now&full=1">🗜️ Run with Full VACUUM</a> (locks the database while it runs) |
+                    <a href="/api/v1/retention">JSON</a> |
+                    <a href="/">🏠 Back to Home</a>
+                </p>
+            </body>
+            </html>
+            '''
         elif path.startswith('/data/'):
             # Handle database-related endpoints
             if path == '/data/stats':
                 # Database statistics endpoint
                 try:
-                    stats = db.get_statistics()
+                    stats = cached_query('get_statistics')
                     db_info = db.get_database_info()
 
+                    # Approximate per-chain analytics, optionally narrowed by token/date
+                    sketch_filters = {
+                        'token_symbol': query_params.get('token', [None])[0],
+                        'start_date': query_params.get('start_date', [None])[0],
+                        'end_date': query_params.get('end_date', [None])[0]
+                    }
+                    chain_sketches = cached_query('get_sketch_statistics', group_by='chain', **sketch_filters)
+                    approximate = stats['approximate'] or {}
+                    percentiles = approximate.get('amount_usd_percentiles', {})
+
                     msg = f'''
                     <html>
                     <head>
@@ -362,6 +1056,23 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                             </table>
                         </div>
 
+                        <div class="stats-card">
+                            <h3>🧮 Approximate Analytics</h3>
+                            <div class="metric">
+                                <span class="metric-label">Distinct Wallets (senders + receivers):</span>
+                                <span class="metric-value">~{approximate.get('distinct_wallets', 0):,}</span>
+                            </div>
+                            <div class="metric">
+                                <span class="metric-label">Transfer Size p50 / p90 / p99 (USD):</span>
+                                <span class="metric-value">{' / '.join(f'${v:,.2f}' if v is not None else 'N/A' for v in percentiles.values()) or 'N/A'}</span>
+                            </div>
+                            <table>
+                                <tr><th>Chain</th><th>Transfers</th><th>Distinct Senders</th><th>Distinct Receivers</th><th>p50 (USD)</th><th>p99 (USD)</th></tr>
+                                {''.join(f'<tr><td>{row["chain_name"]}</td><td>{row["tx_count"]:,}</td><td>~{row["distinct_senders"]:,}</td><td>~{row["distinct_receivers"]:,}</td><td>${row["amount_usd_percentiles"]["p50"] or 0:,.2f}</td><td>${row["amount_usd_percentiles"]["p99"] or 0:,.2f}</td></tr>' for row in chain_sketches)}
+                            </table>
+                            <p><small>Estimates from per token/chain/day sketches. Filter with ?token=BTC&amp;start_date=YYYY-MM-DD&amp;end_date=YYYY-MM-DD</small></p>
+                        </div>
+
                         <div class="stats-card">
                             <h3>💾 Database File Info</h3>
                             <div class="metric">
@@ -376,6 +1087,11 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                                 <span class="metric-label">File Path:</span>
                                 <span class="metric-value">{db_info['file_path']}</span>
                             </div>
+                            {f'<div class="metric"><span class="metric-label">Monthly Partitions:</span><span class="metric-value">{db_info["partition_count"]} ({db_info["frozen_partition_count"]} frozen, {db_info["partitions_size_mb"]} MB)</span></div>' if db_info['partitioned'] else ''}
+                            <div class="metric">
+                                <span class="metric-label">Analytics Backend:</span>
+                                <span class="metric-value">{db_info['analytics_backend']}</span>
+                            </div>
                         </div>
 
                         <p style="margin-top: 30px;">
@@ -405,18 +1121,16 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                     token_symbol = query_params.get('token', [None])[0]
                     min_usd = query_params.get('min_usd', [None])[0]
                     max_usd = query_params.get('max_usd', [None])[0]
+                    start_date = query_params.get('start_date', [None])[0]
+                    end_date = query_params.get('end_date', [None])[0]
+                    chain_id = query_params.get('chain_id', [None])[0]
                     limit = int(query_params.get('limit', ['100'])[0])
 
                     # Build filters
                     filters = {'limit': limit}
-                    if token_symbol:
-                        filters['token_symbol'] = token_symbol
-                    if min_usd:
-                        filters['min_usd'] = float(min_usd)
-                    if max_usd:
-                        filters['max_usd'] = float(max_usd)
+                    filters.update({k: v for k, v in parse_transaction_filters(query_params).items() if v is not None})
 
-                    transactions = db.get_transactions(**filters)
+                    transactions = cached_query('get_transactions', **filters)
 
                     # Create filter form
                     filter_form = f'''
@@ -435,6 +1149,18 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                                 <td>Max USD Amount:</td>
                                 <td><input type="number" name="max_usd" value="{max_usd or ''}" step="0.01"></td>
                             </tr>
+                            <tr>
+                                <td>Start Date:</td>
+                                <td><input type="date" name="start_date" value="{start_date or ''}"></td>
+                            </tr>
+                            <tr>
+                                <td>End Date:</td>
+                                <td><input type="date" name="end_date" value="{end_date or ''}"></td>
+                            </tr>
+                            <tr>
+                                <td>Chain ID:</td>
+                                <td><input type="number" name="chain_id" value="{chain_id or ''}" placeholder="e.g., 1, 137"></td>
+                            </tr>
                             <tr>
                                 <td>Limit:</td>
                                 <td><input type="number" name="limit" value="{limit}" min="1" max="1000"></td>
@@ -531,46 +1257,27 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                     token_symbol = query_params.get('token', [None])[0]
 
                     if export_format:
-                        # Perform export
+                        # Run the export as a background job, joining an identical one in flight
                         filters = {}
                         if token_symbol:
                             filters['token_symbol'] = token_symbol
-
-                        if export_format == 'excel':
-                            filename = db.export_to_excel(filters=filters)
-                            msg = f'''
-                            <html>
-                            <body>
-                                <h2>✅ Excel Export Complete</h2>
-                                <p>File created: {filename}</p>
-                                <p><a href="/data/export">Back to Export</a> | <a href="/">🏠 Home</a></p>
-                            </body>
-                            </html>
-                            '''
-                        elif export_format == 'json':
-                            filename = db.export_to_json(filters=filters)
-                            msg = f'''
-                            <html>
-                            <body>
-                                <h2>✅ JSON Export Complete</h2>
-                                <p>File created: {filename}</p>
-                                <p><a href="/data/export">Back to Export</a> | <a href="/">🏠 Home</a></p>
-                            </body>
-                            </html>
-                            '''
-                        elif export_format == 'csv':
-                            filename = db.export_to_csv(filters=filters)
-                            msg = f'''
-                            <html>
-                            <body>
-                                <h2>✅ CSV Export Complete</h2>
-                                <p>File created: {filename}</p>
-                                <p><a href="/data/export">Back to Export</a> | <a href="/">🏠 Home</a></p>
-                            </body>
-                            </html>
-                            '''
-                        else:
-                            raise ValueError(f"Unsupported format: {export_format}")
+                        job = export_jobs.submit(export_format, filters)
+
+                        download = query_params.get('download', ['0'])[0].lower() in ('1', 'true', 'yes')
+                        if download and job.done.wait(EXPORT_DOWNLOAD_WAIT):
+                            if job.status != 'completed':
+                                raise ValueError(job.error or f"Export {job.status}")
+                            # The export is done: stream the file under a download slot, not an export one
+                            if not self.switch_limiter('download'):
+                                self.send_too_busy('download')
+                                return
+                            self.send_file(job.path, download_name=EXPORT_FILES[export_format])
+                            return
+                        if download:
+                            # Too slow to hold a worker for: hand out the job page, which links the file when done
+                            status_code = HTTPStatus.ACCEPTED
+
+                        msg = export_job_page(job)
 
                     else:
                         # Show export options
@@ -643,6 +1350,115 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                     </html>
                     '''
 
+            elif path == '/data/export/job':
+                job = export_jobs.get(query_params.get('id', [''])[0])
+                if job is None:
+                    status_code = HTTPStatus.NOT_FOUND
+                    msg = '''
+                    <html>
+                    <body>
+                        <h2>❌ Export Job Not Found</h2>
+                        <p>The export job does not exist or has been dropped from the job history.</p>
+                        <p><a href="/data/export">Back to Export</a> | <a href="/">🏠 Home</a></p>
+                    </body>
+                    </html>
+                    '''
+                else:
+                    msg = export_job_page(job)
+
+            elif path == '/data/whales':
+                # Largest transfers, read from the incrementally maintained leaderboard
+                try:
+                    token_symbol = query_params.get('token', [None])[0]
+                    chain_id = query_params.get('chain_id', [None])[0]
+                    window = query_params.get('window', ['all'])[0]
+                    bucket = query_params.get('bucket', [None])[0]
+                    limit = int(query_params.get('limit', ['25'])[0])
+                    if window in ('month', 'day') and not bucket:
+                        # Resolve "current" here so the cache key changes with the date
+                        bucket = datetime.now().strftime('%Y-%m' if window == 'month' else '%Y-%m-%d')
+
+                    leaderboard_filters = {
+                        'token_symbol': token_symbol,
+                        'chain_id': int(chain_id) if chain_id else None,
+                        'window': window,
+                        'bucket': bucket
+                    }
+                    whales = cached_query('get_leaderboard', limit=limit, **leaderboard_filters)
+                    entry_threshold = cached_query('get_leaderboard_threshold', **leaderboard_filters)
+
+                    table_rows = ''.join(f'''
+                        <tr>
+                            <td>{rank}</td>
+                            <td>${tx['amount_usd']:,.2f}</td>
+                            <td>{tx['sending_token'] or 'N/A'}</td>
+                            <td>{tx['sending_chain'] or 'N/A'}</td>
+                            <td>{tx['tool'] or 'N/A'}</td>
+                            <td>{tx['timestamp'][:19] if tx['timestamp'] else 'N/A'}</td>
+                            <td>{f'<a href="{tx["lifi_explorer_link"]}">{tx["transaction_id"][:10]}...</a>' if tx['lifi_explorer_link'] else tx['transaction_id'][:10] + '...'}</td>
+                        </tr>
+                    ''' for rank, tx in enumerate(whales, 1))
+
+                    if whales:
+                        whales_table = f'''
+                        <table>
+                            <tr><th>#</th><th>Amount (USD)</th><th>Token</th><th>Chain</th><th>Tool</th><th>Timestamp</th><th>Transaction</th></tr>
+                            {table_rows}
+                        </table>
+                        '''
+                    else:
+                        whales_table = '<p>No transfers recorded for this leaderboard yet.</p>'
+
+                    msg = f'''
+                    <html>
+                    <head>
+                        <title>Largest Transfers - LiFi Fetcher</title>
+                        <style>
+                            body {{ font-family: Arial, sans-serif; margin: 40px; }}
+                            table {{ width: 100%; border-collapse: collapse; }}
+                            th, td {{ padding: 8px; text-align: left; border-bottom: 1px solid #ddd; }}
+                            th {{ background-color: #f2f2f2; }}
+                            input, select {{ padding: 5px; margin: 2px; }}
+                            button {{ padding: 8px 15px; background: #007bff; color: white; border: none; border-radius: 3px; }}
+                        </style>
+                    </head>
+                    <body>
+                        <h1>🐋 Largest Transfers</h1>
+
+                        <form method="GET" style="background: #f8f9fa; padding: 15px; border-radius: 5px; margin: 15px 0;">
+                            Token: <input type="text" name="token" value="{token_symbol or ''}" placeholder="all">
+                            Chain ID: <input type="number" name="chain_id" value="{chain_id or ''}" placeholder="all">
+                            Window: <select name="window">
+                                {''.join(f'<option value="{w}"{" selected" if w == window else ""}>{w}</option>' for w in ('all', 'month', 'day'))}
+                            </select>
+                            Bucket: <input type="text" name="bucket" value="{bucket or ''}" placeholder="YYYY-MM or YYYY-MM-DD">
+                            <button type="submit">Show</button>
+                        </form>
+
+                        <p><strong>Entry threshold for this leaderboard:</strong> ${entry_threshold:,.2f}</p>
+                        {whales_table}
+
+                        <p style="margin-top: 30px;">
+                            <a href="/data/stats">📈 Statistics</a> |
+                            <a href="/data/view">👁️ View Data</a> |
+                            <a href="/">🏠 Home</a>
+                        </p>
+                    </body>
+                    </html>
+                    '''
+
+                except Exception as e:
+                    logger.error(f"Error reading leaderboard: {e}")
+                    msg = f'''
+                    <html>
+                    <body>
+                        <h2>❌ Error</h2>
+                        <p>Error reading largest transfers: {str(e)}</p>
+                        <p><a href="/">🏠 Back to Home</a></p>
+                    </body>
+                    </html>
+                    '''
+
             else:
                 # Unknown /data/ endpoint
                 msg = '''
@@ -654,6 +1470,7 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                         <li><a href="/data/stats">📈 Statistics</a></li>
                         <li><a href="/data/view">👁️ View Transactions</a></li>
                         <li><a href="/data/export">💾 Export Data</a></li>
+                        <li><a href="/data/whales">🐋 Largest Transfers</a></li>
                     </ul>
                     <p><a href="/">🏠 Back to Home</a></p>
                 </body>
@@ -676,8 +1493,18 @@ class Handler(http.server.SimpleHTTPRequestHandler):
             else:
                 file_info['exists'] = False
 
-            # Process information
-            elapsed_time = time.time() - process_start_time if process_start_time else 0
+            # Process information (shared by all server processes)
+            state = job_state()
+            process_status = state['status']
+            process_progress = state['progress']
+            if state['owner'] is None:
+                leader = 'None yet'
+            elif state['owner'] == process_owner():
+                leader = f"{state['owner']} (this process)"
+            else:
+                leader = state['owner']
+            retention_state = retention_jobs.read()
+            elapsed_time = state['elapsed_time']
             elapsed_str = f"{int(elapsed_time//60)}m {int(elapsed_time%60)}s" if elapsed_time > 0 else "N/A"
 
             # Status indicators
@@ -724,7 +1551,6 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                     th {{ background-color: #f2f2f2; }}
                     .refresh-note {{ font-style: italic; color: #666; margin-top: 20px; }}
                 </style>
-                <meta http-equiv="refresh" content="10">
             </head>
             <body>
                 <h1>📊 System Status</h1>
@@ -732,11 +1558,14 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                 <div class="status-card process-info">
                     <h3>🔄 Process Status</h3>
                     <p><span class="status-indicator">{status_icon} {process_status.upper()}</span></p>
+                    {PROGRESS_WIDGET}
                     <table>
                         <tr><th>Current Status</th><td>{process_status}</td></tr>
                         <tr><th>Current Message</th><td>{process_progress.get('message', 'N/A')}</td></tr>
+                        {f'<tr><th>Trace</th><td><a href="/jobs/{process_progress["job_id"]}/trace">{process_progress["job_id"]}</a> (Chrome trace JSON, open in chrome://tracing or Perfetto)</td></tr>' if process_progress.get('job_id') else ''}
                         <tr><th>Elapsed Time</th><td>{elapsed_str}</td></tr>
-                        <tr><th>Process Thread</th><td>{'Active' if current_process and current_process.is_alive() else 'Inactive'}</td></tr>
+                        <tr><th>Ingestion Leader</th><td>{leader}</td></tr>
+                        <tr><th>Retention</th><td>{retention_state['status']} - {retention_state['progress'].get('message', 'N/A')} (<a href="/retention">details</a>)</td></tr>
                     </table>
                 </div>
 
@@ -763,80 +1592,16 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                 </div>
 
                 <div class="refresh-note">
-                    <p>🔄 This page automatically refreshes every 10 seconds</p>
+                    <p>🔄 Live progress is pushed from <a href="/progress/stream">/progress/stream</a>; reload for file details</p>
                     <p>Last updated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
                 </div>
             </body>
             </html>
             '''
         elif path == '/download':
-            output_file = "txns_2023_to_2025.xlsx"
-            if os.path.exists(output_file):
-                file_stat = os.stat(output_file)
-                file_size_mb = round(file_stat.st_size / (1024*1024), 2)
-                modified_time = datetime.fromtimestamp(file_stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
-
-                msg = f'''
-                <html>
-                <head>
-                    <title>Download - LiFi Transaction Fetcher</title>
-                    <style>
-                        body {{ font-family: Arial, sans-serif; margin: 40px; }}
-                        .download-info {{
-                            border: 1px solid #28a745;
-                            border-radius: 8px;
-                            padding: 20px;
-                            background-color: #d4edda;
-                            margin: 15px 0;
-                        }}
-                        .file-details {{
-                            background-color: #f8f9fa;
-                            padding: 15px;
-                            border-radius: 5px;
-                            margin: 10px 0;
-                        }}
-                        table {{ width: 100%; border-collapse: collapse; }}
-                        th, td {{ padding: 8px; text-align: left; border-bottom: 1px solid #ddd; }}
-                        th {{ background-color: #f2f2f2; }}
-                    </style>
-                </head>
-                <body>
-                    <h1>💾 Download Excel File</h1>
-
-                    <div class="download-info">
-                        <h2>✅ File Ready for Download</h2>
-                        <p>Your LiFi transaction data has been successfully processed and is ready for download.</p>
-                    </div>
-
-                    <div class="file-details">
-                        <h3>📋 File Details</h3>
-                        <table>
-                            <tr><th>File Name</th><td>{output_file}</td></tr>
-                            <tr><th>File Size</th><td>{file_stat.st_size:,} bytes ({file_size_mb} MB)</td></tr>
-                            <tr><th>Last Modified</th><td>{modified_time}</td></tr>
-                            <tr><th>Content</th><td>BTC cross-chain transactions (2023-2025)</td></tr>
-                            <tr><th>Format</th><td>Microsoft Excel (.xlsx)</td></tr>
-                        </table>
-                    </div>
-
-                    <div style="background-color: #fff3cd; padding: 15px; border-radius: 5px; margin: 15px 0;">
-                        <h3>📝 Note about Downloads</h3>
-                        <p><strong>File Location:</strong> The Excel file is saved locally in the server's application directory.</p>
-                        <p><strong>Server Access:</strong> To download the file, you'll need to access the server filesystem directly or implement file serving capabilities.</p>
-                        <p><strong>File Path:</strong> <code>./{output_file}</code></p>
-                    </div>
-
-                    <div style="margin-top: 30px;">
-                        <h3>🛠️ Next Steps</h3>
-                        <p>
-                            <a href="/status">📊 View Status</a> |
-                            <a href="/rebuild">🔄 Rebuild Data</a> |
-                            <a href="/">🏠 Back to Home</a>
-                        </p>
-                    </div>
-                </body>
-                </html>
-                '''
+            # Stream the Excel output (or ?format= export) straight from disk
+            if self.send_download(query_params):
+                return
             else:
                 msg = '''
                 <html>
@@ -903,10 +1668,14 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                     <li><strong>/</strong> - Home page</li>
                     <li><strong>/rebuild</strong> - Start Excel rebuild process</li>
                     <li><strong>/fetch</strong> - Legacy fetch endpoint</li>
+                    <li><strong>/refresh</strong> - Refresh pending transfer statuses</li>
                     <li><strong>/status</strong> - Detailed system status</li>
                     <li><strong>/progress</strong> - JSON progress data</li>
+                    <li><strong>/progress/stream</strong> - Live progress (Server-Sent Events)</li>
+                    <li><strong>/metrics</strong> - Prometheus metrics</li>
                     <li><strong>/clear</strong> - Clear existing files</li>
                     <li><strong>/download</strong> - Download information</li>
+                    <li><strong>/api/v1/</strong> - JSON API (transactions, stats, whales, aggregate, jobs, exports)</li>
                 </ul>
 
                 <p style="margin-top: 30px;">
@@ -917,17 +1686,178 @@ class Handler(http.server.SimpleHTTPRequestHandler):
             '''
 
         try:
-            self.wfile.write(msg.encode())
+            self.send_bytes(status_code, content_type, msg.encode())
         except Exception as e:
             logger.error(f"Error writing response: {str(e)}")
 
+    def do_HEAD(self):
+        parsed_path = urlparse(self.path)
+        if parsed_path.path == '/download' and self.send_download(parse_qs(parsed_path.query)):
+            return
+        super().do_HEAD()
+
+    def send_download(self, query_params):
+        """Send the requested download file; False when it does not exist yet."""
+        job_id = query_params.get('job', [None])[0]
+        if job_id:
+            job = export_jobs.get(job_id)
+            if job is None or job.status != 'completed':
+                return False
+            self.send_file(job.path, download_name=EXPORT_FILES[job.format])
+            return True
+
+        export_format = query_params.get('format', [None])[0]
+        filename = EXPORT_FILES.get(export_format) if export_format else OUTPUT_FILE
+        if not filename or not os.path.exists(filename):
+            return False
+        self.send_file(filename)
+        return True
+
+    def send_bytes(self, status, content_type, body, filename=None, headers=None):
+        """Send a complete in-memory response body, gzip- or deflate-compressed when the client accepts it."""
+        body, encoding = compress_body(body, content_type, self.headers.get('Accept-Encoding'))
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        if is_compressible(content_type):
+            self.send_header('Vary', 'Accept-Encoding')
+        if filename:
+            self.send_header('Content-Disposition', f'attachment; filename="{filename}"')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_too_busy(self, group):
+        """429 for a heavy request whose concurrency slots stayed full."""
+        headers = {'Retry-After': str(ADMISSION_RETRY_AFTER)}
+        message = f"Too many concurrent {group} requests; retry in {ADMISSION_RETRY_AFTER} seconds"
+        if urlparse(self.path).path.startswith('/api/'):
+            self.send_bytes(HTTPStatus.TOO_MANY_REQUESTS, 'application/json', api_json({'error': message}).encode(),
+                            headers=headers)
+        else:
+            body = f'<html><body><h2>⏳ Server Busy</h2><p>{message}.</p><p><a href="/">🏠 Home</a></p></body></html>'
+            self.send_bytes(HTTPStatus.TOO_MANY_REQUESTS, 'text/html', body.encode(), headers=headers)
+
+    def send_trace(self, job_id):
+        """Chrome trace JSON of an ingestion run: live while this process runs it, else its saved file."""
+        download_name = f"trace-{job_id}.json"
+        tracer = active_trace()
+        if tracer is not None and tracer.run_id == job_id:
+            body = json.dumps(tracer.chrome_trace(), separators=(',', ':'), default=str).encode()
+            self.send_bytes(HTTPStatus.OK, 'application/json', body, filename=download_name)
+            return
+        try:
+            path = trace_path(job_id)
+        except ValueError:
+            path = None
+        if path and os.path.exists(path):
+            self.send_file(path, download_name=download_name, content_type='application/json')
+            return
+        body = api_json({'error': f"No trace for job {job_id}: it is unknown, has been pruned, "
+                                  "or is still running in another server process"}).encode()
+        self.send_bytes(HTTPStatus.NOT_FOUND, 'application/json', body)
+
+    def route_admin(self, path, query_params):
+        """Profiling and diagnostics; requires `Authorization: Bearer $LIFI_ADMIN_TOKEN`."""
+        if not is_authorized(self.headers.get('Authorization')):
+            if ADMIN_TOKEN:
+                body = api_json({'error': 'Admin token required'}).encode()
+                self.send_bytes(HTTPStatus.UNAUTHORIZED, 'application/json', body, headers={'WWW-Authenticate': 'Bearer'})
+            else:
+                body = api_json({'error': 'Admin endpoints are disabled; set LIFI_ADMIN_TOKEN'}).encode()
+                self.send_bytes(HTTPStatus.FORBIDDEN, 'application/json', body)
+            return
+
+        def param(name, default=None):
+            return query_params.get(name, [default])[0]
+
+        status = HTTPStatus.OK
+        content_type = 'application/json'
+        filename = None
+        try:
+            if path == '/admin/profile/start':
+                result = profiler.start(seconds=float(param('seconds', PROFILE_DEFAULT_SECONDS)),
+                                        interval_ms=float(param('interval_ms', PROFILE_DEFAULT_INTERVAL_MS)),
+                                        include_idle=param('idle', '0') == '1')
+                logger.info(f"CPU profile started: {result}")
+                body = api_json(result)
+            elif path == '/admin/profile/stop':
+                body = api_json(profiler.stop())
+            elif path == '/admin/profile':
+                body = api_json(profiler.status())
+            elif path == '/admin/profile/download':
+                profile_format = param('format', 'collapsed')
+                if profile_format == 'pstats':
+                    body, content_type, filename = profiler.pstats_data(), 'application/octet-stream', 'profile.pstats'
+                elif profile_format == 'collapsed':
+                    body, content_type, filename = profiler.collapsed(), 'text/plain; charset=utf-8', 'profile.collapsed'
+                else:
+                    raise ValueError(f"Unsupported profile format: {profile_format}")
+            elif path == '/admin/memory/snapshot':
+                body = api_json(memory_tracer.snapshot(limit=int(param('limit', 25))))
+            elif path == '/admin/memory/diff':
+                from_id, to_id = param('from'), param('to')
+                body = api_json(memory_tracer.diff(int(from_id) if from_id else None,
+                                                   int(to_id) if to_id else None,
+                                                   limit=int(param('limit', 25))))
+            elif path == '/admin/memory':
+                body = api_json(memory_tracer.snapshots())
+            elif path == '/admin/memory/stop':
+                memory_tracer.stop()
+                body = api_json({'tracing': False})
+            elif path == '/admin/threads':
+                body, content_type = thread_stacks(), 'text/plain; charset=utf-8'
+            else:
+                status, body = HTTPStatus.NOT_FOUND, api_json({'error': f"Unknown endpoint: {path}"})
+        except ValueError as e:
+            status, body, content_type, filename = HTTPStatus.BAD_REQUEST, api_json({'error': str(e)}), 'application/json', None
+        except RuntimeError as e:
+            status, body, content_type, filename = HTTPStatus.CONFLICT, api_json({'error': str(e)}), 'application/json', None
+
+        self.send_bytes(status, content_type, body if isinstance(body, bytes) else body.encode(), filename)
+
+    def stream_progress(self):
+        """Server-Sent Events feed of job progress.
+
+        Sends the current state right away, then hands the socket to
+        progress_stream so the worker thread returns to the pool.
+        """
+        if progress_stream.full():
+            body = api_json({'error': 'Too many progress watchers'}).encode()
+            self.send_bytes(HTTPStatus.SERVICE_UNAVAILABLE, 'application/json', body, headers={'Retry-After': '5'})
+            return
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(b"retry: 2000\n" + format_event(job_state()))
+        if progress_stream.subscribe(self.connection):
+            self.server.detach_request(self.request)
+
     def log_message(self, format, *args):
         """Override to use our logger instead of default stderr logging."""
         logger.info(f"{self.address_string()} - {format % args}")
 
 
-port = int(os.getenv('PORT', 8080))
-print('LiFi Transaction Fetcher listening on port %s' % (port))
-print('Visit http://localhost:%s to access the web interface' % (port))
-httpd = socketserver.TCPServer(('', port), Handler)
-httpd.serve_forever()
+if __name__ == '__main__':
+    port = int(os.getenv('PORT', 8080))
+    print('LiFi Transaction Fetcher listening on port %s (%s worker threads, pid %s)' % (port, SERVER_WORKERS, os.getpid()))
+    print('Visit http://localhost:%s to access the web interface' % (port))
+    if SERVER_PROCESSES > 1 and SERVER_LISTEN_FD is None:
+        # Supervisor: the children re-run this script on the shared socket
+        print('Starting %s server processes' % SERVER_PROCESSES)
+        serve_processes(('', port), SERVER_PROCESSES)
+    else:
+        shared_jobs.follow(follow_shared_job_state)
+        if retention_rules and RETENTION_INTERVAL > 0:
+            # Every process schedules runs; the retention lease lets one of them go at a time
+            schedule_retention(start_retention_job, RETENTION_INTERVAL)
+        httpd = PooledHTTPServer(('', port), Handler, workers=SERVER_WORKERS, listen_fd=SERVER_LISTEN_FD)
+        startup.mark('listen')
+        logger.info(startup.report())
+        httpd.serve_forever()
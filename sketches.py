@@ -0,0 +1,159 @@
+import math
+import json
+import zlib
+import hashlib
+from typing import Dict, Iterable, Optional
+import numpy as np
+
+
+class HyperLogLog:
+    """Mergeable distinct-count sketch (HyperLogLog with linear-counting correction).
+
+    Registers are a uint8 NumPy array, so merging is an element-wise maximum.
+    """
+
+    def __init__(self, precision: int = 11, registers: Optional[np.ndarray] = None):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = registers if registers is not None else np.zeros(self.m, dtype=np.uint8)
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+    def add(self, value: Optional[str]):
+        """Add a value (addresses are compared case-insensitively)."""
+        if not value:
+            return
+        h = self._hash(value.lower())
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        """Fold another sketch of the same precision into this one."""
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge HyperLogLog sketches of precision {self.precision} and {other.precision}")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def merge_blobs(self, blobs: Iterable[Optional[bytes]]) -> 'HyperLogLog':
+        """Fold serialized sketches into this one without building a HyperLogLog per blob."""
+        for blob in blobs:
+            if not blob:
+                continue
+            raw = zlib.decompress(blob)
+            if raw[0] != self.precision:
+                raise ValueError(f"Cannot merge HyperLogLog sketches of precision {self.precision} and {raw[0]}")
+            np.maximum(self.registers, np.frombuffer(raw, dtype=np.uint8, offset=1), out=self.registers)
+        return self
+
+    def count(self) -> int:
+        """Estimated number of distinct values added."""
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / float(np.sum(np.exp2(-self.registers.astype(np.float64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        return zlib.compress(bytes([self.precision]) + self.registers.tobytes())
+
+    @classmethod
+    def from_bytes(cls, blob: Optional[bytes], precision: int = 11) -> 'HyperLogLog':
+        if not blob:
+            return cls(precision)
+        raw = zlib.decompress(blob)
+        return cls(raw[0], np.frombuffer(raw, dtype=np.uint8, offset=1).copy())
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with bounded relative error (log-bucketed histogram).
+
+    Values are counted in buckets whose bounds grow geometrically, so any
+    reported quantile is within `relative_accuracy` of the true value. That
+    suits long-tail USD amounts, and merging two sketches is just adding
+    bucket counts.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def add(self, value: Optional[float]):
+        """Add a non-negative value; None is ignored."""
+        if value is None:
+            return
+        if value <= 0:
+            self.zero_count += 1
+        else:
+            index = math.ceil(math.log(value) / self.log_gamma)
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: 'QuantileSketch') -> 'QuantileSketch':
+        """Fold another sketch with the same accuracy into this one."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge quantile sketches with different accuracy")
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimated value at quantile q (0..1), or None when empty."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def quantiles(self, qs: Iterable[float]) -> Dict[str, Optional[float]]:
+        """Map of 'p50'-style labels to estimated values."""
+        return {f"p{q * 100:g}": self.quantile(q) for q in qs}
+
+    def to_bytes(self) -> bytes:
+        return zlib.compress(json.dumps({
+            'a': self.relative_accuracy,
+            'b': self.buckets,
+            'z': self.zero_count,
+            'n': self.count,
+            'min': self.min,
+            'max': self.max
+        }, separators=(',', ':')).encode())
+
+    @classmethod
+    def from_bytes(cls, blob: Optional[bytes], relative_accuracy: float = 0.01) -> 'QuantileSketch':
+        if not blob:
+            return cls(relative_accuracy)
+        data = json.loads(zlib.decompress(blob))
+        sketch = cls(data['a'])
+        sketch.buckets = {int(k): v for k, v in data['b'].items()}
+        sketch.zero_count = data['z']
+        sketch.count = data['n']
+        sketch.min = data['min']
+        sketch.max = data['max']
+        return sketch
+
@@ -0,0 +1,204 @@
+"""
+Synthetic LI.FI transfers in the payload shape LiFiDatabase.insert_transaction consumes.
+
+Tokens, chains, bridges and wallets follow skewed (Zipf-like) popularity,
+USD amounts a long-tailed lognormal with a whale tail, and timestamps span
+several years with volume growing over time. Output is deterministic for a
+given seed, so benchmark runs are comparable.
+
+Usage: python synthetic_data.py --count 1000000 [--db lifi_transactions.db] [--seed 1]
+       python synthetic_data.py --count 1000 --jsonl transfers.jsonl
+"""
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import itertools
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+# --- CONFIGURATION ---
+SYNTHETIC_START = datetime(2022, 1, 1)
+SYNTHETIC_END = datetime(2025, 9, 30, 23, 59, 59)
+SYNTHETIC_WALLETS = int(os.getenv('LIFI_SYNTHETIC_WALLETS', 200000))
+SYNTHETIC_GROWTH = 2.0  # later months carry up to this many times the volume of early ones
+
+# (symbol, name, decimals, price in USD, relative popularity)
+TOKENS = [
+    ('USDC', 'USD Coin', 6, 1.0, 30),
+    ('USDT', 'Tether USD', 6, 1.0, 22),
+    ('ETH', 'Ether', 18, 2500.0, 18),
+    ('WETH', 'Wrapped Ether', 18, 2500.0, 7),
+    ('BTC', 'Bitcoin', 8, 60000.0, 5),
+    ('WBTC', 'Wrapped BTC', 8, 60000.0, 4),
+    ('DAI', 'Dai Stablecoin', 18, 1.0, 5),
+    ('MATIC', 'Polygon', 18, 0.7, 3),
+    ('ARB', 'Arbitrum', 18, 1.1, 2),
+    ('OP', 'Optimism', 18, 2.0, 2),
+    ('BNB', 'BNB', 18, 550.0, 1),
+    ('LINK', 'Chainlink', 18, 14.0, 1),
+]
+# (chain id, relative popularity)
+CHAINS = [(1, 25), (42161, 22), (8453, 15), (10, 12), (137, 10), (56, 6), (43114, 3), (324, 2),
+          (59144, 2), (534352, 1), (100, 1), (250, 1), (20000000000001, 1)]
+TOOLS = [('across', 30), ('stargate', 20), ('cbridge', 12), ('hop', 10), ('relay', 9), ('mayan', 6),
+         ('symbiosis', 5), ('allbridge', 3), ('squid', 3), ('thorswap', 2)]
+INTEGRATORS = [('jumper.exchange', 40), ('metamask', 20), ('rabby', 10), ('zerion', 8), ('rainbow', 6),
+               ('safe', 5), ('ledger', 4), ('unknown', 7)]
+# (status, substatus, relative frequency)
+STATUSES = [('DONE', 'COMPLETED', 90), ('DONE', 'PARTIAL', 2), ('PENDING', 'WAIT_DESTINATION_TRANSACTION', 4),
+            ('FAILED', 'UNKNOWN_ERROR', 3), ('INVALID', 'NOT_PROCESSABLE_REFUND_NEEDED', 1)]
+
+
+def _cumulative(weighted) -> List[float]:
+    return list(itertools.accumulate(item[-1] for item in weighted))
+
+
+class TransferGenerator:
+    """Deterministic stream of synthetic transfer payloads."""
+
+    def __init__(self, seed: Optional[int] = 1, start: datetime = SYNTHETIC_START, end: datetime = SYNTHETIC_END,
+                 wallets: int = SYNTHETIC_WALLETS, growth: float = SYNTHETIC_GROWTH):
+        self.random = random.Random(seed)
+        self.start = start.timestamp()
+        self.span = end.timestamp() - self.start
+        self.wallets = wallets
+        self.growth = growth
+        self._token_weights = _cumulative(TOKENS)
+        self._chain_weights = _cumulative(CHAINS)
+        self._tool_weights = _cumulative(TOOLS)
+        self._integrator_weights = _cumulative(INTEGRATORS)
+        self._status_weights = _cumulative(STATUSES)
+        self._sequence = itertools.count()
+
+    def _pick(self, items, cumulative):
+        return self.random.choices(items, cum_weights=cumulative)[0]
+
+    def _wallet(self) -> str:
+        # Pareto-distributed rank: a few wallets send most of the transfers
+        rank = int(self.random.paretovariate(1.2)) % self.wallets
+        return f"0x{rank:040x}"
+
+    def _hash(self) -> str:
+        return f"0x{self.random.getrandbits(256):064x}"
+
+    def _timestamp(self) -> int:
+        # Density grows linearly from 1 to `growth` across the span (inverse CDF sampling)
+        u = self.random.random()
+        g = self.growth
+        fraction = u if g == 1 else ((1 + u * (g * g - 1)) ** 0.5 - 1) / (g - 1)
+        return int(self.start + fraction * self.span)
+
+    def _amount_usd(self) -> float:
+        if self.random.random() < 0.002:
+            # Whale tail
+            return round(self.random.paretovariate(1.1) * 250000, 2)
+        return round(self.random.lognormvariate(6.0, 2.0), 2)
+
+    def _leg(self, token, chain_id: int, amount_usd: float, timestamp: int) -> Dict[str, Any]:
+        symbol, name, decimals, price, _ = token
+        price *= self.random.uniform(0.9, 1.1)
+        gas_usd = round(self.random.lognormvariate(0.0, 1.2), 4)
+        tx_hash = self._hash()
+        return {
+            'txHash': tx_hash,
+            'txLink': f"https://explorer.example/{chain_id}/tx/{tx_hash}",
+            'amount': str(int(amount_usd / price * 10 ** decimals)),
+            'token': {
+                'address': '0x' + hashlib.sha1(f"{symbol}:{chain_id}".encode()).hexdigest(),
+                'chainId': chain_id,
+                'symbol': symbol,
+                'decimals': decimals,
+                'name': name,
+                'priceUSD': f"{price:.6f}"
+            },
+            'chainId': chain_id,
+            'gasPrice': str(self.random.randint(10 ** 8, 5 * 10 ** 10)),
+            'gasUsed': str(self.random.randint(21000, 400000)),
+            'gasAmount': str(self.random.randint(10 ** 12, 10 ** 16)),
+            'gasAmountUSD': f"{gas_usd}",
+            'amountUSD': f"{amount_usd:.2f}",
+            'timestamp': timestamp
+        }
+
+    def transfer(self) -> Dict[str, Any]:
+        """One transfer payload, shaped like an item of the /v2/analytics/transfers response."""
+        token = self._pick(TOKENS, self._token_weights)
+        source_chain = self._pick(CHAINS, self._chain_weights)[0]
+        destination_chain = source_chain
+        while destination_chain == source_chain:
+            destination_chain = self._pick(CHAINS, self._chain_weights)[0]
+        # Most transfers bridge the same asset; some swap into a stablecoin on arrival
+        destination_token = token if self.random.random() < 0.8 else self._pick(TOKENS[:2], [1, 2])
+        status, substatus, _ = self._pick(STATUSES, self._status_weights)
+        amount_usd = self._amount_usd()
+        sent_at = self._timestamp()
+        transaction_id = f"0x{next(self._sequence):016x}{self.random.getrandbits(192):048x}"
+        sender = self._wallet()
+
+        transfer = {
+            'transactionId': transaction_id,
+            'sending': self._leg(token, source_chain, amount_usd, sent_at),
+            'receiving': {},
+            'lifiExplorerLink': f"https://scan.li.fi/tx/{transaction_id}",
+            'fromAddress': sender,
+            'toAddress': sender if self.random.random() < 0.7 else self._wallet(),
+            'tool': self._pick(TOOLS, self._tool_weights)[0],
+            'status': status,
+            'substatus': substatus,
+            'substatusMessage': f"Synthetic transfer ({substatus.lower()})",
+            'metadata': {'integrator': self._pick(INTEGRATORS, self._integrator_weights)[0]}
+        }
+        if status == 'DONE':
+            received_usd = round(amount_usd * self.random.uniform(0.985, 0.999), 2)
+            transfer['receiving'] = self._leg(destination_token, destination_chain, received_usd,
+                                              sent_at + int(self.random.expovariate(1 / 90)) + 5)
+        return transfer
+
+    def transfers(self, count: int) -> Iterator[Dict[str, Any]]:
+        for _ in range(count):
+            yield self.transfer()
+
+    def batches(self, count: int, batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+        """`count` transfers in lists of at most `batch_size`."""
+        remaining = count
+        while remaining > 0:
+            size = min(batch_size, remaining)
+            yield [self.transfer() for _ in range(size)]
+            remaining -= size
+
+
+def generate_transfers(count: int, seed: Optional[int] = 1, **options) -> List[Dict[str, Any]]:
+    """`count` synthetic transfers as a list (use TransferGenerator to stream large volumes)."""
+    return list(TransferGenerator(seed, **options).transfers(count))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, required=True, help='transfers to generate')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--db', help='insert into this SQLite database (default lifi_transactions.db)')
+    parser.add_argument('--jsonl', help='write payloads to this file instead, one JSON object per line')
+    parser.add_argument('--batch', type=int, default=5000, help='transfers per bulk insert')
+    parser.add_argument('--partitioned', action='store_true', help='store monthly partitions')
+    args = parser.parse_args()
+
+    generator = TransferGenerator(args.seed)
+    started = time.perf_counter()
+    if args.jsonl:
+        with open(args.jsonl, 'w') as f:
+            for transfer in generator.transfers(args.count):
+                f.write(json.dumps(transfer, separators=(',', ':')) + '\n')
+    else:
+        from database import LiFiDatabase
+        db = LiFiDatabase(args.db or 'lifi_transactions.db', partitioned=args.partitioned or None)
+        done = 0
+        for batch in generator.batches(args.count, args.batch):
+            db.bulk_insert_transactions(batch)
+            done += len(batch)
+            elapsed = time.perf_counter() - started
+            print(f"{done:,}/{args.count:,} transfers ({done / elapsed:,.0f}/s)", file=sys.stderr)
+    print(f"Generated {args.count:,} transfers in {time.perf_counter() - started:.1f}s")
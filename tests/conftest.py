@@ -0,0 +1,19 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+# The modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def server(tmp_path_factory):
+    # Importing the server opens its database and job state files in the working directory
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('server'))
+    try:
+        yield importlib.import_module('server')
+    finally:
+        os.chdir(cwd)
@@ -0,0 +1,22 @@
+from admission import ConcurrencyLimiter, limiter_for
+
+
+def test_downloads_do_not_take_export_slots():
+    export, download = limiter_for('/data/export'), limiter_for('/download/')
+    assert (export.name, download.name) == ('export', 'download')
+    held = [export.acquire() for _ in range(export.slots)]
+    try:
+        assert all(held)
+        assert download.acquire()
+        download.release()
+    finally:
+        for _ in held:
+            export.release()
+
+
+def test_limiter_rejects_once_slots_and_queue_are_full():
+    limiter = ConcurrencyLimiter('test', 1, queue_seconds=0, max_waiting=0)
+    assert limiter.acquire()
+    assert not limiter.acquire()
+    limiter.release()
+    assert limiter.acquire()
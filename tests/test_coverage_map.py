@@ -0,0 +1,69 @@
+import pytest
+
+from coverage_map import CoverageWalk, find_gaps, merge_intervals
+from database import BatchWriteError, LiFiDatabase
+from synthetic_data import TransferGenerator
+from transfer_batch import TransferBatch
+
+
+def test_merge_intervals():
+    assert merge_intervals([]) == []
+    assert merge_intervals([(20, 30), (1, 5), (3, 8)]) == [(1, 8), (20, 30)]
+    # Whole seconds: (1, 5) and (6, 9) leave nothing between them
+    assert merge_intervals([(6, 9), (1, 5)]) == [(1, 9)]
+    assert merge_intervals([(1, 5), (7, 9)]) == [(1, 5), (7, 9)]
+    assert merge_intervals([(1, 100), (10, 20), (50, 60)]) == [(1, 100)]
+
+
+def test_find_gaps():
+    assert find_gaps([], 0, 99) == [(0, 99)]
+    assert find_gaps([(0, 99)], 0, 99) == []
+    assert find_gaps([(10, 19), (40, 49)], 0, 99) == [(0, 9), (20, 39), (50, 99)]
+    # Intervals reaching past either end only trim the range
+    assert find_gaps([(-50, 9), (90, 500)], 0, 99) == [(10, 89)]
+    assert find_gaps([(200, 300)], 0, 99) == [(0, 99)]
+    assert find_gaps([(10, 19), (22, 29)], 0, 29, min_gap=3) == [(0, 9)]
+
+
+class RecordingDatabase:
+    def __init__(self):
+        self.recorded = []
+
+    def record_coverage(self, start, end, token_symbol=None, min_usd=0):
+        self.recorded.append((start, end))
+
+
+def test_walk_claims_stored_pages_then_the_rest():
+    db = RecordingDatabase()
+    walk = CoverageWalk(db, 0, 1000, None, 0)
+    walk.page(900, 700)
+    walk.page(700, 400)
+    walk.finish()
+    # Transfers at a page's oldest second may continue on the next page
+    assert merge_intervals(db.recorded) == [(0, 900)]
+    assert db.recorded[:2] == [(701, 900), (401, 700)]
+
+
+def test_walk_leaves_skipped_page_open():
+    db = RecordingDatabase()
+    walk = CoverageWalk(db, 0, 1000, None, 0)
+    walk.page(900, 700)
+    walk.skip(500)
+    walk.page(500, 300)
+    walk.finish()
+    assert find_gaps(db.recorded, 0, 900) == [(500, 700)]
+
+
+def test_insert_batch_reports_dropped_rows(tmp_path, monkeypatch):
+    db = LiFiDatabase(str(tmp_path / 'coverage.db'))
+    batch = TransferBatch.from_payloads(TransferGenerator(3).transfers(20))
+    assert db.insert_batch(batch) == 20
+
+    def failing_write(target_path, transfers):
+        raise OSError('disk I/O error')
+
+    monkeypatch.setattr(db, '_write_transfers', failing_write)
+    with pytest.raises(BatchWriteError) as raised:
+        db.insert_batch(TransferBatch.from_payloads(TransferGenerator(4).transfers(5)))
+    assert (raised.value.inserted, raised.value.dropped) == (0, 5)
+    assert db.insert_transaction(next(TransferGenerator(5).transfers(1))) is False
@@ -0,0 +1,29 @@
+import base64
+import json
+
+import pytest
+
+
+def token(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+
+
+def test_round_trip(server):
+    for after in [('2024-03-01T10:00:00', 'tx-1'), (None, 'tx-2')]:
+        assert server.decode_cursor(server.encode_cursor(after)) == after
+
+
+@pytest.mark.parametrize('bad', [
+    'not base64!',
+    base64.urlsafe_b64encode(b'not json').decode(),
+    token(['a', [1]]),
+    token([1, 'tx']),
+    token(['2024-03-01', None]),
+    token(['2024-03-01']),
+    token(['2024-03-01', 'tx', 'extra']),
+    token('ab'),
+    token({'a': 1, 'b': 2}),
+])
+def test_rejects_malformed_tokens(server, bad):
+    with pytest.raises(ValueError):
+        server.decode_cursor(bad)
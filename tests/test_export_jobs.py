@@ -0,0 +1,28 @@
+import os
+
+from database import LiFiDatabase
+from export_jobs import ExportManager
+from synthetic_data import TransferGenerator
+
+
+def test_rerun_after_eviction_leaves_open_download_intact(tmp_path):
+    db = LiFiDatabase(str(tmp_path / 'exports.db'))
+    db.bulk_insert_transactions(list(TransferGenerator(2).transfers(300)))
+    manager = ExportManager(db, export_dir=str(tmp_path / 'exports'))
+
+    first = manager.submit('csv')
+    assert first.done.wait(30) and first.status == 'completed'
+    with open(first.path, 'rb') as download:
+        head = download.read(100)
+        # Evicted while the client is still reading, then requested again
+        with manager._lock:
+            manager._forget(first)
+        second = manager.submit('csv')
+        assert second is not first
+        assert second.done.wait(30) and second.status == 'completed'
+        assert second.path != first.path
+        rest = download.read()
+
+    with open(second.path, 'rb') as f:
+        assert f.read() == head + rest
+    assert not [name for name in os.listdir(tmp_path / 'exports') if '.part' in name]
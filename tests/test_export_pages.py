@@ -0,0 +1,14 @@
+from export_jobs import ExportJob
+
+
+def test_job_page_escapes_user_input(server):
+    job = ExportJob('csv', {'token_symbol': '<script>alert(1)</script>'}, 1, 'key')
+    job.status = 'failed'
+    job.error = "Unsupported token '<img src=x onerror=alert(1)>'"
+    page = server.export_job_page(job)
+    assert '<script>' not in page and '<img' not in page
+    assert '&lt;script&gt;' in page and '&lt;img src=x' in page
+
+    job.status = 'running'
+    job.progress = {'message': '<b>Querying</b>', 'current': 1, 'total': 2}
+    assert '&lt;b&gt;Querying&lt;/b&gt;' in server.export_job_page(job)
@@ -0,0 +1,133 @@
+import threading
+import time
+
+import pytest
+
+from query_cache import QueryCache, normalize_query
+
+
+def test_normalize_query_ignores_order_and_empty_params():
+    assert normalize_query('q', b=2, a=1) == normalize_query('q', a=1, b=2, c=None, d='')
+    assert normalize_query('q', a=1) != normalize_query('r', a=1)
+    assert normalize_query('q', a=0) != normalize_query('q')
+
+
+def test_hit_until_generation_changes():
+    cache = QueryCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.get_or_compute('k', 1, compute) == 1
+    assert cache.get_or_compute('k', 1, compute) == 1
+    assert cache.get_or_compute('k', 2, compute) == 2
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 2
+
+
+def test_max_age_expires_entries(monkeypatch):
+    cache = QueryCache()
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    values = iter(range(10))
+    assert cache.get_or_compute('k', 1, lambda: next(values), max_age=60) == 0
+    now[0] += 30
+    assert cache.get_or_compute('k', 1, lambda: next(values), max_age=60) == 0
+    now[0] += 31
+    assert cache.get_or_compute('k', 1, lambda: next(values), max_age=60) == 1
+    # Without max_age only the generation matters
+    now[0] += 3600
+    assert cache.get_or_compute('k', 1, lambda: next(values)) == 1
+
+
+def test_errors_are_not_cached():
+    cache = QueryCache()
+
+    def fail():
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute('k', 1, fail)
+    assert cache.get_or_compute('k', 1, lambda: 'ok') == 'ok'
+
+
+def test_evicts_least_recently_used_by_count():
+    cache = QueryCache(max_entries=2)
+    cache.get_or_compute('a', 1, lambda: 'a')
+    cache.get_or_compute('b', 1, lambda: 'b')
+    cache.get_or_compute('a', 1, lambda: 'unused')  # touch a
+    cache.get_or_compute('c', 1, lambda: 'c')
+    assert cache.stats()['entries'] == 2
+    assert cache.stats()['evictions'] == 1
+    assert cache.get_or_compute('a', 1, lambda: 'recomputed') == 'a'
+    assert cache.get_or_compute('b', 1, lambda: 'recomputed') == 'recomputed'
+
+
+def test_evicts_by_size_and_skips_oversized_values():
+    cache = QueryCache(max_mb=0.01)  # about 10 KB
+    cache.get_or_compute('big', 1, lambda: ['x' * 100] * 1000)
+    assert cache.stats()['entries'] == 0
+    for key in range(50):
+        cache.get_or_compute(key, 1, lambda: [{'id': i, 'name': f"row {i}"} for i in range(5)])
+    stats = cache.stats()
+    assert 0 < stats['size_bytes'] <= cache.max_bytes
+    assert stats['evictions'] > 0
+
+
+def test_size_estimate_tracks_content():
+    small = QueryCache._size_of([{'a': 1}] * 10)
+    large = QueryCache._size_of([{'a': 1}] * 10000)
+    assert large > small * 100
+    assert QueryCache._size_of({'rows': ['x' * 1000]}) > 1000
+
+
+def test_concurrent_misses_are_coalesced():
+    cache = QueryCache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'value'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_compute('k', 1, slow)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(cache.get_or_compute('k', 1, slow)))
+                 for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+    assert results == ['value'] * 4
+    assert len(calls) == 1
+    assert cache.stats()['coalesced'] == 3
+
+
+def test_older_generation_does_not_overwrite_newer_result():
+    cache = QueryCache()
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_old():
+        started.set()
+        release.wait(5)
+        return 'old'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_compute('k', 1, slow_old)))
+    leader.start()
+    started.wait(5)
+    assert cache.get_or_compute('k', 2, lambda: 'new') == 'new'
+    release.set()
+    leader.join(5)
+    assert results == ['old']
+    assert cache.get_or_compute('k', 2, lambda: 'recomputed') == 'new'
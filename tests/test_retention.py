@@ -0,0 +1,198 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import pytest
+
+from database import LEADERBOARD_SIZE, LiFiDatabase
+from job_coordination import SharedJobState
+from retention import describe_rule, parse_retention_rules, run_retention
+from synthetic_data import TransferGenerator
+
+
+def test_parse_retention_rules():
+    assert parse_retention_rules('') == []
+    assert parse_retention_rules(' *:365:1000 , BTC:1825, ETH::50 ') == [
+        {'token': '*', 'max_age_days': 365, 'min_usd': 1000.0},
+        {'token': 'BTC', 'max_age_days': 1825, 'min_usd': None},
+        {'token': 'ETH', 'max_age_days': None, 'min_usd': 50.0},
+    ]
+    assert describe_rule(parse_retention_rules('BTC:30:5')[0]) == 'BTC: delete transfers older than 30 days or under $5'
+    assert describe_rule(parse_retention_rules('*')[0]) == 'Other tokens: keep everything'
+
+
+@pytest.mark.parametrize('text', ['BTC:1:2:3', ':30', 'BTC:30,BTC:60', 'BTC:soon', 'BTC:1:lots', 'BTC:-1', '*::-5'])
+def test_parse_retention_rules_rejects(text):
+    with pytest.raises(ValueError):
+        parse_retention_rules(text)
+
+
+NOW = datetime(2025, 1, 1)
+LEGS = [
+    # token, timestamp, amount_usd
+    ('BTC', '2024-12-30 00:00:00', 10),      # recent, small
+    ('BTC', '2020-01-01 00:00:00', 10),      # old, small
+    ('ETH', '2024-12-30 00:00:00', 5000),    # recent, large
+    ('ETH', '2023-01-01 00:00:00', 5000),    # old, large
+    ('ETH', '2024-12-30 00:00:00', 5),       # recent, small
+    (None, '2020-01-01 00:00:00', 5000),     # no token, old
+]
+
+
+def expired(rules):
+    """Indexes of LEGS the rules would delete, evaluated by SQLite."""
+    where, params = LiFiDatabase._retention_predicate(None, parse_retention_rules(rules), now=NOW)
+    if where is None:
+        return []
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE sending_transactions (id INTEGER, token_symbol TEXT, timestamp TEXT, amount_usd REAL)')
+    conn.executemany('INSERT INTO sending_transactions VALUES (?, ?, ?, ?)',
+                     [(i,) + leg for i, leg in enumerate(LEGS)])
+    return [row[0] for row in conn.execute(f'SELECT id FROM sending_transactions s WHERE {where} ORDER BY id', params)]
+
+
+def test_retention_predicate_age_and_amount():
+    assert expired('*:365') == [1, 3, 5]
+    assert expired('*::100') == [0, 1, 4]
+    assert expired('*:365:100') == [0, 1, 3, 4, 5]
+
+
+def test_retention_predicate_token_rules_override_default():
+    # BTC follows its own rule; every other token (and a missing one) follows '*'
+    assert expired('*:365,BTC:') == [3, 5]
+    assert expired('*:365,BTC::100') == [0, 1, 3, 5]
+    # Without a '*' rule, tokens without a rule are kept
+    assert expired('ETH:365') == [3]
+
+
+def test_retention_predicate_without_limits():
+    assert expired('') == []
+    assert expired('*,BTC') == []
+
+
+def top_amounts(db, **scope):
+    return [row['amount_usd'] for row in db.get_leaderboard(**scope)]
+
+
+def remaining_top(db, token_symbol=None):
+    with db._sources() as (conn, schemas):
+        amounts = []
+        for schema in schemas:
+            query = f"SELECT amount_usd FROM {schema}.sending_transactions WHERE amount_usd IS NOT NULL"
+            params = []
+            if token_symbol:
+                query += " AND token_symbol = ?"
+                params.append(token_symbol)
+            amounts.extend(row[0] for row in conn.execute(query, params))
+    return sorted(amounts, reverse=True)[:LEADERBOARD_SIZE]
+
+
+@pytest.mark.parametrize('partitioned', [False, True])
+def test_pruning_refills_leaderboards(tmp_path, partitioned):
+    db = LiFiDatabase(str(tmp_path / 'retention.db'), partitioned=partitioned)
+    for batch in TransferGenerator(11).batches(4000, 1000):
+        for transfer in batch:
+            transfer['status'] = 'DONE'
+        db.bulk_insert_transactions(batch)
+    before = top_amounts(db)
+    assert len(before) == LEADERBOARD_SIZE
+
+    # Keeps roughly the newest two years of the synthetic range
+    result = db.prune_transactions(parse_retention_rules('*:1200'), pause=0)
+    assert result['deleted'] > 0
+    if partitioned:
+        assert result['dropped_partitions']
+    assert result['leaderboard_scopes_refilled'] > 0
+
+    after = top_amounts(db)
+    assert after == remaining_top(db)
+    assert len(after) == LEADERBOARD_SIZE
+    assert top_amounts(db, token_symbol='BTC') == remaining_top(db, 'BTC')
+
+
+def partition_states(db):
+    """month -> (frozen flag, file writable) of every partition."""
+    return {p['month']: (bool(p['frozen']), bool(os.stat(p['file_path']).st_mode & 0o222))
+            for p in db.list_partitions()}
+
+
+def small_transfers(db):
+    """Transfers under $1,000 left in the partition files."""
+    with db.connection() as conn:
+        count = 0
+        for p in db.list_partitions():
+            conn.execute("ATTACH DATABASE ? AS part", (db._partition_uri(p['file_path'], p['frozen']),))
+            count += conn.execute("SELECT COUNT(*) FROM part.sending_transactions WHERE amount_usd < 1000").fetchone()[0]
+            conn.execute("DETACH DATABASE part")
+    return count
+
+
+@pytest.fixture
+def frozen_db(tmp_path):
+    db = LiFiDatabase(str(tmp_path / 'retention.db'), partitioned=True)
+    for batch in TransferGenerator(13).batches(1500, 500):
+        for transfer in batch:
+            transfer['status'] = 'DONE'
+        db.bulk_insert_transactions(batch)
+    assert db.freeze_partitions()
+    return db
+
+
+def test_retention_leaves_partitions_to_a_running_fetch(frozen_db, tmp_path):
+    db = frozen_db
+    jobs = SharedJobState(str(tmp_path / 'jobs.db'))
+    fetching, retention_done = threading.Event(), threading.Event()
+    errors = []
+
+    def fetch():
+        # Late transfers thaw their frozen months; the run then freezes them again
+        try:
+            assert jobs.start("Fetching")
+            with jobs.keep_lease():
+                fetching.set()
+                late = TransferGenerator(14).batches(600, 50)
+                for batch in late:
+                    for transfer in batch:
+                        transfer['status'] = 'DONE'
+                    db.bulk_insert_transactions(batch)
+                    if retention_done.is_set():
+                        break
+                db.freeze_partitions()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            fetching.set()
+
+    thread = threading.Thread(target=fetch)
+    thread.start()
+    fetching.wait(10)
+    small_before = small_transfers(db)
+    result = run_retention(db, parse_retention_rules('*::1000'), ingestion=jobs)
+    retention_done.set()
+    thread.join()
+
+    assert not errors
+    assert result['partitions_skipped']
+    assert result['dropped_partitions'] == []
+    assert small_transfers(db) >= small_before
+    # Every frozen partition is read-only and every thawed one writable again
+    assert all(frozen != writable for frozen, writable in partition_states(db).values())
+
+
+def test_retention_holds_the_ingestion_lease_for_partitions(frozen_db, tmp_path):
+    db = frozen_db
+    jobs = SharedJobState(str(tmp_path / 'jobs.db'))
+    fetch_started = []
+
+    def progress(message, current=0, total=0):
+        fetch_started.append(jobs.start("Fetching"))
+
+    frozen_before = partition_states(db)
+    result = run_retention(db, parse_retention_rules('*::1000'), progress_callback=progress, ingestion=jobs)
+
+    assert not result['partitions_skipped']
+    assert result['deleted'] > 0 and small_transfers(db) == 0
+    assert fetch_started and not any(fetch_started)
+    assert partition_states(db) == frozen_before
+    assert jobs.acquire_lease()
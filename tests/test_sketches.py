@@ -0,0 +1,139 @@
+import random
+
+import pytest
+
+from database import LiFiDatabase
+from sketches import HyperLogLog, QuantileSketch
+from synthetic_data import TransferGenerator
+
+
+def test_hyperloglog_estimate_within_error():
+    sketch = HyperLogLog()
+    for i in range(20000):
+        sketch.add(f"0x{i:040x}")
+    # Standard error at precision 11 is about 2.3%
+    assert abs(sketch.count() - 20000) / 20000 < 0.07
+
+
+def test_hyperloglog_small_counts_are_exact_enough():
+    sketch = HyperLogLog()
+    for i in range(50):
+        sketch.add(f"wallet-{i}")
+        sketch.add(f"WALLET-{i}")  # case-insensitive
+    sketch.add(None)
+    sketch.add('')
+    assert sketch.count() == 50
+
+
+def test_hyperloglog_merge_matches_union():
+    left, right, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    for i in range(3000):
+        left.add(f"a{i}")
+        union.add(f"a{i}")
+    for i in range(1500, 6000):
+        right.add(f"a{i}")
+        union.add(f"a{i}")
+    merged = HyperLogLog().merge(left).merge(right)
+    assert (merged.registers == union.registers).all()
+    blobs = HyperLogLog().merge_blobs([left.to_bytes(), None, right.to_bytes()])
+    assert (blobs.registers == union.registers).all()
+
+
+def test_hyperloglog_round_trip_and_precision_mismatch():
+    sketch = HyperLogLog()
+    for i in range(100):
+        sketch.add(str(i))
+    restored = HyperLogLog.from_bytes(sketch.to_bytes())
+    assert restored.count() == sketch.count()
+    restored.add('another')  # the restored registers are writable
+    assert HyperLogLog.from_bytes(None).count() == 0
+    with pytest.raises(ValueError):
+        HyperLogLog(10).merge(sketch)
+    with pytest.raises(ValueError):
+        HyperLogLog(10).merge_blobs([sketch.to_bytes()])
+
+
+def test_quantile_sketch_relative_accuracy():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(7, 2) for _ in range(10000)]
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(value)
+    ordered = sorted(values)
+    for q in (0.5, 0.9, 0.99):
+        exact = ordered[int(q * (len(ordered) - 1))]
+        assert abs(sketch.quantile(q) - exact) / exact <= 0.011
+    # Estimates stay inside the observed range
+    assert ordered[0] <= sketch.quantile(0) <= ordered[0] * 1.01
+    assert ordered[-1] * 0.99 <= sketch.quantile(1) <= ordered[-1]
+
+
+def test_quantile_sketch_merge_and_round_trip():
+    left, right, whole = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for value in [0, 1, 5, 50, 500]:
+        left.add(value)
+        whole.add(value)
+    for value in [10, 100, 1000, None]:
+        right.add(value)
+        whole.add(value)
+    merged = QuantileSketch.from_bytes(left.to_bytes()).merge(QuantileSketch.from_bytes(right.to_bytes()))
+    assert merged.count == whole.count == 8
+    assert merged.quantiles((0.25, 0.5, 0.75)) == whole.quantiles((0.25, 0.5, 0.75))
+    assert QuantileSketch().quantile(0.5) is None
+    with pytest.raises(ValueError):
+        QuantileSketch(0.02).merge(left)
+
+
+@pytest.fixture
+def db(tmp_path):
+    return LiFiDatabase(str(tmp_path / 'sketches.db'))
+
+
+def _from_days(db, **filters):
+    """Overall figures merged from the day rows, for comparison with the rollup answers."""
+    days = db.get_sketch_statistics(group_by='token,chain,day', **filters)
+    return sum(row['tx_count'] for row in days), round(sum(row['volume_usd'] for row in days), 6)
+
+
+def test_rollups_match_day_sketches(db):
+    for batch in TransferGenerator(5).batches(3000, 700):
+        db.bulk_insert_transactions(batch)
+
+    overall = db.get_sketch_statistics()[0]
+    assert overall['tx_count'] == 3000
+    assert (overall['tx_count'], round(overall['volume_usd'], 6)) == _from_days(db)
+
+    by_token = db.get_sketch_statistics(group_by='token')
+    assert sum(row['tx_count'] for row in by_token) == 3000
+    token = by_token[0]['token_symbol']
+    single = db.get_sketch_statistics(token_symbol=token)[0]
+    assert single['tx_count'] == by_token[0]['tx_count']
+    assert single['distinct_senders'] == by_token[0]['distinct_senders']
+    assert single['tx_count'] == _from_days(db, token_symbol=token)[0]
+
+    by_chain = db.get_sketch_statistics(group_by='chain')
+    assert sum(row['tx_count'] for row in by_chain) == 3000
+    assert all(row['chain_name'] for row in by_chain)
+
+    months = db.get_sketch_statistics(group_by='month')
+    first, last = months[0]['month'], months[-1]['month']
+    ranged = db.get_sketch_statistics(start_date=f"{first}-15", end_date=f"{last}-10")[0]
+    assert (ranged['tx_count'], round(ranged['volume_usd'], 6)) == \
+        _from_days(db, start_date=f"{first}-15", end_date=f"{last}-10")
+
+
+def test_rollups_rebuilt_after_clear_and_rebuild(db):
+    db.bulk_insert_transactions(list(TransferGenerator(9).transfers(500)))
+    before = db.get_sketch_statistics()[0]
+    assert db.rebuild_sketches() == 500
+    after = db.get_sketch_statistics()[0]
+    assert after['tx_count'] == before['tx_count']
+    assert after['distinct_wallets'] == before['distinct_wallets']
+
+    db.clear_database()
+    assert db.get_sketch_statistics() == []
+
+
+def test_unknown_group_by_dimension(db):
+    with pytest.raises(ValueError):
+        db.get_sketch_statistics(group_by='wallet')
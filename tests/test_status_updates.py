@@ -0,0 +1,22 @@
+import copy
+
+from database import LiFiDatabase
+from synthetic_data import TransferGenerator
+
+
+def test_substatus_change_is_upserted(tmp_path):
+    db = LiFiDatabase(str(tmp_path / 'status.db'))
+    payload = next(TransferGenerator(1).transfers(1))
+    payload.update(status='PENDING', substatus='WAIT_SOURCE_CONFIRMATIONS', receiving={})
+    db.insert_transaction(payload)
+
+    # Same status: nothing to write
+    assert db.update_transaction_statuses([copy.deepcopy(payload)]) == []
+
+    moved = copy.deepcopy(payload)
+    moved['substatus'] = 'WAIT_DESTINATION_TRANSACTION'
+    assert db.update_transaction_statuses([moved]) == [payload['transactionId']]
+    with db.connection() as conn:
+        stored = conn.execute('SELECT status, substatus FROM transactions').fetchone()
+    assert tuple(stored) == ('PENDING', 'WAIT_DESTINATION_TRANSACTION')
+    assert db.update_transaction_statuses([moved]) == []
@@ -0,0 +1,51 @@
+import concurrent.futures
+import threading
+
+from tracing import active_trace, current_trace, join_trace, span, start_trace, stop_trace
+
+
+def step(name):
+    with span(name):
+        pass
+
+
+def span_names(tracer):
+    return sorted(event['name'] for event in tracer.chrome_trace()['traceEvents'] if event['ph'] == 'X')
+
+
+def test_only_the_job_threads_are_traced(tmp_path):
+    job_running = threading.Event()
+    others_done = threading.Event()
+    traced = []
+
+    def job():
+        tracer = start_trace('run1', 'fetch')
+        step('job.step')
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix='fetch',
+                                                   initializer=join_trace, initargs=(current_trace(),)) as executor:
+            for future in [executor.submit(step, 'worker.step') for _ in range(3)]:
+                future.result()
+        job_running.set()
+        others_done.wait(10)
+        stop_trace(tracer, str(tmp_path / 'run1.json'))
+        traced.append(tracer)
+
+    def unrelated():
+        # e.g. an HTTP handler or an export committing while the job runs
+        job_running.wait(10)
+        step('handler.step')
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(step, 'export.step').result()
+        others_done.set()
+
+    threads = [threading.Thread(target=job), threading.Thread(target=unrelated)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    tracer = traced[0]
+    assert span_names(tracer) == ['job.step', 'worker.step', 'worker.step', 'worker.step']
+    assert active_trace() is None
+    step('after.stop')
+    assert len(span_names(tracer)) == 4
@@ -0,0 +1,49 @@
+from decimal import Decimal
+
+import numpy as np
+
+from transfer_batch import TransferBatch
+
+
+def payload(transaction_id, amount, decimals, symbol='ETH', amount_usd='2500', timestamp=1700000000):
+    return {
+        'transactionId': transaction_id,
+        'sending': {
+            'amount': amount,
+            'amountUSD': amount_usd,
+            'chainId': 1,
+            'timestamp': timestamp,
+            'token': {'symbol': symbol, 'decimals': decimals},
+        },
+    }
+
+
+def test_amounts_are_normalized_exactly():
+    big = 2 ** 53 + 1  # the first integer float64 cannot hold
+    batch = TransferBatch.from_payloads([
+        payload('a', str(big), 18),
+        payload('b', '123456789012345678901234567890123456789', 18),
+        payload('c', '1500000', 6),
+        payload('d', None, 18),
+        payload('e', '42', None),
+        {'transactionId': 'f'},
+    ], build_columns=True)
+
+    amount = batch.columns.amount
+    assert amount.dtype == object
+    assert amount[0] == Decimal(big).scaleb(-18) and amount[0] * 10 ** 18 == big
+    assert str(amount[1]) == '123456789012345678901.234567890123456789'
+    assert amount[2] == Decimal('1.5')
+    assert list(amount[3:]) == [None, None, None]
+
+
+def test_filter_keeps_amounts_aligned():
+    batch = TransferBatch.from_payloads([
+        payload('a', str(2 ** 60), 0, amount_usd='10'),
+        payload('b', str(2 ** 60 + 1), 0, amount_usd='5000'),
+        payload('c', str(2 ** 60 + 2), 0, symbol='BTC', amount_usd='5000'),
+    ])
+    large = batch.filter(0, 2e9, token_symbol='eth', min_usd=1000)
+    assert [t.transaction_id for t in large] == ['b']
+    assert list(large.columns.amount) == [Decimal(2 ** 60 + 1)]
+    assert np.array_equal(large.columns.amount_usd, [5000.0])
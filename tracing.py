@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+TRACE_DIR = os.getenv('LIFI_TRACE_DIR', 'traces')  # one Chrome trace JSON file per ingestion run
+TRACE_KEEP = int(os.getenv('LIFI_TRACE_KEEP', 20))  # newest trace files kept on disk
+TRACE_MAX_SPANS = int(os.getenv('LIFI_TRACE_MAX_SPANS', 200000))  # later spans of a run are counted, not kept
+
+
+class Tracer:
+    """Timed spans of one job run, exported in Chrome's trace-event format.
+
+    Each span becomes a complete ("X") event on the thread that ran it, so
+    chrome://tracing or Perfetto shows the fetch threads next to the writer
+    thread. Spans are kept in memory until the run ends (a few hundred bytes
+    each, capped at max_spans).
+    """
+
+    def __init__(self, run_id: str, name: str, max_spans: int = TRACE_MAX_SPANS):
+        self.run_id = run_id
+        self.name = name
+        self.max_spans = max_spans
+        self.started_at = time.time()
+        self._origin = time.perf_counter()
+        self._events: List[Dict[str, Any]] = []
+        self._threads: Dict[int, int] = {}
+        self._dropped = 0
+        self._lock = threading.Lock()
+        self.metadata: Dict[str, Any] = {}
+
+    def record(self, name: str, category: str, start: float, end: float, args: Dict[str, Any]):
+        """Add a span from perf_counter() start/end times."""
+        thread = threading.current_thread()
+        with self._lock:
+            if len(self._events) >= self.max_spans:
+                self._dropped += 1
+                return
+            tid = self._threads.get(thread.ident)
+            if tid is None:
+                tid = self._threads[thread.ident] = len(self._threads) + 1
+                self._events.append({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid,
+                                     'args': {'name': thread.name}})
+            self._events.append({
+                'name': name, 'cat': category, 'ph': 'X', 'pid': os.getpid(), 'tid': tid,
+                'ts': round((start - self._origin) * 1e6, 1),
+                'dur': round((end - start) * 1e6, 1),
+                'args': args
+            })
+
+    @contextmanager
+    def span(self, name: str, category: str = 'ingest', **args) -> Iterator[Dict[str, Any]]:
+        """Time the block; the yielded args dict can be filled in (e.g. row counts) before it ends."""
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.record(name, category, start, time.perf_counter(), args)
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        with self._lock:
+            events = list(self._events)
+        spans = len([event for event in events if event['ph'] == 'X'])
+        return {
+            'traceEvents': [{'name': 'process_name', 'ph': 'M', 'pid': os.getpid(), 'tid': 0,
+                             'args': {'name': f"{self.name} {self.run_id}"}}] + events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'run_id': self.run_id, 'job': self.name, 'started_at': self.started_at,
+                          'spans': spans, 'dropped_spans': self._dropped, **self.metadata}
+        }
+
+    def save(self, path: str) -> str:
+        """Write the Chrome trace JSON to path (through a temporary file); returns the path."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        partial = f"{path}.part"
+        with open(partial, 'w') as f:
+            json.dump(self.chrome_trace(), f, separators=(',', ':'), default=str)
+        os.replace(partial, path)
+        return path
+
+
+# Run being traced in this process; ingestion runs one at a time under the ingestion lease
+_active: Optional[Tracer] = None
+# Run the current thread's spans go to: only the job's thread and the workers that join_trace it,
+# so HTTP handlers, exports and retention running meanwhile stay out of the job's timeline
+_current: contextvars.ContextVar[Optional[Tracer]] = contextvars.ContextVar('lifi_trace', default=None)
+
+
+def start_trace(run_id: str, name: str) -> Tracer:
+    """Make a new Tracer the active run, recording span() calls made on this thread."""
+    global _active
+    _active = Tracer(run_id, name)
+    _current.set(_active)
+    return _active
+
+
+def join_trace(tracer: Optional[Tracer]):
+    """Record this thread's span() calls into tracer (none if None).
+
+    Meant as a job's executor initializer, e.g.
+    ThreadPoolExecutor(initializer=join_trace, initargs=(current_trace(),)).
+    """
+    _current.set(tracer)
+
+
+def stop_trace(tracer: Tracer, path: Optional[str] = None) -> Optional[str]:
+    """Stop tracing and save the run to path (default: its file under TRACE_DIR); returns the path written."""
+    global _active
+    if _active is tracer:
+        _active = None
+    if _current.get() is tracer:
+        _current.set(None)
+    try:
+        path = tracer.save(path or trace_path(tracer.run_id))
+    except OSError as e:
+        logger.warning(f"Could not save trace {tracer.run_id}: {e}")
+        return None
+    _prune_traces()
+    return path
+
+
+def active_trace() -> Optional[Tracer]:
+    return _active
+
+
+def current_trace() -> Optional[Tracer]:
+    """The run this thread records spans into, if any."""
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, category: str = 'ingest', **args) -> Iterator[Dict[str, Any]]:
+    """Tracer.span on this thread's run; only yields args when the thread is not being traced."""
+    tracer = _current.get()
+    if tracer is None:
+        yield args
+        return
+    with tracer.span(name, category, **args) as span_args:
+        yield span_args
+
+
+def trace_path(run_id: str) -> str:
+    if not run_id.isalnum():
+        raise ValueError(f"Invalid run id: {run_id}")
+    return os.path.join(TRACE_DIR, f"{run_id}.json")
+
+
+def _prune_traces():
+    """Delete all but the TRACE_KEEP newest trace files."""
+    if not os.path.isdir(TRACE_DIR):
+        return
+    try:
+        files = [os.path.join(TRACE_DIR, name) for name in os.listdir(TRACE_DIR) if name.endswith('.json')]
+        files.sort(key=os.path.getmtime, reverse=True)
+        for path in files[TRACE_KEEP:]:
+            os.remove(path)
+    except OSError as e:
+        logger.warning(f"Could not prune old traces: {e}")
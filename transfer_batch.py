@@ -0,0 +1,230 @@
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+
+CHAIN_NAMES = {
+    1: "Ethereum", 10: "Optimism", 56: "BNB Smart Chain", 100: "Gnosis Chain",
+    137: "Polygon", 250: "Fantom", 42161: "Arbitrum", 43114: "Avalanche",
+    20000000000001: "Bitcoin", 747474: "Katana", 8453: "Base",
+    324: "zkSync Era", 59144: "Linea", 534352: "Scroll"
+}
+
+
+def chain_name(chain_id: Optional[int]) -> str:
+    """Convert chain ID to human-readable name."""
+    return CHAIN_NAMES.get(chain_id, f"Chain {chain_id}")
+
+
+def _to_float(value) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _token_amount(amount, decimals) -> Optional[Decimal]:
+    """A raw integer amount (smallest units) in whole tokens, exactly: the exponent is shifted, nothing is rounded."""
+    if amount in (None, '') or decimals in (None, ''):
+        return None
+    try:
+        sign, digits, exponent = Decimal(amount).as_tuple()
+        shift = int(decimals)
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+    if not isinstance(exponent, int):
+        return None  # NaN or Infinity
+    return Decimal((sign, digits, exponent - shift))
+
+
+class TransferLeg:
+    """Sending or receiving side of a transfer, with numbers, time and chain name resolved once."""
+
+    __slots__ = ('tx_hash', 'tx_link', 'token_address', 'token_symbol', 'token_name', 'token_decimals',
+                 'token_price_usd', 'chain_id', 'chain_name', 'amount', 'amount_usd', 'gas_price', 'gas_used',
+                 'gas_amount', 'gas_amount_usd', 'timestamp', 'time')
+
+    def __init__(self, leg: Dict[str, Any]):
+        token = leg.get('token') or {}
+        self.tx_hash = leg.get('txHash')
+        self.tx_link = leg.get('txLink')
+        self.token_address = token.get('address')
+        self.token_symbol = token.get('symbol')
+        self.token_name = token.get('name')
+        self.token_decimals = token.get('decimals')
+        self.token_price_usd = _to_float(token.get('priceUSD'))
+        self.chain_id = leg.get('chainId')
+        self.chain_name = chain_name(leg.get('chainId', 0))
+        self.amount = leg.get('amount')
+        self.amount_usd = _to_float(leg.get('amountUSD'))
+        self.gas_price = leg.get('gasPrice')
+        self.gas_used = leg.get('gasUsed')
+        self.gas_amount = leg.get('gasAmount')
+        self.gas_amount_usd = _to_float(leg.get('gasAmountUSD'))
+        self.timestamp = leg.get('timestamp')
+        self.time = datetime.fromtimestamp(self.timestamp) if self.timestamp else None
+
+    def row(self, transaction_id: Optional[str]) -> Tuple:
+        """Column values for a sending_transactions/receiving_transactions row."""
+        return (transaction_id, self.tx_hash, self.tx_link, self.token_address, self.token_symbol,
+                self.token_name, self.token_decimals, self.token_price_usd, self.chain_id, self.chain_name,
+                self.amount, self.amount_usd, self.gas_price, self.gas_used, self.gas_amount,
+                self.gas_amount_usd, self.time)
+
+
+class Transfer:
+    """One LI.FI transfer, flattened from its API payload."""
+
+    __slots__ = ('transaction_id', 'from_address', 'to_address', 'tool', 'status', 'substatus',
+                 'substatus_message', 'explorer_link', 'integrator', 'sending', 'receiving')
+
+    def __init__(self, payload: Dict[str, Any]):
+        self.transaction_id = payload.get('transactionId')
+        self.from_address = payload.get('fromAddress')
+        self.to_address = payload.get('toAddress')
+        self.tool = payload.get('tool')
+        self.status = payload.get('status')
+        self.substatus = payload.get('substatus')
+        self.substatus_message = payload.get('substatusMessage')
+        self.explorer_link = payload.get('lifiExplorerLink')
+        self.integrator = (payload.get('metadata') or {}).get('integrator')
+        sending, receiving = payload.get('sending'), payload.get('receiving')
+        self.sending = TransferLeg(sending) if sending else None
+        self.receiving = TransferLeg(receiving) if receiving else None
+
+    @property
+    def month(self) -> Optional[str]:
+        """'YYYY-MM' of the sending leg, the partition key."""
+        return self.sending.time.strftime('%Y-%m') if self.sending and self.sending.time else None
+
+    def row(self) -> Tuple:
+        """Column values for a transactions row."""
+        return (self.transaction_id, self.from_address, self.to_address, self.tool, self.status,
+                self.substatus, self.substatus_message, self.explorer_link, self.integrator)
+
+
+class BatchColumns:
+    """The sending legs of a batch as NumPy arrays, so filters are evaluated as boolean masks.
+
+    Token symbols are interned per batch: `symbol_id` indexes `symbols`, and
+    matching a token upper-cases each distinct symbol once instead of once per
+    transfer. `amount` holds the raw `amount` of each leg divided by its
+    token's decimals as an exact Decimal (None when either is missing):
+    amounts routinely exceed 2**53 smallest units, past what float64 holds.
+    """
+
+    __slots__ = ('timestamp', 'symbol_id', 'symbols', 'chain_id', 'amount_usd', 'amount')
+
+    def __init__(self, timestamp: np.ndarray, symbol_id: np.ndarray, symbols: List[Optional[str]],
+                 chain_id: np.ndarray, amount_usd: np.ndarray, amount: np.ndarray):
+        self.timestamp = timestamp
+        self.symbol_id = symbol_id
+        self.symbols = symbols
+        self.chain_id = chain_id
+        self.amount_usd = amount_usd
+        self.amount = amount
+
+    @classmethod
+    def from_transfers(cls, transfers: List[Transfer]) -> 'BatchColumns':
+        legs = [transfer.sending for transfer in transfers]
+        count = len(legs)
+        interned: Dict[Optional[str], int] = {}
+        symbol_id = np.fromiter((interned.setdefault(leg.token_symbol if leg else None, len(interned))
+                                 for leg in legs), dtype=np.int32, count=count)
+        timestamp = np.fromiter((leg.timestamp or np.nan if leg else np.nan for leg in legs),
+                                dtype=np.float64, count=count)
+        chain_id = np.fromiter((leg.chain_id or 0 if leg else 0 for leg in legs), dtype=np.int64, count=count)
+        amount_usd = np.fromiter((np.nan if leg is None or leg.amount_usd is None else leg.amount_usd
+                                  for leg in legs), dtype=np.float64, count=count)
+        amount = np.empty(count, dtype=object)
+        amount[:] = [_token_amount(leg.amount, leg.token_decimals) if leg else None for leg in legs]
+        return cls(timestamp, symbol_id, list(interned), chain_id, amount_usd, amount)
+
+    def token_mask(self, token_symbol: str) -> np.ndarray:
+        """Transfers whose sending token is token_symbol, compared case-insensitively."""
+        token_symbol = token_symbol.upper()
+        matching = [i for i, symbol in enumerate(self.symbols) if symbol and symbol.upper() == token_symbol]
+        return np.isin(self.symbol_id, matching)
+
+    def take(self, mask: np.ndarray) -> 'BatchColumns':
+        return BatchColumns(self.timestamp[mask], self.symbol_id[mask], self.symbols, self.chain_id[mask],
+                            self.amount_usd[mask], self.amount[mask])
+
+
+class TransferBatch:
+    """A page of transfers parsed once, then filtered and written without going back to the dicts."""
+
+    __slots__ = ('transfers', '_columns')
+
+    def __init__(self, transfers: Iterable[Transfer] = (), columns: Optional[BatchColumns] = None):
+        self.transfers: List[Transfer] = list(transfers)
+        self._columns = columns
+
+    @classmethod
+    def from_payloads(cls, payloads: Iterable[Dict[str, Any]], build_columns: bool = False) -> 'TransferBatch':
+        """Parse API payloads; build_columns also builds the filter columns now rather than on first filter."""
+        batch = cls(Transfer(payload) for payload in payloads)
+        if build_columns:
+            batch._columns = BatchColumns.from_transfers(batch.transfers)
+        return batch
+
+    @property
+    def columns(self) -> BatchColumns:
+        """NumPy view of the sending legs, built on first use."""
+        if self._columns is None:
+            self._columns = BatchColumns.from_transfers(self.transfers)
+        return self._columns
+
+    def __len__(self) -> int:
+        return len(self.transfers)
+
+    def __iter__(self) -> Iterator[Transfer]:
+        return iter(self.transfers)
+
+    @property
+    def first_timestamp(self) -> Optional[float]:
+        first = self.transfers[0] if self.transfers else None
+        return first.sending.timestamp if first and first.sending else None
+
+    @property
+    def last_timestamp(self) -> Optional[float]:
+        last = self.transfers[-1] if self.transfers else None
+        return last.sending.timestamp if last and last.sending else None
+
+    def filter(self, start_timestamp: float, end_timestamp: float, token_symbol: Optional[str] = None,
+               min_usd: float = 0, chain_id: Optional[int] = None) -> 'TransferBatch':
+        """Transfers sent within [start, end], of the given token and chain (any if None) and worth at least min_usd."""
+        if not self.transfers:
+            return TransferBatch()
+        columns = self.columns
+        # NaN timestamps (no sending leg) fail both comparisons
+        mask = (columns.timestamp >= start_timestamp) & (columns.timestamp <= end_timestamp)
+        if token_symbol:
+            mask &= columns.token_mask(token_symbol)
+        if chain_id:
+            mask &= columns.chain_id == chain_id
+        if min_usd:
+            mask &= np.nan_to_num(columns.amount_usd) >= min_usd
+        transfers = self.transfers
+        return TransferBatch([transfers[i] for i in np.flatnonzero(mask)], columns.take(mask))
+
+    def excel_records(self) -> List[Dict[str, Any]]:
+        """Rows for the Excel-only output, one dict per transfer."""
+        records = []
+        for transfer in self.transfers:
+            sending, receiving = transfer.sending, transfer.receiving
+            records.append({
+                "Time": sending.time.strftime('%Y-%m-%d %H:%M:%S') if sending and sending.time else "N/A",
+                "Source Token": (sending and sending.token_symbol) or "N/A",
+                "Source Chain Name": sending.chain_name if sending else "N/A",
+                "Source Wallet Address": transfer.from_address or "N/A",
+                "Destination Token": (receiving and receiving.token_symbol) or "N/A",
+                "Destination Chain Name": receiving.chain_name if receiving else "N/A",
+                "Destination Wallet Address": transfer.to_address or "N/A",
+                "USD Value": (sending and sending.amount_usd) or 0.0,
+                "Integrator": transfer.integrator or "N/A",
+                "Bridge App Name": transfer.tool or "Unknown",
+            })
+        return records